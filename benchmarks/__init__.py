@@ -0,0 +1 @@
+"""Benchmarks for aind-ephys-utils, run with airspeed velocity (asv)."""
@@ -0,0 +1,249 @@
+""" Benchmarks for `align.to_events`
+"""
+
+import numpy as np
+
+from aind_ephys_utils import align
+
+from .generators import (
+    FORMATS,
+    bursting_spike_trains,
+    event_times,
+    poisson_spike_trains,
+    session_duration,
+    to_format,
+)
+
+INTERVAL = (-0.5, 1.0)
+BIN_SIZE = 0.01
+RATE = 5.0
+
+MAX_SPIKES = 5 * 10**7  # skip sessions with more spikes than this
+MAX_BYTES = 2**30  # skip outputs larger than this
+
+
+def check_size(n_units, n_events, dense=False):
+    """
+    Skips a benchmark (by raising NotImplementedError, as asv
+    expects) if its session or output would be too large
+
+    Parameters
+    ----------
+    n_units : int
+        Number of units
+    n_events : int
+        Number of events
+    dense : bool, optional
+        True if the benchmark creates a dense count tensor
+
+    """
+
+    n_bins = int(round((INTERVAL[1] - INTERVAL[0]) / BIN_SIZE))
+    aligned = n_units * n_events * (INTERVAL[1] - INTERVAL[0]) * RATE
+
+    if (
+        n_units * session_duration(n_events) * RATE > MAX_SPIKES
+        or 8 * aligned > MAX_BYTES
+        or (dense and n_units * n_events * n_bins > MAX_BYTES)
+    ):
+        raise NotImplementedError("benchmark size exceeds the limits")
+
+
+class AlignFormats:
+    """
+    Aligns Poisson spike trains in every input format
+    """
+
+    params = (FORMATS, [1, 100, 2000], [100, 2000, 20000])
+    param_names = ["format", "n_units", "n_events"]
+    timeout = 600
+
+    def setup(self, fmt, n_units, n_events):
+        """
+        Generates the spike trains and events
+        """
+
+        if fmt == "ndarray" and n_units > 1:
+            raise NotImplementedError("ndarray input has one unit")
+
+        check_size(n_units, n_events, dense=True)
+
+        self.events = event_times(n_events)
+        self.times = to_format(
+            poisson_spike_trains(n_units, session_duration(n_events), RATE),
+            fmt,
+        )
+
+    def time_raw(self, fmt, n_units, n_events):
+        """
+        Times alignment of individual spike times
+        """
+
+        align.to_events(self.times, self.events, INTERVAL)
+
+    def time_binned(self, fmt, n_units, n_events):
+        """
+        Times alignment and binning
+        """
+
+        align.to_events(self.times, self.events, INTERVAL, bin_size=BIN_SIZE)
+
+    def peakmem_raw(self, fmt, n_units, n_events):
+        """
+        Measures peak memory of alignment of individual spike times
+        """
+
+        align.to_events(self.times, self.events, INTERVAL)
+
+    def peakmem_binned(self, fmt, n_units, n_events):
+        """
+        Measures peak memory of alignment and binning
+        """
+
+        align.to_events(self.times, self.events, INTERVAL, bin_size=BIN_SIZE)
+
+
+class AlignOutputs:
+    """
+    Aligns Poisson or bursting spike trains into every output mode
+    """
+
+    params = (
+        ["raw", "raw_df", "dense", "dense_da", "sparse", "lazy"],
+        ["poisson", "bursting"],
+        [100, 2000],
+        [100, 2000, 20000],
+    )
+    param_names = ["output", "generator", "n_units", "n_events"]
+    timeout = 600
+
+    def setup(self, output, generator, n_units, n_events):
+        """
+        Generates the spike trains and events
+        """
+
+        check_size(n_units, n_events, dense=output.startswith("dense"))
+
+        if generator == "poisson":
+            generate = poisson_spike_trains
+        else:
+            generate = bursting_spike_trains
+
+        self.events = event_times(n_events)
+        self.times = to_format(
+            generate(n_units, session_duration(n_events), RATE),
+            "SpikeTrains",
+        )
+
+        labels = np.arange(n_events) % 4
+        self.kwargs = {
+            "raw": {},
+            "raw_df": {"return_df": True, "event_labels": labels},
+            "dense": {"bin_size": BIN_SIZE},
+            "dense_da": {
+                "bin_size": BIN_SIZE,
+                "return_df": True,
+                "event_labels": labels,
+            },
+            "sparse": {"bin_size": BIN_SIZE, "output": "sparse"},
+            "lazy": {"bin_size": BIN_SIZE, "output": "lazy"},
+        }[output]
+
+    def run(self, output):
+        """
+        Aligns the spikes; lazy counts are summed over events,
+        so that every chunk is computed
+        """
+
+        result = align.to_events(
+            self.times, self.events, INTERVAL, **self.kwargs
+        )
+
+        if output == "lazy":
+            result[1].sum(axis=1).compute()
+
+    def time_to_events(self, output, generator, n_units, n_events):
+        """
+        Times alignment into one output mode
+        """
+
+        self.run(output)
+
+    def peakmem_to_events(self, output, generator, n_units, n_events):
+        """
+        Measures peak memory of alignment into one output mode
+        """
+
+        self.run(output)
+
+
+class TrialAverage:
+    """
+    Averages binned counts across events without the count tensor
+    """
+
+    params = ([100, 2000], [100, 2000, 20000])
+    param_names = ["n_units", "n_events"]
+    timeout = 600
+
+    def setup(self, n_units, n_events):
+        """
+        Generates the spike trains and events
+        """
+
+        check_size(n_units, n_events)
+
+        self.events = event_times(n_events)
+        self.times = to_format(
+            poisson_spike_trains(n_units, session_duration(n_events), RATE),
+            "SpikeTrains",
+        )
+
+    def time_trial_average(self, n_units, n_events):
+        """
+        Times the mean and standard error across events
+        """
+
+        align.trial_average(
+            self.times, self.events, INTERVAL, BIN_SIZE, ["mean", "sem"]
+        )
+
+    def peakmem_trial_average(self, n_units, n_events):
+        """
+        Measures peak memory of the mean and standard error
+        """
+
+        align.trial_average(
+            self.times, self.events, INTERVAL, BIN_SIZE, ["mean", "sem"]
+        )
+
+
+class SpikeCounts:
+    """
+    Counts spikes in response windows for decoding-sized sessions
+    """
+
+    params = ([100, 2000], [2000, 10000], [1, 2])
+    param_names = ["n_units", "n_events", "n_windows"]
+    timeout = 600
+
+    def setup(self, n_units, n_events, n_windows):
+        """
+        Generates the spike trains, events and windows
+        """
+
+        check_size(n_units, n_events)
+
+        self.events = event_times(n_events)
+        self.times = to_format(
+            poisson_spike_trains(n_units, session_duration(n_events), RATE),
+            "SpikeTrains",
+        )
+        self.windows = [(0.0, 0.5), (-0.5, 0.0)][:n_windows]
+
+    def time_spike_counts(self, n_units, n_events, n_windows):
+        """
+        Times the count matrix
+        """
+
+        align.spike_counts(self.times, self.events, self.windows)
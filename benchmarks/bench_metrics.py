@@ -0,0 +1,75 @@
+""" Benchmarks for `metrics.spike_latency` and `metrics.psth_latency`
+"""
+
+from aind_ephys_utils import metrics
+
+from .generators import event_times, poisson_spike_trains, session_duration
+
+INTERVAL = (-0.1, 0.2)
+
+
+class SpikeLatency:
+    """
+    Computes the latency of one unit
+    """
+
+    params = ([True, False], [100, 2000, 20000])
+    param_names = ["use_psth", "n_events"]
+
+    def setup(self, use_psth, n_events):
+        """
+        Generates the spike train and events
+        """
+
+        self.events = event_times(n_events)
+        self.times = poisson_spike_trains(1, session_duration(n_events))[0]
+
+    def time_spike_latency(self, use_psth, n_events):
+        """
+        Times the latency computation
+        """
+
+        metrics.spike_latency(
+            self.times, self.events, INTERVAL, use_psth=use_psth
+        )
+
+    def peakmem_spike_latency(self, use_psth, n_events):
+        """
+        Measures peak memory of the latency computation
+        """
+
+        metrics.spike_latency(
+            self.times, self.events, INTERVAL, use_psth=use_psth
+        )
+
+
+class PsthLatency:
+    """
+    Computes the PSTH latency of many units at once
+    """
+
+    params = ([1, 100, 2000], [100, 2000])
+    param_names = ["n_units", "n_events"]
+    timeout = 600
+
+    def setup(self, n_units, n_events):
+        """
+        Generates the spike trains and events
+        """
+
+        self.events = event_times(n_events)
+        self.times = poisson_spike_trains(n_units, session_duration(n_events))
+
+    def time_psth_latency(self, n_units, n_events):
+        """
+        Times the latency computation
+        """
+
+        metrics.psth_latency(self.times, self.events, INTERVAL)
+
+    def peakmem_psth_latency(self, n_units, n_events):
+        """
+        Measures peak memory of the latency computation
+        """
+
+        metrics.psth_latency(self.times, self.events, INTERVAL)
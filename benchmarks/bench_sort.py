@@ -0,0 +1,54 @@
+""" Benchmarks for `sort.by_condition`
+"""
+
+import numpy as np
+
+from aind_ephys_utils import align, sort
+
+from .generators import event_times, poisson_spike_trains, session_duration
+
+
+class ByCondition:
+    """
+    Sorts aligned spike times by condition
+    """
+
+    params = ([10, 300], [2000, 20000], [2, 100])
+    param_names = ["n_units", "n_events", "n_conditions"]
+    timeout = 600
+
+    def setup(self, n_units, n_events, n_conditions):
+        """
+        Aligns spike trains to events with random conditions
+        """
+
+        rng = np.random.default_rng(0)
+
+        self.df = align.to_events(
+            poisson_spike_trains(n_units, session_duration(n_events)),
+            event_times(n_events),
+            (-0.5, 1.0),
+            event_labels=rng.integers(0, n_conditions, n_events),
+            return_df=True,
+        )
+
+    def time_by_condition(self, n_units, n_events, n_conditions):
+        """
+        Times sorting into a new DataFrame
+        """
+
+        sort.by_condition(self.df)
+
+    def time_by_condition_indices(self, n_units, n_events, n_conditions):
+        """
+        Times computing the sorting permutation only
+        """
+
+        sort.by_condition(self.df, return_indices=True)
+
+    def peakmem_by_condition(self, n_units, n_events, n_conditions):
+        """
+        Measures peak memory of sorting into a new DataFrame
+        """
+
+        sort.by_condition(self.df)
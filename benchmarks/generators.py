@@ -0,0 +1,148 @@
+""" Module to generate seeded synthetic spike trains and events
+for benchmarks
+"""
+
+import numpy as np
+import pandas as pd
+
+from aind_ephys_utils.spike_trains import SpikeTrains
+
+FORMATS = ("ndarray", "list", "dict", "DataFrame", "SpikeTrains")
+
+EVENT_INTERVAL = 0.5  # mean time between events (in seconds)
+
+
+def poisson_spike_trains(n_units, duration, rate=5.0, seed=0):
+    """
+    Generates homogeneous Poisson spike trains
+
+    Parameters
+    ----------
+    n_units : int
+        Number of units
+    duration : float
+        Length of the session (in seconds)
+    rate : float, optional (default = 5)
+        Mean firing rate of each unit (in Hz)
+    seed : int, optional (default = 0)
+        Seed of the random number generator
+
+    Returns
+    -------
+    times : List[ndarray]
+        Sorted spike times of each unit
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    return [
+        np.sort(rng.uniform(0, duration, rng.poisson(rate * duration)))
+        for unit in range(n_units)
+    ]
+
+
+def bursting_spike_trains(
+    n_units, duration, rate=5.0, burst_size=4, isi=0.004, seed=0
+):
+    """
+    Generates spike trains made of Poisson-timed bursts
+
+    Parameters
+    ----------
+    n_units : int
+        Number of units
+    duration : float
+        Length of the session (in seconds)
+    rate : float, optional (default = 5)
+        Mean firing rate of each unit (in Hz)
+    burst_size : int, optional (default = 4)
+        Number of spikes in each burst
+    isi : float, optional (default = 0.004)
+        Mean interval between spikes within a burst (in seconds)
+    seed : int, optional (default = 0)
+        Seed of the random number generator
+
+    Returns
+    -------
+    times : List[ndarray]
+        Sorted spike times of each unit
+
+    """
+
+    rng = np.random.default_rng(seed)
+    times = []
+
+    for unit in range(n_units):
+        n_bursts = rng.poisson(rate * duration / burst_size)
+        onsets = rng.uniform(0, duration, n_bursts)
+        intervals = rng.exponential(isi, (n_bursts, burst_size))
+        intervals[:, 0] = 0
+        spikes = onsets[:, np.newaxis] + np.cumsum(intervals, 1)
+        times.append(np.sort(spikes[spikes < duration]))
+
+    return times
+
+
+def event_times(n_events, seed=0):
+    """
+    Generates jittered, regularly spaced event times
+
+    Parameters
+    ----------
+    n_events : int
+        Number of events
+    seed : int, optional (default = 0)
+        Seed of the random number generator
+
+    Returns
+    -------
+    events : ndarray
+        Sorted event times (in seconds), starting after
+        EVENT_INTERVAL and ending EVENT_INTERVAL before the
+        session duration returned by `session_duration`
+
+    """
+
+    rng = np.random.default_rng(seed)
+    jitter = rng.uniform(-0.1, 0.1, n_events) * EVENT_INTERVAL
+
+    return (np.arange(n_events) + 1 + jitter) * EVENT_INTERVAL
+
+
+def session_duration(n_events):
+    """
+    Returns the session duration (in seconds) for a number of events
+    """
+
+    return (n_events + 2) * EVENT_INTERVAL
+
+
+def to_format(times, fmt):
+    """
+    Converts a list of spike trains into an input format
+    accepted by `align.to_events`
+
+    Parameters
+    ----------
+    times : List[ndarray]
+        Sorted spike times of each unit
+    fmt : str
+        One of FORMATS; 'ndarray' uses the first unit only
+
+    Returns
+    -------
+    times : ndarray, List[ndarray], dict, DataFrame, or SpikeTrains
+
+    """
+
+    if fmt == "ndarray":
+        return times[0]
+    elif fmt == "list":
+        return times
+    elif fmt == "dict":
+        return {unit: spikes for unit, spikes in enumerate(times)}
+    elif fmt == "DataFrame":
+        return pd.DataFrame(data={"spike_times": times})
+    else:
+        return SpikeTrains.from_times(times)
@@ -3,5 +3,11 @@
 __version__ = "0.0.15"
 
 from . import align  # noqa: F401
+from . import correlograms  # noqa: F401
 from . import metrics  # noqa: F401
+from . import parallel  # noqa: F401
+from . import profiling  # noqa: F401
+from . import pyramid  # noqa: F401
+from . import rates  # noqa: F401
 from . import sort  # noqa: F401
+from . import spike_trains  # noqa: F401
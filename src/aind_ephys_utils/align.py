@@ -2,11 +2,18 @@
 (usually spike times and events).
 """
 
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 import xarray as xr
 
+from . import profiling
+from .parallel import UnitPool
+from .spike_trains import SpikeTrains, get_unit_ids, get_unit_times
+
 
+@profiling.timed("align.to_events")
 def to_events(  # noqa: C901
     times,
     events,
@@ -16,6 +23,14 @@ def to_events(  # noqa: C901
     unit_ids=None,
     return_df=False,
     spike_times_key="spike_times",
+    count_dtype=None,
+    n_jobs=None,
+    executor=None,
+    output="dense",
+    chunks=None,
+    time_dtype=None,
+    sampling_rate=None,
+    event_timebase="seconds",
 ):
     """
     Aligns spikes times (sorted in ascending order) to
@@ -26,6 +41,7 @@ def to_events(  # noqa: C901
     - list of 1-dimensional ndarrays of times for multiple units
     - dict of 1-dimensional ndarrays with unit IDs as keys
     - DataFrame indexed by unit IDs, with a "spike_times" column
+    - SpikeTrains object (flat buffer of times plus offsets)
 
     If the optional `bin_size` argument is supplied, the spike
     times are binned.
@@ -36,13 +52,16 @@ def to_events(  # noqa: C901
 
     Parameters
     ----------
-    times : ndarray, List[ndarrays], dict, or DataFrame
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
         1-D sequence(s) of times to align (in seconds). Must
         be sorted in ascending order.
     events : ndarray
         1-D sequence of reference times (in seconds).
-    interval : tuple
-        Start and end of the window around each event (in seconds).
+    interval : tuple or ndarray
+        Start and end of the window around each event (in seconds), or
+        an events x 2 array with a different window for each event
+        (e.g. from cue to reward). Binned counts then cover the union
+        of the windows, and bins outside an event's window are zero.
     bin_size : float, optional
         Bin size (in seconds); if None, then individual times will be returned.
     unit_ids : List[int]
@@ -57,6 +76,46 @@ def to_events(  # noqa: C901
     spike_times_key : str, optional (default = 'spike_times')
         If 'times' argument is a DataFrame, this specifies the name of the
         column containing the spike times.
+    count_dtype : str or np.dtype, optional
+        Data type of the binned spike counts (e.g. 'uint8', 'uint16',
+        'int32'). Defaults to the smallest unsigned integer type that
+        can hold the largest number of spikes in any window.
+    n_jobs : int, optional
+        Number of parallel jobs across units; None or 1 runs serially,
+        and -1 uses all available cores.
+    executor : str or concurrent.futures.Executor, optional
+        "thread" (default) or "process" to run `n_jobs` workers in a
+        thread or process pool, or an existing Executor. Process workers
+        read the spike times from shared memory instead of pickled copies.
+    output : str, optional (default = 'dense')
+        Format of the binned spike counts: 'dense' for an ndarray, or
+        'sparse' for a 3-D `sparse.COO` array (requires the `sparse`
+        package), which is also wrapped by the DataArray if `return_df`
+        is True. Reductions such as `.mean("event_index")` or
+        `.groupby("event_label").sum()` work without densifying.
+        Use 'lazy' for a dask array (requires `dask`) whose chunks are
+        only aligned and binned when they are computed; in this case,
+        the default `count_dtype` is found with one pass over the
+        window edges when the array is built, `count_dtype` is checked
+        against each chunk's windows when it is computed, and `n_jobs`
+        is left to the dask scheduler.
+    chunks : dict, optional
+        For lazy output, the number of events and units in each chunk,
+        e.g. {"event_index": 1000, "unit_id": 32} (the default).
+    time_dtype : str or np.dtype, optional
+        Data type of the aligned times if bin_size is None (e.g.
+        'float32' to halve their memory). Defaults to the common type
+        of the spike and event times.
+    sampling_rate : float, optional
+        If given, `times` are integer sample indices at this rate (in
+        Hz), and alignment and binning use integer arithmetic, so every
+        spike lands in the right bin. `interval` is rounded to whole
+        samples, and `bin_size` must be a whole number of samples.
+        Aligned times are returned as sample offsets (int32 by
+        default), while bins are returned in seconds.
+    event_timebase : str, optional (default = 'seconds')
+        With `sampling_rate`, whether `events` are times in 'seconds'
+        (rounded to the nearest sample) or integer 'samples' indices.
 
     Returns
     -------
@@ -71,7 +130,7 @@ def to_events(  # noqa: C901
     if return_df = False and bin_size is not None:
     bins : ndarray
         1-D sequence of time bin left edges
-    counts : ndarray
+    counts : ndarray, sparse.COO, or dask.array.Array
         2-D or 3-D array of spike counts of size trials x bins (x units)
     unit_ids : ndarray
         1-D sequence of unit IDs
@@ -79,9 +138,9 @@ def to_events(  # noqa: C901
     if return_df = True and bin_size = None:
     df : pd.DataFrame with columns:
         - time : aligned times
-        - event_index : event index for each time
-        - event_label : event label for each time (optional)
-        - unit_id : unit label for each time (optional)
+        - event_index : event index for each time (int32)
+        - event_label : event label for each time (optional, categorical)
+        - unit_id : unit label for each time (categorical)
 
     if return_df = True and bin_size is not None:
     da : xr.DataArray with dimensions:
@@ -92,108 +151,3078 @@ def to_events(  # noqa: C901
     """
 
     if unit_ids is None:
-        if isinstance(times, np.ndarray):
-            unit_ids = [0]
-        elif isinstance(times, list):
-            unit_ids = np.arange(len(times))
-        elif isinstance(times, dict):
-            unit_ids = np.array(list(times.keys()))
-        elif isinstance(times, pd.DataFrame):
-            unit_ids = times.index.values
-
-    if bin_size is not None:
-        bins = np.arange(interval[0], interval[1] + bin_size, bin_size)
-        counts = np.zeros((bins.size - 1, events.size, len(unit_ids)))
+        unit_ids = get_unit_ids(times)
 
-    aligned_times = []
-    event_indices = []
-    unit_labels = []
+    events = np.asarray(events)
+    interval = _check_interval(interval, events.size)
 
     if event_labels is not None:
         if len(event_labels) != len(events):
             raise ValueError(
                 "events and event_labels must be the same length."
             )
-        labels = []
 
-    for i, start in enumerate(events):
-        for j, unit in enumerate(unit_ids):
-            if isinstance(times, np.ndarray):
-                unit_times = times
-            elif isinstance(times, list):
-                unit_times = times[unit]
-            elif isinstance(times, dict):
-                unit_times = times[unit]
-            elif isinstance(times, pd.DataFrame):
-                unit_times = times.loc[unit][spike_times_key]
+    if output not in ("dense", "sparse", "lazy"):
+        raise ValueError("output must be 'dense', 'sparse' or 'lazy'.")
 
-            start_index = np.searchsorted(unit_times, start + interval[0])
-            end_index = np.searchsorted(unit_times, start + interval[1])
+    if output != "dense" and bin_size is None:
+        raise ValueError(f"output='{output}' requires a bin_size.")
+
+    with profiling.stage("align.lookup"):
+        unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+    if sampling_rate is None:
+        time_dtype = time_dtype or np.result_type(events, *unit_times)
+    else:
+        events, interval, bin_size = _to_samples(
+            unit_times,
+            events,
+            interval,
+            bin_size,
+            sampling_rate,
+            event_timebase,
+        )
+        time_dtype = time_dtype or _index_dtype(
+            np.max(np.abs(interval), initial=0) + 1
+        )
+
+    if bin_size is not None:
+        bins = _bin_edges(interval, bin_size)
+
+    if output == "lazy":
+        with profiling.stage("align.bin"):
+            counts = _lazy_bin_counts(
+                unit_times, events, interval, bins, count_dtype, chunks
+            )
+    else:
+        with UnitPool(unit_times, n_jobs, executor) as pool:
+            with profiling.stage("align.search") as stage:
+                starts, ends = _pool_window_indices(pool, events, interval)
+                if stage:
+                    stage.add(nbytes=starts.nbytes + ends.nbytes)
 
             if bin_size is not None:
-                counts[:, i, j] = np.histogram(
-                    unit_times[start_index:end_index] - start, bins
-                )[0]
+                with profiling.stage("align.bin") as stage:
+                    counts = _pool_bin_counts(
+                        pool, events, starts, ends, bins, count_dtype, output
+                    )
+                    if stage:
+                        stage.add(np.sum(ends - starts), counts.nbytes)
             else:
-                aligned_times.append(unit_times[start_index:end_index] - start)
-                event_indices.append(
-                    np.zeros((end_index - start_index,), dtype="int") + i
-                )
-                unit_labels.append(
-                    np.zeros((end_index - start_index,), dtype="int") + unit
-                )
-                if event_labels is not None:
-                    labels.append(
-                        [event_labels[i]] * (end_index - start_index)
+                with profiling.stage("align.gather") as stage:
+                    aligned = _gather_aligned(
+                        pool, events, starts, ends, time_dtype
                     )
+                    if stage:
+                        stage.add(
+                            aligned[0].size, sum(x.nbytes for x in aligned)
+                        )
 
-    if not return_df:
-        if bin_size is None:
-            return (
-                np.concatenate(aligned_times),
-                np.concatenate(event_indices),
-                np.concatenate(unit_labels),
+    with profiling.stage("align.format"):
+        if bin_size is not None:
+            if sampling_rate is not None:
+                bins = bins / sampling_rate
+            return _format_binned(
+                bins, counts, unit_ids, len(events), event_labels, return_df
             )
-        else:
-            return bins[:-1], np.squeeze(counts), unit_ids
-    else:
+
+        return _format_aligned(*aligned, unit_ids, event_labels, return_df)
+
+
+def iter_to_events(
+    times,
+    events,
+    interval,
+    bin_size,
+    unit_ids=None,
+    spike_times_key="spike_times",
+    count_dtype=None,
+    max_memory=2**28,
+    block_size=4096,
+):
+    """
+    Aligns and bins spike times in chunks of events, reading
+    only the spike data that falls near the event windows
+
+    Spike times can be stored out of core, as np.memmap arrays or
+    chunked HDF5 / Zarr datasets, either inside a SpikeTrains object
+    or as the values of a list or dict. For datasets that are not
+    ndarrays, every `block_size`-th spike time of each unit is read
+    once to locate the windows, and after that only the blocks that
+    overlap a window are read.
+
+    Parameters
+    ----------
+    times : ndarray, List[array-like], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple or ndarray
+        Start and end of the window around each event (in seconds),
+        or one window per event (see `to_events`).
+    bin_size : float
+        Bin size (in seconds).
+    unit_ids : List[int]
+        Labels for each unit (see `to_events`).
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    count_dtype : str or np.dtype, optional
+        Data type of the binned spike counts. Defaults to the smallest
+        unsigned integer type that can hold any window's spike count.
+    max_memory : int, optional (default = 2**28)
+        Approximate limit (in bytes) on the memory used by each chunk,
+        including its counts and the spike times read to compute it.
+    block_size : int, optional (default = 4096)
+        Number of spikes per block read from datasets that
+        are not ndarrays.
+
+    Yields
+    ------
+    event_slice : slice
+        Range of events covered by this chunk
+    bins : ndarray
+        1-D sequence of time bin left edges
+    counts : ndarray
+        3-D array of spike counts of size bins x events x units
+
+    """
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    events = np.asarray(events)
+    interval = _check_interval(interval, events.size)
+    bins = _bin_edges(interval, bin_size)
+    sources = _spike_sources(times, unit_ids, spike_times_key, block_size)
+
+    window_starts = events + interval[..., 0]
+    window_ends = events + interval[..., 1]
+
+    max_count = 0
+    read_bytes = np.zeros((events.size,), dtype="int64")
+
+    for source in sources:
+        first, last = _window_extent(source, window_starts, window_ends)
+        max_count = max(max_count, np.max(last - first, initial=0))
+        if source.sample is not None:
+            itemsize = source.buffer.dtype.itemsize
+            np.maximum(read_bytes, (last - first) * itemsize, out=read_bytes)
+
+    dtype = _count_dtype(max_count, count_dtype)
+    n_bins = bins.size - 1
+
+    event_bytes = n_bins * (len(sources) * dtype.itemsize + 8) + read_bytes
+    cumulative_bytes = np.cumsum(event_bytes)
+
+    chunk_start = 0
+
+    while chunk_start < events.size:
+        budget = max_memory
+        if chunk_start > 0:
+            budget += cumulative_bytes[chunk_start - 1]
+        chunk_end = max(
+            np.searchsorted(cumulative_bytes, budget, side="right"),
+            chunk_start + 1,
+        )
+        chunk = slice(chunk_start, chunk_end)
+
+        counts = np.zeros(
+            (n_bins, chunk_end - chunk_start, len(sources)), dtype
+        )
+
+        for j, source in enumerate(sources):
+            first, last = _window_extent(
+                source, window_starts[chunk], window_ends[chunk]
+            )
+            spikes = [_read_spikes(source, first, last)]
+            starts, ends = _window_indices(
+                spikes, events[chunk], _event_interval(interval, chunk)
+            )
+            _bin_counts(
+                spikes,
+                events[chunk],
+                starts,
+                ends,
+                bins,
+                out=counts[:, :, j, np.newaxis],
+            )
+
+        yield chunk, bins[:-1], counts
+
+        chunk_start = chunk_end
+
+
+def to_events_into(out, times, events, interval, bin_size, **kwargs):
+    """
+    Aligns and bins spike times in chunks of events, writing
+    each chunk into an array that may live on disk
+
+    Parameters
+    ----------
+    out : array-like
+        Writable array of size bins x events x units, such as an
+        np.memmap, h5py dataset or zarr array
+    times : ndarray, List[array-like], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple or ndarray
+        Start and end of the window around each event (in seconds),
+        or one window per event (see `to_events`).
+    bin_size : float
+        Bin size (in seconds).
+    **kwargs
+        Additional arguments passed to `iter_to_events`
+
+    Returns
+    -------
+    bins : ndarray
+        1-D sequence of time bin left edges
+    out : array-like
+        The array of spike counts
+
+    """
+
+    bins = _bin_edges(_check_interval(interval, len(events)), bin_size)
+
+    for event_slice, _, counts in iter_to_events(
+        times, events, interval, bin_size, **kwargs
+    ):
+        out[:, event_slice, :] = counts
+
+    return bins[:-1], out
+
+
+@profiling.timed("align.to_warped_events")
+def to_warped_events(
+    times,
+    landmarks,
+    target=None,
+    bin_size=None,
+    padding=(0.0, 0.0),
+    event_labels=None,
+    unit_ids=None,
+    return_df=False,
+    spike_times_key="spike_times",
+    count_dtype=None,
+    n_jobs=None,
+    executor=None,
+):
+    """
+    Aligns spike times to trials of variable length, warping
+    each trial onto a common time base
+
+    Each trial is defined by a sequence of landmark times (e.g.
+    cue, response and reward). Spikes between two consecutive
+    landmarks are mapped linearly onto the same segment of the
+    target time base, so every trial has the same duration after
+    warping. Spikes in the padding before the first landmark and
+    after the last one are only shifted, not stretched.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    landmarks : ndarray
+        events x landmarks array of times (in seconds), non-decreasing
+        within each event; at least two landmarks are required
+    target : ndarray, optional
+        1-D sequence of warped landmark times, relative to the first
+        landmark (in seconds); defaults to the mean landmark times
+        relative to the first landmark
+    bin_size : float, optional
+        Bin size (in seconds of warped time); if None, then individual
+        warped times will be returned.
+    padding : tuple, optional (default = (0.0, 0.0))
+        Unwarped time to include before the first landmark (negative)
+        and after the last landmark (positive), in seconds
+    event_labels : List[int] or List[str]
+        Labels for each event (optional).
+    unit_ids : List[int]
+        Labels for each unit (see `to_events`).
+    return_df : bool, optional (default = False)
+        If True, returns the results as a pandas DataFrame
+        (or xarray.DataArray if binning is enabled).
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    count_dtype : str or np.dtype, optional
+        Data type of the binned spike counts (see `to_events`).
+    n_jobs : int, optional
+        Number of parallel jobs (see `to_events`).
+    executor : str or Executor, optional
+        "thread", "process" or an existing Executor (see `to_events`).
+
+    Returns
+    -------
+    Same as `to_events`, with times (or time bins) on the warped
+    time base, relative to the first landmark of each event
+
+    """
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    landmarks, target = _check_landmarks(landmarks, target)
+    events = landmarks[:, 0]
+    offsets = landmarks - events[:, np.newaxis]
+
+    if event_labels is not None:
+        if len(event_labels) != len(events):
+            raise ValueError(
+                "landmarks and event_labels must be the same length."
+            )
+
+    with profiling.stage("align.lookup"):
+        unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+    interval = np.column_stack(
+        (np.full(events.shape, padding[0]), offsets[:, -1] + padding[1])
+    )
+
+    with UnitPool(unit_times, n_jobs, executor) as pool:
+        with profiling.stage("align.search"):
+            starts, ends = _pool_window_indices(pool, events, interval)
+
+        with profiling.stage("align.gather"):
+            aligned_times, event_indices, unit_indices = _gather_aligned(
+                pool, events, starts, ends, np.result_type(events, *unit_times)
+            )
+
+    with profiling.stage("align.warp") as stage:
+        warped_times = _warp(aligned_times, offsets, event_indices, target)
+        if stage:
+            stage.add(warped_times.size, warped_times.nbytes)
+
+    with profiling.stage("align.format"):
         if bin_size is None:
-            if event_labels is None:
-                return pd.DataFrame(
-                    data={
-                        "time": np.concatenate(aligned_times),
-                        "event_index": np.concatenate(event_indices),
-                        "unit_id": np.concatenate(unit_labels),
-                    }
-                )
-            else:
-                return pd.DataFrame(
-                    data={
-                        "time": np.concatenate(aligned_times),
-                        "event_index": np.concatenate(event_indices),
-                        "event_label": np.concatenate(labels),
-                        "unit_id": np.concatenate(unit_labels),
-                    }
-                )
-        else:
-            if event_labels is None:
-                return xr.DataArray(
-                    data=counts,
-                    coords={
-                        "time": bins[:-1],
-                        "event_index": np.arange(len(events)),
-                        "unit_id": unit_ids,
-                    },
-                )
-            else:
-                return xr.DataArray(
-                    data=counts,
-                    coords={
-                        "time": bins[:-1],
-                        "event_label": event_labels,
-                        "unit_id": unit_ids,
-                    },
-                )
+            return _format_aligned(
+                warped_times,
+                event_indices,
+                unit_indices,
+                unit_ids,
+                event_labels,
+                return_df,
+            )
+
+        bins = np.arange(
+            target[0] + padding[0],
+            target[-1] + padding[1] + bin_size,
+            bin_size,
+        )
+        counts = np.zeros(
+            (bins.size - 1, events.size, len(unit_times)),
+            dtype=_count_dtype(np.max(ends - starts, initial=0), count_dtype),
+        )
+        _warped_bin_counts(
+            warped_times, event_indices, unit_indices, bins, counts
+        )
+
+        return _format_binned(
+            bins, counts, unit_ids, len(events), event_labels, return_df
+        )
+
+
+@profiling.timed("align.trial_average")
+def trial_average(
+    times,
+    events,
+    interval,
+    bin_size,
+    statistic="mean",
+    ddof=1,
+    event_labels=None,
+    unit_ids=None,
+    return_df=False,
+    spike_times_key="spike_times",
+    n_jobs=None,
+    executor=None,
+):
+    """
+    Computes the mean, variance or standard error of the binned
+    spike counts across events, without building the full
+    bins x events x units array
+
+    If `event_labels` are given, the statistics are computed for
+    each condition separately, by grouping the events on integer
+    codes while they are binned.
+
+    Each unit is aligned on its own, and only the sums and sums of
+    squares of its non-zero counts are kept, so the memory used
+    does not grow with the number of bins times the number of events.
+    Because the counts are integers, both sums are exact and the
+    variance does not suffer from cancellation.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple or ndarray
+        Start and end of the window around each event (in seconds),
+        or one window per event (see `to_events`); bins outside an
+        event's window count as zero.
+    bin_size : float
+        Bin size (in seconds).
+    statistic : str or List[str], optional (default = 'mean')
+        'sum', 'mean', 'var' or 'sem' of the counts across events,
+        or a sequence of these
+    ddof : int, optional (default = 1)
+        Delta degrees of freedom of the variance and standard error
+    event_labels : List[int] or List[str], optional
+        Condition of each event; statistics are computed over the
+        events of each condition
+    unit_ids : List[int]
+        Labels for each unit (see `to_events`).
+    return_df : bool, optional (default = False)
+        If True, returns an xarray.DataArray
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    n_jobs : int, optional
+        Number of parallel jobs (see `to_events`).
+    executor : str or Executor, optional
+        "thread", "process" or an existing Executor (see `to_events`).
+
+    Returns
+    -------
+    if return_df = False:
+    bins : ndarray
+        1-D sequence of time bin left edges
+    values : ndarray
+        bins x units array of the statistic, with a leading
+        conditions axis if `event_labels` are given (in the
+        sorted order of the labels), and a leading statistics
+        axis if `statistic` is a sequence
+    unit_ids : List[int] or ndarray
+        1-D sequence of unit IDs
+    n_events : ndarray
+        Number of events of each condition (only returned
+        if `event_labels` are given)
+
+    if return_df = True:
+    da : xr.DataArray with dimensions:
+        - statistic : name of each statistic (if `statistic` is a sequence)
+        - event_label : condition (if `event_labels` are given), with
+          the number of events of each condition as an "n_events"
+          coordinate
+        - time : time relative to each event
+        - unit_id : label of each unit
+
+    """
+
+    statistics = [statistic] if isinstance(statistic, str) else statistic
+
+    if not set(statistics) <= {"sum", "mean", "var", "sem"}:
+        raise ValueError("statistic must be 'sum', 'mean', 'var' or 'sem'.")
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    events = np.asarray(events)
+    interval = _check_interval(interval, events.size)
+    bins = _bin_edges(interval, bin_size)
+
+    codes, conditions = _condition_codes(event_labels, events.size)
+
+    with profiling.stage("align.lookup"):
+        unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+    with profiling.stage("align.bin") as stage:
+        with UnitPool(unit_times, n_jobs, executor) as pool:
+            sums = pool.zeros(
+                (2, len(conditions), bins.size - 1, len(unit_times)),
+                "float64",
+            )
+            pool.map(
+                _trial_sums,
+                events,
+                interval,
+                bins,
+                codes,
+                sums,
+                per_unit=((4, 3),),
+            )
+            sums = pool.result(sums)
+        if stage:
+            stage.add(np.sum(sums[0]), sums.nbytes)
+
+    n_events = np.bincount(codes, minlength=len(conditions))
+    values = np.stack(
+        [
+            _trial_statistic(name, *sums, n_events[:, None, None], ddof)
+            for name in statistics
+        ]
+    )
+
+    dims = ["statistic", "event_label", "time", "unit_id"]
+    if event_labels is None:
+        values = values[:, 0]
+        dims.remove("event_label")
+    if isinstance(statistic, str):
+        values = values[0]
+        dims.remove("statistic")
+
+    if not return_df:
+        if event_labels is None:
+            return bins[:-1], values, unit_ids
+        return bins[:-1], values, unit_ids, n_events
+
+    coords = {"time": bins[:-1], "unit_id": unit_ids}
+
+    if event_labels is not None:
+        coords["event_label"] = conditions
+        coords["n_events"] = ("event_label", n_events)
+    if not isinstance(statistic, str):
+        coords["statistic"] = statistics
+
+    return xr.DataArray(data=values, coords=coords, dims=dims)
+
+
+@profiling.timed("align.to_events_by_condition")
+def to_events_by_condition(
+    times,
+    events,
+    interval,
+    event_labels,
+    unit_ids=None,
+    return_df=False,
+    spike_times_key="spike_times",
+    n_jobs=None,
+    executor=None,
+    time_dtype=None,
+):
+    """
+    Aligns spike times to a set of events, grouped by condition
+
+    Events are ordered by condition (and then by time order) before
+    they are aligned, so the aligned spikes come out already sorted,
+    without building and reordering a DataFrame with
+    `sort.by_condition`.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple or ndarray
+        Start and end of the window around each event (in seconds),
+        or one window per event (see `to_events`).
+    event_labels : List[int] or List[str]
+        Condition of each event; missing labels sort last
+    unit_ids : List[int]
+        Labels for each unit (see `to_events`).
+    return_df : bool, optional (default = False)
+        If True, returns the results as a pandas DataFrame
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    n_jobs : int, optional
+        Number of parallel jobs (see `to_events`).
+    executor : str or Executor, optional
+        "thread", "process" or an existing Executor (see `to_events`).
+    time_dtype : str or np.dtype, optional
+        Data type of the aligned times (see `to_events`).
+
+    Returns
+    -------
+    Same as `to_events` without binning, where the event index of each
+    spike is the position of its event in condition order. Unlike
+    `sort.by_condition`, trials without spikes keep their index.
+
+    if return_df = False:
+    order : ndarray
+        Original index of the event at each position
+
+    """
+
+    codes, _ = _condition_codes(event_labels, len(events))
+    order = np.argsort(codes, kind="stable")
+
+    result = to_events(
+        times,
+        np.asarray(events)[order],
+        _event_interval(_check_interval(interval, len(events)), order),
+        event_labels=np.asarray(event_labels)[order],
+        unit_ids=unit_ids,
+        return_df=return_df,
+        spike_times_key=spike_times_key,
+        n_jobs=n_jobs,
+        executor=executor,
+        time_dtype=time_dtype,
+    )
+
+    if return_df:
+        return result
+
+    return result + (order,)
+
+
+@profiling.timed("align.spike_counts")
+def spike_counts(
+    times,
+    events,
+    windows,
+    unit_ids=None,
+    event_labels=None,
+    rate=False,
+    return_df=False,
+    spike_times_key="spike_times",
+    count_dtype=None,
+    n_jobs=None,
+    executor=None,
+):
+    """
+    Counts the spikes of each unit in one or more response
+    windows around each event
+
+    Each count is the difference of two `searchsorted` indices,
+    so no spike times are copied and no bins are allocated.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to count (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    windows : tuple or ndarray
+        Start and end of the response window around each event (in
+        seconds); a windows x 2 array of several windows; or an
+        events x windows x 2 array with different windows for each
+        event. Spikes in [start, end) are counted, as in `to_events`.
+    unit_ids : List[int]
+        Labels for each unit (see `to_events`).
+    event_labels : List[int] or List[str]
+        Labels for each event (optional).
+    rate : bool, optional (default = False)
+        If True, divides the counts by the window durations
+        to return firing rates (in spikes per second)
+    return_df : bool, optional (default = False)
+        If True, returns an xarray.DataArray
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    count_dtype : str or np.dtype, optional
+        Data type of the counts; defaults to the smallest unsigned
+        integer type that can hold the largest window count
+    n_jobs : int, optional
+        Number of parallel jobs (see `to_events`).
+    executor : str or Executor, optional
+        "thread", "process" or an existing Executor (see `to_events`).
+
+    Returns
+    -------
+    if return_df = False:
+    counts : ndarray
+        events x units array of spike counts (or rates), or
+        events x units x windows if several windows are given
+    unit_ids : List[int] or ndarray
+        1-D sequence of unit IDs
+
+    if return_df = True:
+    da : xr.DataArray with dimensions:
+        - event_index or event_label : label for each event
+        - unit_id : label of each unit
+        - window : index of each window (if several windows are
+          given), with "window_start" and "window_end" coordinates
+          if the windows are shared by all events
+
+    """
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    events = np.asarray(events)
+    single = np.shape(windows) == (2,)
+    windows = _check_windows(windows, events.size)
+
+    if event_labels is not None and len(event_labels) != len(events):
+        raise ValueError("events and event_labels must be the same length.")
+
+    with profiling.stage("align.lookup"):
+        unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+    # windows that share an edge (e.g. baseline and response)
+    # share its search
+    if windows.ndim == 2:
+        edges, edge_indices = np.unique(windows, return_inverse=True)
+        bounds = edges[:, np.newaxis] + events
+    else:
+        edge_indices = np.arange(windows[0].size)
+        bounds = (events[:, np.newaxis] + windows.reshape((events.size, -1))).T
+
+    edge_indices = edge_indices.reshape((-1, 2))
+
+    with profiling.stage("align.search") as stage:
+        with UnitPool(unit_times, n_jobs, executor) as pool:
+            counts = pool.zeros(
+                (events.size, len(unit_times), edge_indices.shape[0]),
+                "int64",
+            )
+            pool.map(
+                _window_counts,
+                bounds,
+                edge_indices,
+                counts,
+                per_unit=((2, 1),),
+            )
+            counts = pool.result(counts)
+        counts = counts.astype(
+            _count_dtype(np.max(counts, initial=0), count_dtype), copy=False
+        )
+        if stage:
+            stage.add(nbytes=counts.nbytes)
+
+    if rate:
+        durations = windows[..., 1] - windows[..., 0]
+        counts = counts / np.expand_dims(durations, -2)
+
+    if single:
+        counts = counts[..., 0]
+
+    if not return_df:
+        return counts, unit_ids
+
+    return _format_counts(
+        counts,
+        windows,
+        unit_ids,
+        event_labels,
+        not single and windows.ndim == 2,
+    )
+
+
+@profiling.timed("align.to_snippets")
+def to_snippets(
+    data,
+    events,
+    interval,
+    sampling_rate=None,
+    timestamps=None,
+    event_labels=None,
+    channel_ids=None,
+    return_df=False,
+    fill_value=None,
+):
+    """
+    Extracts windows of a continuous signal (e.g. LFP, pupil
+    size or running speed) around a set of event times
+
+    Every window is taken from one strided view of the data, so the
+    snippets are gathered in a single vectorized copy; if the events
+    are evenly spaced and every window lies inside the data, the
+    result is a read-only view with no copy at all. Only windows that
+    run past either end of the data are padded, one at a time.
+
+    Parameters
+    ----------
+    data : ndarray or np.memmap
+        samples (x channels) array of the signal
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple
+        Start and end of the window around each event (in seconds);
+        rounded to whole samples.
+    sampling_rate : float, optional
+        Sampling rate (in Hz); sample k is at time k / sampling_rate.
+        Either this or `timestamps` is required.
+    timestamps : ndarray, optional
+        1-D sequence of the time of each sample (in seconds), for
+        signals that do not start at zero; each event is matched to
+        its nearest sample (events outside the timestamps are
+        extrapolated at the sampling rate), and the sampling rate
+        defaults to the mean rate of the timestamps.
+    event_labels : List[int] or List[str]
+        Labels for each event (optional).
+    channel_ids : List[int] or List[str], optional
+        Labels for each channel (defaults to the channel index)
+    return_df : bool, optional (default = False)
+        If True, returns an xarray.DataArray
+    fill_value : scalar, optional
+        Value of the samples outside the data; defaults to NaN for
+        floating-point data and 0 otherwise
+
+    Returns
+    -------
+    if return_df = False:
+    times : ndarray
+        1-D sequence of sample times relative to the events
+    snippets : ndarray
+        events x samples (x channels) array of the signal
+    channel_ids : List[int] or ndarray
+        1-D sequence of channel IDs (or None for 1-D data)
+
+    if return_df = True:
+    da : xr.DataArray with dimensions:
+        - event_index or event_label : label for each event
+        - time : time relative to each event
+        - channel : label of each channel (for 2-D data)
+
+    """
+
+    data = np.asarray(data)
+    events = np.asarray(events)
+
+    if event_labels is not None and len(event_labels) != len(events):
+        raise ValueError("events and event_labels must be the same length.")
+
+    event_samples, sampling_rate = _event_samples(
+        events, sampling_rate, timestamps
+    )
+
+    first = int(np.rint(interval[0] * sampling_rate))
+    n_samples = int(np.rint(interval[1] * sampling_rate)) - first
+    starts = event_samples + first
+
+    if n_samples <= 0:
+        raise ValueError("interval must span at least one sample.")
+
+    with profiling.stage("align.gather") as stage:
+        snippets = _gather_snippets(data, starts, n_samples, fill_value)
+        if stage:
+            stage.add(nbytes=snippets.nbytes * snippets.flags.owndata)
+
+    times = (first + np.arange(n_samples)) / sampling_rate
+
+    if data.ndim > 1 and channel_ids is None:
+        channel_ids = np.arange(data.shape[1])
+
+    if not return_df:
+        return times, snippets, channel_ids
+
+    if event_labels is None:
+        event_dim, event_coords = "event_index", np.arange(events.size)
+    else:
+        event_dim, event_coords = "event_label", event_labels
+
+    coords = {event_dim: event_coords, "time": times}
+    if data.ndim > 1:
+        coords["channel"] = channel_ids
+
+    return xr.DataArray(data=snippets, coords=coords, dims=list(coords))
+
+
+class Aligner:
+    """
+    Aligns spike times to a fixed set of events once, so that
+    repeated queries with different windows, bin sizes, event
+    subsets or labels do not start from scratch
+
+    The window indices for the largest window of interest
+    (`max_interval`) are found when the object is created. Queries
+    over that window slice these indices for the requested events;
+    narrower windows are found by searching only the spikes inside
+    the cached windows, not the full spike trains.
+    Binned counts are kept in a least-recently-used cache, so
+    repeating a query (e.g., when switching back and forth between
+    bin sizes in a notebook) returns immediately.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    max_interval : tuple
+        Start and end of the largest window around each event
+        (in seconds) that will be queried.
+    unit_ids : List[int]
+        Labels for each unit (see `to_events`).
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    cache_size : int, optional (default = 8)
+        Maximum number of binned count arrays to keep.
+    n_jobs : int, optional
+        Number of parallel jobs (see `to_events`).
+    executor : str or Executor, optional
+        "thread", "process" or an existing Executor (see `to_events`).
+
+    """
+
+    def __init__(
+        self,
+        times,
+        events,
+        max_interval,
+        unit_ids=None,
+        spike_times_key="spike_times",
+        cache_size=8,
+        n_jobs=None,
+        executor=None,
+    ):
+        """
+        Finds the window indices for the largest window of interest
+        """
+
+        if unit_ids is None:
+            unit_ids = get_unit_ids(times)
+
+        self.unit_ids = unit_ids
+        self.events = np.asarray(events)
+        self.max_interval = tuple(max_interval)
+        self.cache_size = cache_size
+        self.n_jobs = n_jobs
+        self.executor = executor
+
+        self._unit_times = get_unit_times(times, unit_ids, spike_times_key)
+        self._dtype = np.result_type(self.events, *self._unit_times)
+        self._cache = OrderedDict()
+
+        with self._pool() as pool:
+            self.starts, self.ends = _pool_window_indices(
+                pool, self.events, self.max_interval
+            )
+
+    def _pool(self):
+        """
+        Returns a UnitPool for the spike times
+        """
+
+        return UnitPool(self._unit_times, self.n_jobs, self.executor)
+
+    def to_events(
+        self,
+        interval=None,
+        bin_size=None,
+        event_indices=None,
+        event_labels=None,
+        return_df=False,
+        count_dtype=None,
+        time_dtype=None,
+    ):
+        """
+        Returns aligned (and optionally binned) spike times,
+        in the same formats as `align.to_events`
+
+        Parameters
+        ----------
+        interval : tuple, optional
+            Start and end of the window around each event (in seconds);
+            must lie inside `max_interval` (the default).
+        bin_size : float, optional
+            Bin size (in seconds); if None, then individual times
+            will be returned.
+        event_indices : ndarray, optional
+            Indices of the events to include (defaults to all events).
+        event_labels : List[int] or List[str]
+            Labels for each included event (optional).
+        return_df : bool, optional (default = False)
+            If True, returns the results as a pandas DataFrame
+            (or xarray.DataArray if binning is enabled).
+        count_dtype : str or np.dtype, optional
+            Data type of the binned spike counts.
+        time_dtype : str or np.dtype, optional
+            Data type of the aligned times if bin_size is None.
+
+        Returns
+        -------
+        See `align.to_events`. Binned counts are shared with the
+        cache, and are therefore read-only.
+
+        """
+
+        if interval is None:
+            interval = self.max_interval
+
+        interval = tuple(interval)
+
+        if (
+            interval[0] < self.max_interval[0]
+            or interval[1] > self.max_interval[1]
+        ):
+            raise ValueError("interval must lie within max_interval.")
+
+        if event_indices is None:
+            event_indices = np.arange(self.events.size)
+
+        event_indices = np.asarray(event_indices)
+
+        if event_labels is not None:
+            if len(event_labels) != len(event_indices):
+                raise ValueError(
+                    "event_indices and event_labels must be the same length."
+                )
+
+        if bin_size is None:
+            return _format_aligned(
+                *self._aligned(interval, event_indices, time_dtype),
+                self.unit_ids,
+                event_labels,
+                return_df,
+            )
+
+        bins = np.arange(interval[0], interval[1] + bin_size, bin_size)
+
+        key = (
+            interval,
+            bin_size,
+            event_indices.tobytes(),
+            None if count_dtype is None else np.dtype(count_dtype).str,
+        )
+
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            counts = self._cache[key]
+        else:
+            counts = self._binned(interval, bins, event_indices, count_dtype)
+            counts.flags.writeable = False
+
+            self._cache[key] = counts
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return _format_binned(
+            bins,
+            counts,
+            self.unit_ids,
+            event_indices.size,
+            event_labels,
+            return_df,
+        )
+
+    def clear_cache(self):
+        """
+        Removes all binned counts from the cache
+        """
+
+        self._cache.clear()
+
+    def _windows(self, pool, interval, event_indices):
+        """
+        Returns the window indices for a subset of events
+
+        Parameters
+        ----------
+        pool : UnitPool
+            Pool for the spike times
+        interval : tuple
+            Start and end of the window around each event
+        event_indices : ndarray
+            Indices of the events to include
+
+        Returns
+        -------
+        starts : ndarray
+            events x units array of window start indices
+        ends : ndarray
+            events x units array of window end indices (exclusive)
+
+        """
+
+        starts = self.starts[event_indices]
+        ends = self.ends[event_indices]
+
+        if interval == self.max_interval:
+            return starts, ends
+
+        results = pool.map(
+            _narrow_window_indices,
+            self.events[event_indices],
+            interval,
+            starts,
+            ends,
+            per_unit=((2, 1), (3, 1)),
+        )
+
+        return (
+            np.hstack([starts for starts, ends in results]),
+            np.hstack([ends for starts, ends in results]),
+        )
+
+    def _aligned(self, interval, event_indices, time_dtype=None):
+        """
+        Returns the aligned spike times for a subset of events
+
+        Parameters
+        ----------
+        interval : tuple
+            Start and end of the window around each event
+        event_indices : ndarray
+            Indices of the events to include
+        time_dtype : np.dtype, optional
+            Data type of the aligned times
+
+        Returns
+        -------
+        See `_gather_aligned`
+
+        """
+
+        events = self.events[event_indices]
+
+        with self._pool() as pool:
+            starts, ends = self._windows(pool, interval, event_indices)
+            return _gather_aligned(
+                pool, events, starts, ends, time_dtype or self._dtype
+            )
+
+    def _binned(self, interval, bins, event_indices, count_dtype):
+        """
+        Returns binned spike counts for a subset of events
+
+        Parameters
+        ----------
+        interval : tuple
+            Start and end of the window around each event
+        bins : ndarray
+            1-D sequence of bin edges
+        event_indices : ndarray
+            Indices of the events to include
+        count_dtype : str or np.dtype, optional
+            Data type of the binned spike counts
+
+        Returns
+        -------
+        counts : ndarray
+            bins x events x units array of spike counts
+
+        """
+
+        events = self.events[event_indices]
+
+        with self._pool() as pool:
+            starts, ends = self._windows(pool, interval, event_indices)
+            return _pool_bin_counts(
+                pool, events, starts, ends, bins, count_dtype
+            )
+
+
+class StreamingAligner:
+    """
+    Aligns spike times to events while both are still being
+    acquired, e.g. to show live PSTHs during a recording
+
+    Spikes and events are added in chunks. Each event is aligned as
+    soon as the acquisition clock passes `event + interval[1]`, using
+    only a trailing buffer of recent spikes, so the cost of each chunk
+    does not grow with the length of the session.
+
+    Parameters
+    ----------
+    interval : tuple
+        Start and end of the window around each event (in seconds).
+    unit_ids : List[int]
+        Labels for each unit; spike chunks are looked up with these
+        IDs (see `to_events`).
+    bin_size : float, optional
+        Bin size (in seconds); if None, then individual times
+        will be returned.
+    count_dtype : str or np.dtype, optional
+        Data type of the binned spike counts; set this to get the
+        same data type for every chunk.
+    max_lag : float, optional (default = 0)
+        Maximum delay (in seconds) between an event time and the
+        acquisition clock when the event is added. Spikes that can
+        no longer fall in the window of a new event are discarded.
+    spike_times_key : str, optional (default = 'spike_times')
+        If spike chunks are DataFrames, this specifies the name of
+        the column containing the spike times.
+
+    """
+
+    def __init__(
+        self,
+        interval,
+        unit_ids,
+        bin_size=None,
+        count_dtype=None,
+        max_lag=0.0,
+        spike_times_key="spike_times",
+    ):
+        """
+        Creates an aligner with empty spike and event buffers
+        """
+
+        self.interval = interval
+        self.unit_ids = unit_ids
+        self.bin_size = bin_size
+        self.count_dtype = count_dtype
+        self.max_lag = max_lag
+        self.spike_times_key = spike_times_key
+
+        if bin_size is not None:
+            self.bins = np.arange(
+                interval[0], interval[1] + bin_size, bin_size
+            )
+
+        self.time = -np.inf
+        self.n_events = 0
+
+        self._buffers = [np.zeros((0,)) for unit in unit_ids]
+        self._events = np.zeros((0,))
+        self._event_indices = np.zeros((0,), dtype="int64")
+        self._discarded = -np.inf
+
+    def add_spikes(self, times, until=None):
+        """
+        Adds a chunk of spike times and aligns the events whose
+        windows are now complete
+
+        Parameters
+        ----------
+        times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+            Sorted spike times for each unit, all later than the
+            spikes in previous chunks.
+        until : float, optional
+            Acquisition time up to which all spikes have been added
+            (defaults to the time of the last spike in the chunk).
+
+        Returns
+        -------
+        See `flush`
+
+        """
+
+        unit_times = get_unit_times(times, self.unit_ids, self.spike_times_key)
+
+        for j, spikes in enumerate(unit_times):
+            self._buffers[j] = np.concatenate((self._buffers[j], spikes))
+
+        if until is None:
+            until = max(
+                [spikes[-1] for spikes in unit_times if spikes.size > 0],
+                default=-np.inf,
+            )
+
+        self.time = max(self.time, until)
+
+        return self._emit(self._events + self.interval[1] <= self.time)
+
+    def add_events(self, events):
+        """
+        Adds event times and aligns the events whose windows
+        are already complete
+
+        Parameters
+        ----------
+        events : ndarray
+            1-D sequence of reference times (in seconds); events are
+            numbered in the order in which they are added.
+
+        Returns
+        -------
+        See `flush`
+
+        """
+
+        events = np.atleast_1d(np.asarray(events))
+
+        if np.any(events + self.interval[0] < self._discarded):
+            raise ValueError(
+                "events arrived after their spikes were discarded; "
+                "increase max_lag."
+            )
+
+        self._events = np.concatenate((self._events, events))
+        self._event_indices = np.concatenate(
+            (
+                self._event_indices,
+                np.arange(self.n_events, self.n_events + events.size),
+            )
+        )
+        self.n_events += events.size
+
+        return self._emit(self._events + self.interval[1] <= self.time)
+
+    def flush(self):
+        """
+        Aligns all pending events, e.g. at the end of a recording
+
+        Returns
+        -------
+        event_indices : ndarray
+            Numbers of the aligned events, in order of event time
+        result : tuple
+            Output of `align.to_events` for these events, with
+            return_df=False; in raw mode, the event index of each
+            spike is its event number.
+
+        """
+
+        return self._emit(np.ones(self._events.shape, dtype="bool"))
+
+    def _emit(self, done):
+        """
+        Aligns a set of pending events and trims the spike buffers
+
+        Parameters
+        ----------
+        done : ndarray
+            Boolean mask of the pending events to align
+
+        Returns
+        -------
+        See `flush`
+
+        """
+
+        order = np.argsort(self._events[done], kind="stable")
+        events = self._events[done][order]
+        event_indices = self._event_indices[done][order]
+
+        self._events = self._events[~done]
+        self._event_indices = self._event_indices[~done]
+
+        with UnitPool(self._buffers) as pool:
+            starts, ends = _pool_window_indices(pool, events, self.interval)
+
+            if self.bin_size is not None:
+                counts = _pool_bin_counts(
+                    pool, events, starts, ends, self.bins, self.count_dtype
+                )
+                result = (self.bins[:-1], counts, self.unit_ids)
+            else:
+                aligned_times, indices, unit_indices = _gather_aligned(
+                    pool,
+                    events,
+                    starts,
+                    ends,
+                    np.result_type(events, *self._buffers),
+                )
+                result = (
+                    aligned_times,
+                    event_indices[indices],
+                    np.asarray(self.unit_ids)[unit_indices],
+                )
+
+        self._trim()
+
+        return event_indices, result
+
+    def _trim(self):
+        """
+        Discards spikes that cannot fall in the window of any
+        pending or future event
+        """
+
+        self._discarded = max(
+            self._discarded,
+            np.min(self._events, initial=self.time - self.max_lag)
+            + self.interval[0],
+        )
+
+        for j, spikes in enumerate(self._buffers):
+            first = np.searchsorted(spikes, self._discarded)
+            self._buffers[j] = spikes[first:]
+
+
+def _check_interval(interval, n_events):
+    """
+    Converts a window, or one window per event, into an array
+
+    Parameters
+    ----------
+    interval : tuple or ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+    n_events : int
+        Number of events
+
+    Returns
+    -------
+    interval : ndarray
+        1-D array of size 2, or events x 2 array
+
+    """
+
+    interval = np.asarray(interval)
+
+    if interval.shape not in ((2,), (n_events, 2)):
+        raise ValueError(
+            "interval must be a (start, end) pair or an events x 2 array."
+        )
+
+    return interval
+
+
+def _event_interval(interval, index):
+    """
+    Selects the windows of a subset of events
+
+    Parameters
+    ----------
+    interval : ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+    index : slice or ndarray
+        Events to select
+
+    Returns
+    -------
+    interval : ndarray
+        The shared window, or the windows of the selected events
+
+    """
+
+    return interval[index] if interval.ndim == 2 else interval
+
+
+def _to_samples(
+    unit_times, events, interval, bin_size, sampling_rate, event_timebase
+):
+    """
+    Converts events, windows and bin size into whole samples
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike sample indices for each unit
+    events : ndarray
+        1-D sequence of event times (in seconds) or sample indices
+    interval : ndarray
+        Start and end of the window around each event (in seconds),
+        or an events x 2 array of windows
+    bin_size : float or None
+        Bin size (in seconds)
+    sampling_rate : float
+        Sampling rate (in Hz)
+    event_timebase : str
+        'seconds' or 'samples', the units of `events`
+
+    Returns
+    -------
+    events : ndarray
+        1-D sequence of event sample indices
+    interval : ndarray
+        Windows in samples
+    bin_size : int or None
+        Bin size in samples
+
+    """
+
+    if any(
+        spikes.size and spikes.dtype.kind not in "iu" for spikes in unit_times
+    ):
+        raise ValueError("sampling_rate requires integer sample indices.")
+
+    if event_timebase == "seconds":
+        events = np.rint(events * sampling_rate).astype("int64")
+    elif event_timebase != "samples":
+        raise ValueError("event_timebase must be 'seconds' or 'samples'.")
+    elif events.size and events.dtype.kind not in "iu":
+        raise ValueError("event_timebase='samples' requires integer events.")
+
+    interval = np.rint(interval * sampling_rate).astype("int64")
+
+    if bin_size is not None:
+        samples = bin_size * sampling_rate
+        if round(samples) < 1 or not np.isclose(samples, round(samples)):
+            raise ValueError("bin_size must be a whole number of samples.")
+        bin_size = int(round(samples))
+
+    return events, interval, bin_size
+
+
+def _bin_edges(interval, bin_size):
+    """
+    Computes the bin edges that cover every event window
+
+    Parameters
+    ----------
+    interval : ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+    bin_size : float
+        Bin size
+
+    Returns
+    -------
+    bins : ndarray
+        1-D sequence of bin edges
+
+    """
+
+    if interval.size == 0:
+        start, end = 0.0, bin_size
+    else:
+        start = np.min(interval[..., 0])
+        end = np.max(interval[..., 1])
+
+    return np.arange(start, end + bin_size, bin_size)
+
+
+def _window_indices(unit_times, events, interval):
+    """
+    Finds the first and last spike index inside the window
+    around each event, with one `searchsorted` call per unit
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    interval : tuple or ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+
+    Returns
+    -------
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices (exclusive)
+
+    """
+
+    starts = np.empty((events.size, len(unit_times)), dtype="int64")
+    ends = np.empty((events.size, len(unit_times)), dtype="int64")
+
+    interval = np.asarray(interval)
+    window_starts = events + interval[..., 0]
+    window_ends = events + interval[..., 1]
+
+    for j, spikes in enumerate(unit_times):
+        starts[:, j] = np.searchsorted(spikes, window_starts)
+        ends[:, j] = np.searchsorted(spikes, window_ends)
+
+    return starts, ends
+
+
+def _narrow_window_indices(unit_times, events, interval, starts, ends):
+    """
+    Finds the window indices for a window that lies inside
+    windows whose indices are already known
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    interval : tuple
+        Start and end of the narrower window around each event
+    starts : ndarray
+        events x units array of start indices of the wider windows
+    ends : ndarray
+        events x units array of end indices of the wider windows
+
+    Returns
+    -------
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices (exclusive)
+
+    """
+
+    interval = np.asarray(interval)
+    window_starts = events + interval[..., 0]
+    window_ends = events + interval[..., 1]
+
+    narrow_starts = np.empty_like(starts)
+    narrow_ends = np.empty_like(ends)
+
+    for j, spikes in enumerate(unit_times):
+        narrow_starts[:, j] = _bounded_search(
+            spikes, window_starts, starts[:, j], ends[:, j]
+        )
+        narrow_ends[:, j] = _bounded_search(
+            spikes, window_ends, starts[:, j], ends[:, j]
+        )
+
+    return narrow_starts, narrow_ends
+
+
+def _bounded_search(spikes, values, lo, hi):
+    """
+    Equivalent to `np.searchsorted(spikes, values)` when each result
+    is known to lie in [lo, hi], with one bisection step for all
+    values at a time, so only the spikes in those ranges are read
+
+    Parameters
+    ----------
+    spikes : ndarray
+        Sorted spike times
+    values : ndarray
+        1-D sequence of times to look up
+    lo : ndarray
+        Lower bound of each index
+    hi : ndarray
+        Upper bound of each index
+
+    Returns
+    -------
+    indices : ndarray
+        Index of the first spike at or after each value
+
+    """
+
+    lo = lo.copy()
+    hi = hi.copy()
+    active = lo < hi
+
+    while np.any(active):
+        mid = (lo + hi) // 2
+        below = active & (spikes[np.where(active, mid, 0)] < values)
+        lo = np.where(below, mid + 1, lo)
+        hi = np.where(active & ~below, mid, hi)
+        active = lo < hi
+
+    return lo
+
+
+def _expand_windows(starts, counts):
+    """
+    Expands a set of windows into the indices they contain
+
+    Equivalent to concatenating `np.arange(s, s + n)` for each
+    window start `s` and length `n`, without a Python loop.
+
+    Parameters
+    ----------
+    starts : ndarray
+        1-D sequence of window start indices
+    counts : ndarray
+        1-D sequence of window lengths
+
+    Returns
+    -------
+    indices : ndarray
+        1-D sequence of indices inside all windows, in order
+
+    """
+
+    offsets = np.cumsum(counts) - counts
+    total = offsets[-1] + counts[-1] if counts.size else 0
+
+    return np.repeat(starts - offsets, counts) + np.arange(total)
+
+
+def _unit_spikes(spikes, events, starts, ends):
+    """
+    Extracts the spikes of one unit inside each event window
+
+    Parameters
+    ----------
+    spikes : ndarray
+        Sorted spike times for one unit
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        1-D sequence of window start indices (one per event)
+    ends : ndarray
+        1-D sequence of window end indices (one per event)
+
+    Returns
+    -------
+    relative_times : ndarray
+        Spike times relative to their event, ordered by event
+    event_indices : ndarray
+        Event index for each spike
+
+    """
+
+    counts = ends - starts
+    event_indices = np.repeat(np.arange(events.size), counts)
+    relative_times = (
+        spikes[_expand_windows(starts, counts)] - events[event_indices]
+    )
+
+    return relative_times, event_indices
+
+
+def _check_landmarks(landmarks, target):
+    """
+    Validates the landmarks of each event and the target time base
+
+    Parameters
+    ----------
+    landmarks : ndarray
+        events x landmarks array of times
+    target : ndarray or None
+        1-D sequence of warped landmark times
+
+    Returns
+    -------
+    landmarks : ndarray
+        events x landmarks array of times
+    target : ndarray
+        1-D sequence of warped landmark times, defaulting to the
+        mean landmark times relative to the first landmark
+
+    """
+
+    landmarks = np.asarray(landmarks, dtype="float64")
+
+    if landmarks.ndim != 2 or landmarks.shape[1] < 2:
+        raise ValueError(
+            "landmarks must be an events x landmarks array "
+            "with at least two landmarks."
+        )
+
+    if np.any(np.diff(landmarks, axis=1) < 0):
+        raise ValueError("landmarks must be non-decreasing within each event.")
+
+    if target is None:
+        target = np.mean(landmarks - landmarks[:, :1], axis=0)
+
+    target = np.asarray(target, dtype="float64")
+
+    if target.shape != landmarks.shape[1:] or np.any(np.diff(target) < 0):
+        raise ValueError(
+            "target must be a non-decreasing sequence with one time "
+            "per landmark."
+        )
+
+    return landmarks, target
+
+
+def _warp(relative_times, offsets, event_indices, target):
+    """
+    Maps times relative to the first landmark of their event
+    onto the target time base, piecewise-linearly
+
+    Parameters
+    ----------
+    relative_times : ndarray
+        1-D sequence of times relative to the first landmark
+    offsets : ndarray
+        events x landmarks array of landmark times relative
+        to the first landmark
+    event_indices : ndarray
+        1-D sequence of event indices for each time
+    target : ndarray
+        1-D sequence of warped landmark times
+
+    Returns
+    -------
+    warped_times : ndarray
+        1-D sequence of warped times
+
+    """
+
+    n_segments = target.size - 1
+
+    # segment k runs from landmark k to landmark k + 1; the loop is
+    # over landmarks, which are few, rather than over spikes
+    segments = np.full(relative_times.shape, -1, dtype="intp")
+    for k in range(target.size):
+        segments += relative_times >= offsets[event_indices, k]
+    np.clip(segments, 0, n_segments - 1, out=segments)
+
+    segment_starts = offsets[event_indices, segments]
+    durations = offsets[event_indices, segments + 1] - segment_starts
+    scale = np.divide(
+        target[segments + 1] - target[segments],
+        durations,
+        out=np.ones(durations.shape),
+        where=durations > 0,
+    )
+
+    warped_times = target[segments] + (relative_times - segment_starts) * scale
+
+    # padding before the first and after the last landmark is shifted
+    before = relative_times < 0
+    warped_times[before] = target[0] + relative_times[before]
+
+    after = relative_times >= offsets[event_indices, -1]
+    warped_times[after] = target[-1] + (
+        relative_times[after] - offsets[event_indices[after], -1]
+    )
+
+    return warped_times
+
+
+def _warped_bin_counts(warped_times, event_indices, unit_indices, bins, out):
+    """
+    Counts warped spike times in each bin, event and unit
+
+    Parameters
+    ----------
+    warped_times : ndarray
+        1-D sequence of warped times, ordered by event, then by
+        unit, then by time
+    event_indices : ndarray
+        1-D sequence of event indices for each time
+    unit_indices : ndarray
+        1-D sequence of unit positions for each time
+    bins : ndarray
+        1-D sequence of bin edges
+    out : ndarray
+        Zero-filled bins x events x units array in which
+        to write the counts
+
+    """
+
+    n_bins = bins.size - 1
+    n_units = out.shape[2]
+
+    bin_indices = _bin_indices(warped_times, bins)
+    valid = bin_indices >= 0
+
+    # warping preserves the order of spikes within each event and
+    # unit, so the (event, unit, bin) keys are sorted
+    keys = (
+        event_indices[valid].astype("int64") * n_units + unit_indices[valid]
+    ) * n_bins + bin_indices[valid]
+    run_starts = np.flatnonzero(np.diff(keys, prepend=-1))
+    run_keys = keys[run_starts]
+
+    out[
+        run_keys % n_bins,
+        run_keys // (n_bins * n_units),
+        run_keys // n_bins % n_units,
+    ] = np.diff(run_starts, append=keys.size)
+
+
+def _pool_window_indices(pool, events, interval):
+    """
+    Runs `_window_indices` on each block of units in a pool
+
+    Parameters
+    ----------
+    pool : UnitPool
+        Spike times split into blocks of units
+    events : ndarray
+        1-D sequence of reference times
+    interval : tuple or ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+
+    Returns
+    -------
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices (exclusive)
+
+    """
+
+    results = pool.map(_window_indices, events, interval)
+
+    return (
+        np.hstack([starts for starts, ends in results]),
+        np.hstack([ends for starts, ends in results]),
+    )
+
+
+def _write_aligned(unit_times, events, starts, ends, positions, out):
+    """
+    Writes the aligned spike times of a block of units into
+    their positions in the output array
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit in the block
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices
+    positions : ndarray
+        events x units array of output positions for each window
+    out : ndarray
+        1-D output array for the aligned times of all units
+
+    """
+
+    counts = ends - starts
+
+    for j, spikes in enumerate(unit_times):
+        relative_times, _ = _unit_spikes(
+            spikes, events, starts[:, j], ends[:, j]
+        )
+        out[_expand_windows(positions[:, j], counts[:, j])] = relative_times
+
+
+def _gather_aligned(pool, events, starts, ends, dtype):
+    """
+    Collects the aligned spike times of all units, ordered by
+    event and then by unit
+
+    Parameters
+    ----------
+    pool : UnitPool
+        Spike times split into blocks of units
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices
+    dtype : np.dtype
+        Data type of the aligned times
+
+    Returns
+    -------
+    aligned_times : ndarray
+        1-D sequence of times relative to the events of interest
+    event_indices : ndarray
+        1-D sequence of event indices for each aligned time
+    unit_indices : ndarray
+        1-D sequence of unit positions for each aligned time
+
+    """
+
+    counts = ends - starts
+    flat_counts = counts.ravel()
+    positions = (np.cumsum(flat_counts) - flat_counts).reshape(counts.shape)
+
+    aligned_times = pool.zeros((np.sum(flat_counts),), dtype)
+    pool.map(
+        _write_aligned,
+        events,
+        starts,
+        ends,
+        positions,
+        aligned_times,
+        per_unit=((1, 1), (2, 1), (3, 1)),
+    )
+
+    event_indices = np.repeat(
+        np.arange(events.size, dtype=_index_dtype(events.size)),
+        np.sum(counts, 1),
+    )
+    unit_indices = np.repeat(
+        np.tile(
+            np.arange(counts.shape[1], dtype=_index_dtype(counts.shape[1])),
+            events.size,
+        ),
+        flat_counts,
+    )
+
+    return pool.result(aligned_times), event_indices, unit_indices
+
+
+def _index_dtype(size):
+    """
+    Returns int32 if it can index `size` elements, otherwise int64
+
+    Parameters
+    ----------
+    size : int
+        Number of elements
+
+    Returns
+    -------
+    dtype : np.dtype
+
+    """
+
+    return np.dtype("int32" if size <= np.iinfo("int32").max else "int64")
+
+
+def _count_dtype(max_count, count_dtype=None):
+    """
+    Chooses the data type of a binned count tensor
+
+    No bin can hold more spikes than the window it belongs to,
+    so the largest window count is a safe upper bound.
+
+    Parameters
+    ----------
+    max_count : int
+        Largest number of spikes in any window
+    count_dtype : str or np.dtype, optional
+        Requested data type; if None, the smallest safe
+        unsigned integer type is used
+
+    Returns
+    -------
+    dtype : np.dtype
+        Data type for the spike counts
+
+    """
+
+    max_count = int(max_count)
+
+    if count_dtype is None:
+        return np.min_scalar_type(max_count)
+
+    dtype = np.dtype(count_dtype)
+
+    if np.issubdtype(dtype, np.integer) and np.iinfo(dtype).max < max_count:
+        raise ValueError(
+            f"count_dtype {dtype} cannot hold {max_count} spikes per bin."
+        )
+
+    return dtype
+
+
+def _bin_indices(relative_times, bins):
+    """
+    Computes the bin index of each time arithmetically
+
+    The estimate from the bin width is corrected against the
+    actual edges, so the result matches `np.histogram`: every
+    bin is half-open, except the last one, which also includes
+    its right edge. Times outside the bins get an index of -1.
+
+    Parameters
+    ----------
+    relative_times : ndarray
+        1-D sequence of times
+    bins : ndarray
+        1-D sequence of (approximately) evenly spaced bin edges
+
+    Returns
+    -------
+    bin_indices : ndarray
+        1-D sequence of bin indices
+
+    """
+
+    n_bins = bins.size - 1
+    bin_indices = np.full(relative_times.shape, -1, dtype="intp")
+
+    in_range = (relative_times >= bins[0]) & (relative_times <= bins[-1])
+    in_range_times = relative_times[in_range]
+
+    indices = (
+        (in_range_times - bins[0]) * (n_bins / (bins[-1] - bins[0]))
+    ).astype("intp")
+    np.clip(indices, 0, n_bins - 1, out=indices)
+
+    indices[in_range_times < bins[indices]] -= 1
+    indices[
+        (in_range_times >= bins[indices + 1]) & (indices != n_bins - 1)
+    ] += 1
+
+    bin_indices[in_range] = indices
+
+    return bin_indices
+
+
+def _unit_bin_counts(spikes, events, starts, ends, bins):
+    """
+    Counts the spikes of one unit in each bin around each event,
+    returning only the non-zero counts
+
+    Parameters
+    ----------
+    spikes : ndarray
+        Sorted spike times for one unit
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        1-D sequence of window start indices (one per event)
+    ends : ndarray
+        1-D sequence of window end indices (one per event)
+    bins : ndarray
+        1-D sequence of bin edges
+
+    Returns
+    -------
+    bin_indices : ndarray
+        Bin index of each non-zero count
+    event_indices : ndarray
+        Event index of each non-zero count
+    counts : ndarray
+        Non-zero spike counts
+
+    """
+
+    n_bins = bins.size - 1
+
+    relative_times, event_indices = _unit_spikes(spikes, events, starts, ends)
+
+    bin_indices = _bin_indices(relative_times, bins)
+    valid = bin_indices >= 0
+
+    # spikes are ordered by event and then by time, so their
+    # (event, bin) keys are sorted and can be run-length counted
+    keys = event_indices[valid] * n_bins + bin_indices[valid]
+    run_starts = np.flatnonzero(np.diff(keys, prepend=-1))
+    run_keys = keys[run_starts]
+
+    return (
+        run_keys % n_bins,
+        run_keys // n_bins,
+        np.diff(run_starts, append=keys.size),
+    )
+
+
+def _bin_counts(unit_times, events, starts, ends, bins, out):
+    """
+    Counts the spikes of each unit in each bin around each event
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices
+    bins : ndarray
+        1-D sequence of bin edges
+    out : ndarray
+        Zero-filled bins x events x units array in which
+        to write the counts
+
+    """
+
+    for j, spikes in enumerate(unit_times):
+        bin_indices, event_indices, counts = _unit_bin_counts(
+            spikes, events, starts[:, j], ends[:, j], bins
+        )
+        out[bin_indices, event_indices, j] = counts
+
+
+def _trial_sums(unit_times, events, interval, bins, codes, out):
+    """
+    Sums the binned counts, and their squares, of each unit
+    in a block across the events of each condition
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    interval : ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+    bins : ndarray
+        1-D sequence of bin edges
+    codes : ndarray
+        Condition code of each event
+    out : ndarray
+        Zero-filled 2 x conditions x bins x units array in which
+        to write the sums and the sums of squares
+
+    """
+
+    n_bins = bins.size - 1
+    size = out.shape[1] * n_bins
+
+    for j, spikes in enumerate(unit_times):
+        starts, ends = _window_indices([spikes], events, interval)
+        bin_indices, event_indices, counts = _unit_bin_counts(
+            spikes, events, starts[:, 0], ends[:, 0], bins
+        )
+        keys = codes[event_indices] * n_bins + bin_indices
+        counts = counts.astype("float64")
+        out[0, :, :, j] = np.bincount(keys, counts, size).reshape((-1, n_bins))
+        out[1, :, :, j] = np.bincount(keys, counts**2, size).reshape(
+            (-1, n_bins)
+        )
+
+
+def _condition_codes(event_labels, n_events):
+    """
+    Converts event labels into integer condition codes
+
+    Parameters
+    ----------
+    event_labels : List[int] or List[str]
+        Condition of each event; if None, all events share
+        one condition
+    n_events : int
+        Number of events
+
+    Returns
+    -------
+    codes : ndarray
+        Condition code of each event, in the sorted order of the
+        labels; missing labels get the last code
+    conditions : ndarray
+        Label of each condition
+
+    """
+
+    if event_labels is None:
+        return np.zeros((n_events,), dtype="intp"), [None]
+
+    if len(event_labels) != n_events:
+        raise ValueError("events and event_labels must be the same length.")
+
+    codes, conditions = pd.factorize(np.asarray(event_labels), sort=True)
+    conditions = np.asarray(conditions)
+
+    if np.any(codes < 0):
+        codes[codes < 0] = conditions.size
+        conditions = np.append(conditions.astype("object"), None)
+
+    return codes, conditions
+
+
+def _event_samples(events, sampling_rate, timestamps):
+    """
+    Finds the sample nearest to each event
+
+    Parameters
+    ----------
+    events : ndarray
+        1-D sequence of reference times (in seconds)
+    sampling_rate : float or None
+        Sampling rate (in Hz)
+    timestamps : ndarray or None
+        1-D sequence of the time of each sample (in seconds)
+
+    Returns
+    -------
+    event_samples : ndarray
+        Sample index of each event
+    sampling_rate : float
+        Sampling rate (in Hz)
+
+    """
+
+    if timestamps is None:
+        if sampling_rate is None:
+            raise ValueError("sampling_rate or timestamps is required.")
+        return np.rint(events * sampling_rate).astype("int64"), sampling_rate
+
+    timestamps = np.asarray(timestamps)
+
+    if sampling_rate is None:
+        sampling_rate = (timestamps.size - 1) / (
+            timestamps[-1] - timestamps[0]
+        )
+
+    after = np.clip(
+        np.searchsorted(timestamps, events), 1, timestamps.size - 1
+    )
+    before = after - 1
+    nearer = events - timestamps[before] < timestamps[after] - events
+    event_samples = np.where(nearer, before, after).astype("int64")
+
+    # events outside the recording are extrapolated at the sampling
+    # rate, so that their windows are padded instead of clipped
+    early = events < timestamps[0]
+    late = events > timestamps[-1]
+    event_samples[early] = np.rint(
+        (events[early] - timestamps[0]) * sampling_rate
+    )
+    event_samples[late] = (
+        timestamps.size
+        - 1
+        + np.rint((events[late] - timestamps[-1]) * sampling_rate)
+    )
+
+    return event_samples, sampling_rate
+
+
+def _gather_snippets(data, starts, n_samples, fill_value):
+    """
+    Gathers the windows of a signal that start at each sample
+
+    Parameters
+    ----------
+    data : ndarray
+        samples (x channels) array of the signal
+    starts : ndarray
+        First sample of each window (may be out of bounds)
+    n_samples : int
+        Number of samples in each window
+    fill_value : scalar or None
+        Value of the samples outside the data
+
+    Returns
+    -------
+    snippets : ndarray
+        events x samples (x channels) array; a read-only view of
+        `data` if the windows are evenly spaced and inside the data
+
+    """
+
+    n_total = data.shape[0]
+    inside = (starts >= 0) & (starts + n_samples <= n_total)
+    steps = np.unique(np.diff(starts))
+    evenly_spaced = steps.size <= 1 and np.all(steps >= 0)
+
+    if starts.size and evenly_spaced and np.all(inside):
+        step = steps[0] if steps.size else 0
+        return np.lib.stride_tricks.as_strided(
+            data[slice(starts[0], None)],
+            shape=(starts.size, n_samples) + data.shape[1:],
+            strides=(step * data.strides[0],) + data.strides,
+            writeable=False,
+        )
+
+    # every window that fits in the data starting at each sample
+    windows = np.lib.stride_tricks.as_strided(
+        data,
+        shape=(max(n_total - n_samples + 1, 0), n_samples) + data.shape[1:],
+        strides=(data.strides[0],) + data.strides,
+        writeable=False,
+    )
+
+    snippets = np.empty((starts.size, n_samples) + data.shape[1:], data.dtype)
+    snippets[inside] = windows[starts[inside]]
+
+    if fill_value is None:
+        fill_value = np.nan if data.dtype.kind in "fc" else 0
+
+    for k in np.flatnonzero(~inside):
+        snippets[k] = fill_value
+        first = min(max(-starts[k], 0), n_samples)
+        last = max(min(n_total - starts[k], n_samples), first)
+        snippets[k, first:last] = data[
+            slice(starts[k] + first, starts[k] + last)
+        ]
+
+    return snippets
+
+
+def _check_windows(windows, n_events):
+    """
+    Converts response windows into a windows x 2 or
+    events x windows x 2 array
+
+    Parameters
+    ----------
+    windows : tuple or ndarray
+        One (start, end) pair, a windows x 2 array, or an
+        events x windows x 2 array
+    n_events : int
+        Number of events
+
+    Returns
+    -------
+    windows : ndarray
+        windows x 2 or events x windows x 2 array
+
+    """
+
+    windows = np.asarray(windows)
+
+    if windows.shape == (2,):
+        return windows[np.newaxis]
+
+    if windows.shape[-1:] == (2,) and (
+        windows.ndim == 2 or (windows.ndim == 3 and len(windows) == n_events)
+    ):
+        return windows
+
+    raise ValueError(
+        "windows must be a (start, end) pair, a windows x 2 array "
+        "or an events x windows x 2 array."
+    )
+
+
+def _window_counts(unit_times, bounds, edge_indices, out):
+    """
+    Counts the spikes of each unit in a block inside
+    each response window
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    bounds : ndarray
+        edges x events array of window edge times; each row is
+        sorted when the events are, which speeds up the search
+    edge_indices : ndarray
+        windows x 2 array of the rows of `bounds` holding the
+        start and end of each window
+    out : ndarray
+        events x units x windows array in which to write the counts
+
+    """
+
+    for j, spikes in enumerate(unit_times):
+        positions = np.searchsorted(spikes, bounds)
+        out[:, j, :] = (
+            positions[edge_indices[:, 1]] - positions[edge_indices[:, 0]]
+        ).T
+
+
+def _format_counts(counts, windows, unit_ids, event_labels, shared):
+    """
+    Packages response window counts in a DataArray
+
+    Parameters
+    ----------
+    counts : ndarray
+        events x units (x windows) array of counts or rates
+    windows : ndarray
+        windows x 2 or events x windows x 2 array
+    unit_ids : List[int]
+        Labels for each unit
+    event_labels : List[int] or List[str]
+        Labels for each event (optional)
+    shared : bool
+        True if there is a window dimension and the windows
+        are shared by all events
+
+    Returns
+    -------
+    da : xr.DataArray
+
+    """
+
+    if event_labels is None:
+        event_dim, event_coords = "event_index", np.arange(counts.shape[0])
+    else:
+        event_dim, event_coords = "event_label", event_labels
+
+    coords = {event_dim: event_coords, "unit_id": unit_ids}
+    dims = [event_dim, "unit_id"]
+
+    if counts.ndim == 3:
+        dims.append("window")
+        coords["window"] = np.arange(counts.shape[2])
+
+    if shared:
+        coords["window_start"] = ("window", windows[:, 0])
+        coords["window_end"] = ("window", windows[:, 1])
+
+    return xr.DataArray(data=counts, coords=coords, dims=dims)
+
+
+def _trial_statistic(name, sums, squares, n_events, ddof):
+    """
+    Computes one statistic of the counts across events from
+    their sums and sums of squares
+
+    Parameters
+    ----------
+    name : str
+        'sum', 'mean', 'var' or 'sem'
+    sums : ndarray
+        Sum of the counts across events
+    squares : ndarray
+        Sum of the squared counts across events
+    n_events : int or ndarray
+        Number of events, broadcastable against the sums
+    ddof : int
+        Delta degrees of freedom of the variance
+
+    Returns
+    -------
+    values : ndarray
+        NaN where there are too few events
+
+    """
+
+    if name == "sum":
+        return sums
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / n_events
+
+        if name == "mean":
+            return mean
+
+        var = np.maximum(squares - sums * mean, 0) / (n_events - ddof)
+        var = np.where(n_events > ddof, var, np.nan)
+
+        if name == "var":
+            return var
+
+        return np.sqrt(var / n_events)
+
+
+def _sparse_bin_counts(unit_times, events, starts, ends, bins):
+    """
+    Counts the spikes of each unit in each bin around each event,
+    in coordinate (COO) format
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices
+    bins : ndarray
+        1-D sequence of bin edges
+
+    Returns
+    -------
+    coords : ndarray
+        3 x non-zero array of (bin, event, unit) indices
+    counts : ndarray
+        Non-zero spike counts
+
+    """
+
+    coords = [np.zeros((3, 0), dtype="intp")]
+    counts = [np.zeros((0,), dtype="intp")]
+
+    for j, spikes in enumerate(unit_times):
+        bin_indices, event_indices, unit_counts = _unit_bin_counts(
+            spikes, events, starts[:, j], ends[:, j], bins
+        )
+        unit_indices = np.full(bin_indices.shape, j)
+        coords.append(np.stack((bin_indices, event_indices, unit_indices)))
+        counts.append(unit_counts)
+
+    return np.concatenate(coords, axis=1), np.concatenate(counts)
+
+
+def _pool_bin_counts(
+    pool, events, starts, ends, bins, count_dtype=None, output="dense"
+):
+    """
+    Runs `_bin_counts` or `_sparse_bin_counts` on each block
+    of units in a pool
+
+    Parameters
+    ----------
+    pool : UnitPool
+        Spike times split into blocks of units
+    events : ndarray
+        1-D sequence of reference times
+    starts : ndarray
+        events x units array of window start indices
+    ends : ndarray
+        events x units array of window end indices
+    bins : ndarray
+        1-D sequence of bin edges
+    count_dtype : str or np.dtype, optional
+        Data type of the counts (see `_count_dtype`)
+    output : str, optional (default = 'dense')
+        'dense' for an ndarray or 'sparse' for a sparse.COO array
+
+    Returns
+    -------
+    counts : ndarray or sparse.COO
+        bins x events x units array of spike counts
+
+    """
+
+    shape = (bins.size - 1, events.size, starts.shape[1])
+    dtype = _count_dtype(np.max(ends - starts, initial=0), count_dtype)
+
+    if output == "sparse":
+        results = pool.map(
+            _sparse_bin_counts,
+            events,
+            starts,
+            ends,
+            bins,
+            per_unit=((1, 1), (2, 1)),
+        )
+
+        for block, (coords, counts) in zip(pool.blocks, results):
+            coords[2] += block.start
+
+        return _to_sparse(
+            np.concatenate([coords for coords, counts in results], axis=1),
+            np.concatenate([counts for coords, counts in results]),
+            shape,
+            dtype,
+        )
+
+    counts = pool.zeros(shape, dtype)
+    pool.map(
+        _bin_counts,
+        events,
+        starts,
+        ends,
+        bins,
+        counts,
+        per_unit=((1, 1), (2, 1), (4, 2)),
+    )
+
+    return pool.result(counts)
+
+
+def _to_sparse(coords, counts, shape, dtype):
+    """
+    Builds a sparse.COO array of spike counts
+
+    Parameters
+    ----------
+    coords : ndarray
+        ndim x non-zero array of indices
+    counts : ndarray
+        Non-zero spike counts
+    shape : tuple
+        Shape of the array
+    dtype : np.dtype
+        Data type of the counts
+
+    Returns
+    -------
+    counts : sparse.COO
+
+    """
+
+    try:
+        import sparse
+    except ImportError:
+        raise ImportError(
+            "output='sparse' requires the `sparse` package "
+            "(pip install sparse)."
+        )
+
+    return sparse.COO(
+        coords,
+        counts.astype(dtype),
+        shape=shape,
+        has_duplicates=False,
+    )
+
+
+def _lazy_bin_counts(unit_times, events, interval, bins, count_dtype, chunks):
+    """
+    Builds a dask array of binned spike counts, where each
+    chunk of events and units is aligned on demand
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    interval : ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+    bins : ndarray
+        1-D sequence of bin edges
+    count_dtype : str or np.dtype, optional
+        Data type of the counts (see `_count_dtype`); by default, the
+        smallest type that holds the largest window count
+    chunks : dict, optional
+        Number of events ("event_index") and units ("unit_id")
+        in each chunk
+
+    Returns
+    -------
+    counts : dask.array.Array
+        bins x events x units array of spike counts
+
+    """
+
+    try:
+        import dask
+        import dask.array
+    except ImportError:
+        raise ImportError(
+            "output='lazy' requires the `dask` package "
+            "(pip install 'dask[array]')."
+        )
+
+    chunks = {"event_index": 1000, "unit_id": 32, **(chunks or {})}
+    if count_dtype is None:
+        dtype = _count_dtype(_max_window_count(unit_times, events, interval))
+    else:
+        dtype = np.dtype(count_dtype)
+
+    event_blocks = [
+        slice(i, i + chunks["event_index"])
+        for i in range(0, events.size, chunks["event_index"])
+    ]
+    unit_blocks = [
+        slice(j, j + chunks["unit_id"])
+        for j in range(0, len(unit_times), chunks["unit_id"])
+    ]
+    block = dask.delayed(_lazy_block, pure=False)
+
+    blocks = [
+        [
+            dask.array.from_delayed(
+                block(
+                    unit_times[unit_block],
+                    events[event_block],
+                    _event_interval(interval, event_block),
+                    bins,
+                    dtype,
+                ),
+                shape=(
+                    bins.size - 1,
+                    events[event_block].size,
+                    len(unit_times[unit_block]),
+                ),
+                dtype=dtype,
+            )
+            for unit_block in unit_blocks
+        ]
+        for event_block in event_blocks
+    ]
+
+    if len(event_blocks) == 0 or len(unit_blocks) == 0:
+        return dask.array.zeros(
+            (bins.size - 1, events.size, len(unit_times)), dtype=dtype
+        )
+
+    return dask.array.block([blocks])
+
+
+def _max_window_count(unit_times, events, interval):
+    """
+    Finds the largest number of spikes in any event window,
+    one unit at a time
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    events : ndarray
+        1-D sequence of reference times
+    interval : ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows
+
+    Returns
+    -------
+    max_count : int
+
+    """
+
+    window_starts = events + interval[..., 0]
+    window_ends = events + interval[..., 1]
+
+    return max(
+        [
+            int(
+                np.max(
+                    np.searchsorted(spikes, window_ends)
+                    - np.searchsorted(spikes, window_starts),
+                    initial=0,
+                )
+            )
+            for spikes in unit_times
+        ],
+        default=0,
+    )
+
+
+def _lazy_block(unit_times, events, interval, bins, dtype):
+    """
+    Aligns and bins one chunk of a lazy count array
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit in the chunk
+    events : ndarray
+        1-D sequence of reference times in the chunk
+    interval : ndarray
+        Start and end of the window around each event, or an
+        events x 2 array of windows for the chunk
+    bins : ndarray
+        1-D sequence of bin edges
+    dtype : np.dtype
+        Data type of the counts
+
+    Returns
+    -------
+    counts : ndarray
+        bins x events x units array of spike counts
+
+    """
+
+    starts, ends = _window_indices(unit_times, events, interval)
+
+    # no bin holds more spikes than its window
+    _count_dtype(np.max(ends - starts, initial=0), dtype)
+
+    counts = np.zeros((bins.size - 1, events.size, len(unit_times)), dtype)
+    _bin_counts(unit_times, events, starts, ends, bins, counts)
+
+    return counts
+
+
+def _format_binned(bins, counts, unit_ids, n_events, event_labels, return_df):
+    """
+    Packages binned spike counts in the format returned by `to_events`
+
+    Parameters
+    ----------
+    bins : ndarray
+        1-D sequence of bin edges
+    counts : ndarray, sparse.COO, or dask.array.Array
+        bins x events x units array of spike counts
+    unit_ids : List[int]
+        Labels for each unit
+    n_events : int
+        Number of events
+    event_labels : List[int] or List[str]
+        Labels for each event (optional)
+    return_df : bool
+        If True, returns an xarray.DataArray
+
+    Returns
+    -------
+    See `to_events`
+
+    """
+
+    if not return_df:
+        return bins[:-1], _squeeze(counts), unit_ids
+
+    if event_labels is None:
+        event_dim, event_coords = "event_index", np.arange(n_events)
+    else:
+        event_dim, event_coords = "event_label", event_labels
+
+    return xr.DataArray(
+        data=counts,
+        coords={
+            "time": bins[:-1],
+            event_dim: event_coords,
+            "unit_id": unit_ids,
+        },
+    )
+
+
+def _format_aligned(
+    aligned_times,
+    event_indices,
+    unit_indices,
+    unit_ids,
+    event_labels,
+    return_df,
+):
+    """
+    Packages aligned spike times in the format returned by `to_events`
+
+    In DataFrames, event and unit labels are stored as categoricals,
+    i.e. as small integer codes plus one copy of each label, rather
+    than as one Python object per spike.
+
+    Parameters
+    ----------
+    aligned_times : ndarray
+        1-D sequence of times relative to the events of interest
+    event_indices : ndarray
+        1-D sequence of event indices for each aligned time
+    unit_indices : ndarray
+        1-D sequence of unit positions for each aligned time
+    unit_ids : List[int]
+        Labels for each unit
+    event_labels : List[int] or List[str]
+        Labels for each event (optional)
+    return_df : bool
+        If True, returns a pandas DataFrame
+
+    Returns
+    -------
+    See `to_events`
+
+    """
+
+    if not return_df:
+        return aligned_times, event_indices, np.asarray(unit_ids)[unit_indices]
+
+    data = {"time": aligned_times, "event_index": event_indices}
+
+    if event_labels is not None:
+        data["event_label"] = _categorical(event_labels, event_indices)
+
+    data["unit_id"] = _categorical(unit_ids, unit_indices)
+
+    return pd.DataFrame(data=data, copy=False)
+
+
+def _categorical(labels, indices):
+    """
+    Builds a categorical array of labels without creating
+    one label object per element
+
+    Parameters
+    ----------
+    labels : List[int] or List[str]
+        Label of each event or unit
+    indices : ndarray
+        Position in `labels` of each element
+
+    Returns
+    -------
+    categorical : pd.Categorical
+        Categories are the sorted unique labels, and are ordered
+        so that comparisons and reductions follow the labels
+
+    """
+
+    codes, categories = pd.factorize(np.asarray(labels), sort=True)
+
+    return pd.Categorical.from_codes(codes[indices], categories, ordered=True)
+
+
+def _squeeze(counts):
+    """
+    Removes length-one dimensions from dense, sparse or lazy counts
+
+    Parameters
+    ----------
+    counts : ndarray, sparse.COO, or dask.array.Array
+        Array of spike counts
+
+    Returns
+    -------
+    counts : ndarray, sparse.COO, or dask.array.Array
+        Array without length-one dimensions
+
+    """
+
+    if isinstance(counts, np.ndarray):
+        return np.squeeze(counts)
+
+    return counts.reshape(tuple(n for n in counts.shape if n != 1))
+
+
+class _SpikeSource:
+    """
+    Location of one unit's spike times inside a (possibly
+    out-of-core) buffer
+    """
+
+    def __init__(self, buffer, start, end, block_size):
+        """
+        Stores the buffer range, and reads every `block_size`-th
+        spike time if the buffer is not an ndarray
+        """
+
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.block_size = block_size
+
+        if isinstance(buffer, np.ndarray):
+            self.sample = None
+        else:
+            self.sample = np.asarray(buffer[start:end:block_size])
+
+
+def _spike_sources(times, unit_ids, spike_times_key, block_size):
+    """
+    Locates the spike times of each unit without reading them
+
+    Parameters
+    ----------
+    times : ndarray, List[array-like], dict, DataFrame, or SpikeTrains
+        Sorted spike times for one or more units
+    unit_ids : List[int]
+        IDs of the units to look up
+    spike_times_key : str
+        Name of the spike times column if `times` is a DataFrame
+    block_size : int
+        Number of spikes per block for out-of-core buffers
+
+    Returns
+    -------
+    sources : List[_SpikeSource]
+        Buffer and range for each unit
+
+    """
+
+    if isinstance(times, SpikeTrains):
+        return [
+            _SpikeSource(times.times, *times.span(unit), block_size)
+            for unit in unit_ids
+        ]
+
+    if isinstance(times, np.ndarray):
+        buffers = [times for unit in unit_ids]
+    elif isinstance(times, pd.DataFrame):
+        buffers = [times[spike_times_key].loc[unit] for unit in unit_ids]
+    else:
+        buffers = [times[unit] for unit in unit_ids]
+
+    return [
+        _SpikeSource(
+            buffer if hasattr(buffer, "shape") else np.asarray(buffer),
+            0,
+            len(buffer),
+            block_size,
+        )
+        for buffer in buffers
+    ]
+
+
+def _window_extent(source, window_starts, window_ends):
+    """
+    Finds a range of spike indices covering each window
+
+    For ndarray buffers the ranges are exact; otherwise they
+    are rounded out to whole blocks.
+
+    Parameters
+    ----------
+    source : _SpikeSource
+        Spike times of one unit
+    window_starts : ndarray
+        1-D sequence of window start times
+    window_ends : ndarray
+        1-D sequence of window end times
+
+    Returns
+    -------
+    first : ndarray
+        Index of the first spike to read for each window
+    last : ndarray
+        Index after the last spike to read for each window
+
+    """
+
+    if source.sample is None:
+        spikes = source.buffer[slice(source.start, source.end)]
+        return (
+            np.searchsorted(spikes, window_starts),
+            np.searchsorted(spikes, window_ends),
+        )
+
+    first_block = np.searchsorted(source.sample, window_starts) - 1
+    last_block = np.searchsorted(source.sample, window_ends)
+
+    first = np.maximum(first_block, 0) * source.block_size
+    last = np.minimum(
+        last_block * source.block_size, source.end - source.start
+    )
+
+    return first, np.maximum(first, last)
+
+
+def _read_spikes(source, first, last):
+    """
+    Reads the parts of a unit's spike times that cover a set
+    of windows, merging overlapping ranges
+
+    Parameters
+    ----------
+    source : _SpikeSource
+        Spike times of one unit
+    first : ndarray
+        Index of the first spike to read for each window
+    last : ndarray
+        Index after the last spike to read for each window
+
+    Returns
+    -------
+    spikes : ndarray
+        Sorted spike times that include every spike inside
+        the windows (a view for ndarray buffers)
+
+    """
+
+    if source.sample is None:
+        return source.buffer[slice(source.start, source.end)]
+
+    order = np.argsort(first, kind="stable")
+    first = first[order]
+    last = np.maximum.accumulate(last[order])
+
+    new_range = np.ones((first.size,), dtype="bool")
+    new_range[1:] = first[1:] > last[:-1]
+    range_ends = np.append(np.flatnonzero(new_range)[1:] - 1, first.size - 1)
+
+    pieces = [
+        np.asarray(source.buffer[slice(i, j)])
+        for i, j in zip(
+            source.start + first[new_range], source.start + last[range_ends]
+        )
+        if j > i
+    ]
+
+    if len(pieces) == 0:
+        return np.zeros((0,), dtype=source.buffer.dtype)
+
+    return np.concatenate(pieces)
 
 
 align_to_events = to_events
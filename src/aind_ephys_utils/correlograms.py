@@ -0,0 +1,493 @@
+""" Module to compute auto- and cross-correlograms of spike trains
+"""
+
+import numpy as np
+
+from . import profiling
+from .align import _bin_indices, _expand_windows
+from .parallel import UnitPool
+from .spike_trains import SpikeTrains, get_unit_ids, get_unit_times
+
+MAX_LAGS = 2**18  # spike pairs binned at once by each worker
+
+
+@profiling.timed("correlograms.correlograms")
+def correlograms(
+    times,
+    bin_size,
+    window,
+    unit_ids=None,
+    pairs=None,
+    spike_times_key="spike_times",
+    count_dtype="uint32",
+    n_jobs=None,
+    executor=None,
+):
+    """
+    Computes cross-correlograms (and autocorrelograms) for all
+    pairs of units, or for a subset of pairs
+
+    The spike times of all target units are merged into one sorted
+    sequence, and each reference spike is aligned to it with the
+    same window search as `align.to_events`, so the cost grows with
+    the number of spike pairs inside the window, not with the
+    square of the number of spikes. With `pairs`, each reference
+    unit is only aligned to the targets it is paired with.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of spike times (in seconds). Must
+        be sorted in ascending order.
+    bin_size : float
+        Bin size (in seconds)
+    window : float
+        Largest lag (in seconds); lags in [-window, window) are counted
+    unit_ids : List[int]
+        Labels for each unit (see `align.to_events`)
+    pairs : List[tuple], optional
+        (reference, target) unit IDs of the correlograms to compute;
+        by default, all pairs are computed
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    count_dtype : str or np.dtype, optional (default = 'uint32')
+        Data type of the counts
+    n_jobs : int, optional
+        Number of parallel jobs across reference units; None or 1 runs
+        serially, and -1 uses all available cores
+    executor : str or Executor, optional
+        "thread" (default), "process" or an existing Executor
+        (see `align.to_events`)
+
+    Returns
+    -------
+    bins : ndarray
+        1-D sequence of lag bin left edges
+    counts : ndarray
+        units x units x bins array of spike pair counts, where
+        counts[i, j] counts the spikes of unit j at each lag after
+        the spikes of unit i; or pairs x bins if `pairs` is given.
+        Zero lags within a unit are not counted, so spikes are
+        not paired with themselves (or with duplicates).
+    unit_ids : ndarray
+        1-D sequence of unit IDs (or of pairs)
+
+    """
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    unit_ids = np.asarray(unit_ids)
+    bins = np.arange(-window, window + bin_size, bin_size)
+    unit_times = get_unit_times(times, unit_ids, spike_times_key)
+    pool_args = (bins, (-window, window), count_dtype, n_jobs, executor)
+
+    if pairs is None:
+        counts = _all_correlograms(unit_times, *pool_args)
+        return bins[:-1], counts, unit_ids
+
+    positions = {unit_id: k for k, unit_id in enumerate(unit_ids.tolist())}
+    pair_positions = np.array(
+        [[positions[i], positions[j]] for i, j in pairs], dtype="intp"
+    ).reshape(-1, 2)
+
+    counts = _pair_correlograms(unit_times, pair_positions, *pool_args)
+
+    return bins[:-1], counts, np.asarray(pairs)
+
+
+@profiling.timed("correlograms.autocorrelograms")
+def autocorrelograms(
+    times,
+    bin_size,
+    window,
+    unit_ids=None,
+    spike_times_key="spike_times",
+    count_dtype="uint32",
+    n_jobs=None,
+    executor=None,
+):
+    """
+    Computes the autocorrelogram of each unit
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of spike times (in seconds). Must
+        be sorted in ascending order.
+    bin_size : float
+        Bin size (in seconds)
+    window : float
+        Largest lag (in seconds); lags in [-window, window) are counted
+    unit_ids : List[int]
+        Labels for each unit (see `align.to_events`)
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    count_dtype : str or np.dtype, optional (default = 'uint32')
+        Data type of the counts
+    n_jobs : int, optional
+        Number of parallel jobs across units (see `correlograms`)
+    executor : str or Executor, optional
+        "thread" (default), "process" or an existing Executor
+
+    Returns
+    -------
+    bins : ndarray
+        1-D sequence of lag bin left edges
+    counts : ndarray
+        units x bins array of spike pair counts, without
+        zero lags
+    unit_ids : ndarray
+        1-D sequence of unit IDs
+
+    """
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    bins = np.arange(-window, window + bin_size, bin_size)
+    unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+    with UnitPool(unit_times, n_jobs, executor) as pool:
+        counts = pool.zeros((len(unit_times), bins.size - 1), count_dtype)
+        pool.map(
+            _autocorrelogram_rows,
+            (-window, window),
+            bins,
+            counts,
+            per_unit=((2, 0),),
+        )
+        counts = pool.result(counts)
+
+    return bins[:-1], counts, np.asarray(unit_ids)
+
+
+def _all_correlograms(
+    unit_times, bins, interval, count_dtype, n_jobs, executor
+):
+    """
+    Computes the correlograms of every pair of units, aligning each
+    reference spike to the merged spikes of all units at once
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    bins : ndarray
+        1-D sequence of lag bin edges
+    interval : tuple
+        Smallest and largest lag
+    count_dtype : str or np.dtype
+        Data type of the counts
+    n_jobs : int, optional
+        Number of parallel jobs across reference units
+    executor : str or Executor, optional
+        Executor for the jobs (see `UnitPool`)
+
+    Returns
+    -------
+    counts : ndarray
+        units x units x bins array of spike pair counts
+
+    """
+
+    merged_times, merged_units = _merge(unit_times)
+
+    with UnitPool(unit_times, n_jobs, executor) as pool:
+        counts = pool.zeros(
+            (len(unit_times), len(unit_times), bins.size - 1), count_dtype
+        )
+        pool.map(
+            _correlogram_rows,
+            pool.share(merged_times),
+            pool.share(merged_units),
+            np.arange(len(unit_times)),
+            interval,
+            bins,
+            counts,
+            per_unit=((2, 0), (5, 0)),
+        )
+
+        return pool.result(counts)
+
+
+def _pair_correlograms(
+    unit_times, pair_positions, bins, interval, count_dtype, n_jobs, executor
+):
+    """
+    Computes the correlograms of a subset of pairs, aligning each
+    reference unit only to the targets it is paired with
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    pair_positions : ndarray
+        pairs x 2 array of (reference, target) unit positions
+    bins : ndarray
+        1-D sequence of lag bin edges
+    interval : tuple
+        Smallest and largest lag
+    count_dtype : str or np.dtype
+        Data type of the counts
+    n_jobs : int, optional
+        Number of parallel jobs across reference units
+    executor : str or Executor, optional
+        Executor for the jobs (see `UnitPool`)
+
+    Returns
+    -------
+    counts : ndarray
+        pairs x bins array of spike pair counts
+
+    """
+
+    # group the pairs of each reference unit into a run of rows
+    order = np.argsort(pair_positions[:, 0], kind="stable")
+    sorted_pairs = pair_positions[order]
+    references, row_starts = np.unique(sorted_pairs[:, 0], return_index=True)
+    row_ends = np.append(row_starts[1:], order.size)
+
+    targets, target_codes = np.unique(sorted_pairs[:, 1], return_inverse=True)
+    target_trains = SpikeTrains.from_times([unit_times[j] for j in targets])
+
+    with UnitPool(
+        [unit_times[i] for i in references], n_jobs, executor
+    ) as pool:
+        counts = pool.zeros((order.size, bins.size - 1), count_dtype)
+        pool.map(
+            _pair_rows,
+            pool.share(target_trains.times),
+            target_trains.offsets,
+            target_codes.ravel(),
+            sorted_pairs[:, 0] == sorted_pairs[:, 1],
+            row_starts,
+            row_ends,
+            interval,
+            bins,
+            counts,
+            per_unit=((4, 0), (5, 0)),
+        )
+        sorted_counts = pool.result(counts)
+
+    counts = np.empty_like(sorted_counts)
+    counts[order] = sorted_counts
+
+    return counts
+
+
+def _merge(unit_times):
+    """
+    Merges the spike times of several units into one sorted sequence
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+
+    Returns
+    -------
+    merged_times : ndarray
+        1-D sequence of all spike times, sorted
+    merged_units : ndarray
+        Position in `unit_times` of the unit of each spike
+
+    """
+
+    if not unit_times:
+        return np.zeros((0,)), np.zeros((0,), dtype="intp")
+
+    merged_times = np.concatenate(unit_times)
+    merged_units = np.repeat(
+        np.arange(len(unit_times)), [spikes.size for spikes in unit_times]
+    )
+
+    order = np.argsort(merged_times, kind="stable")
+
+    return merged_times[order], merged_units[order]
+
+
+def _correlogram_rows(
+    unit_times, merged_times, merged_units, self_codes, interval, bins, out
+):
+    """
+    Counts the lags from each spike of a block of reference units
+    to the merged spikes of the target units
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times of a block of reference units
+    merged_times : ndarray
+        Sorted spike times of all target units
+    merged_units : ndarray
+        Target position of each merged spike
+    self_codes : ndarray
+        Target position of each reference unit (-1 if absent)
+    interval : tuple
+        Smallest and largest lag
+    bins : ndarray
+        1-D sequence of lag bin edges
+    out : ndarray
+        references x targets x bins array to write counts into
+
+    """
+
+    n_targets = out.shape[1]
+
+    for k, spikes in enumerate(unit_times):
+        out[k] = _lag_counts(
+            spikes,
+            merged_times,
+            merged_units,
+            n_targets,
+            self_codes[k],
+            interval,
+            bins,
+        )
+
+
+def _pair_rows(
+    unit_times,
+    target_times,
+    target_offsets,
+    target_codes,
+    same_unit,
+    row_starts,
+    row_ends,
+    interval,
+    bins,
+    out,
+):
+    """
+    Counts the lags from each spike of a block of reference units
+    to the spikes of the targets they are paired with
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times of a block of reference units
+    target_times : ndarray
+        Concatenated spike times of the target units
+    target_offsets : ndarray
+        Start of each target unit in `target_times`, plus the end
+    target_codes : ndarray
+        Target position of each pair
+    same_unit : ndarray
+        Whether each pair is a unit paired with itself
+    row_starts : ndarray
+        First pair of each reference unit in the block
+    row_ends : ndarray
+        End of the pairs of each reference unit (exclusive)
+    interval : tuple
+        Smallest and largest lag
+    bins : ndarray
+        1-D sequence of lag bin edges
+    out : ndarray
+        pairs x bins array to write counts into
+
+    """
+
+    for k, spikes in enumerate(unit_times):
+        for row in range(row_starts[k], row_ends[k]):
+            code = target_codes[row]
+            target = target_times[
+                slice(target_offsets[code], target_offsets[code + 1])
+            ]
+            out[row] = _lag_counts(
+                spikes,
+                target,
+                np.zeros(target.shape, dtype="intp"),
+                1,
+                0 if same_unit[row] else -1,
+                interval,
+                bins,
+            )[0]
+
+
+def _autocorrelogram_rows(unit_times, interval, bins, out):
+    """
+    Counts the lags between the spikes of each unit in a block
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times of a block of units
+    interval : tuple
+        Smallest and largest lag
+    bins : ndarray
+        1-D sequence of lag bin edges
+    out : ndarray
+        units x bins array to write counts into
+
+    """
+
+    for k, spikes in enumerate(unit_times):
+        units = np.zeros(spikes.shape, dtype="intp")
+        out[k] = _lag_counts(spikes, spikes, units, 1, 0, interval, bins)[0]
+
+
+def _lag_counts(
+    spikes, merged_times, merged_units, n_targets, self_code, interval, bins
+):
+    """
+    Histograms the lags from a set of reference spikes to the
+    merged spikes of the target units, in chunks of MAX_LAGS pairs
+
+    Parameters
+    ----------
+    spikes : ndarray
+        Sorted reference spike times
+    merged_times : ndarray
+        Sorted spike times of all target units
+    merged_units : ndarray
+        Target position of each merged spike
+    n_targets : int
+        Number of target units
+    self_code : int
+        Target position of the reference unit, whose zero lags
+        are not counted (-1 if it is not a target)
+    interval : tuple
+        Smallest and largest lag; lags in [interval[0], interval[1])
+        are counted, as in `align.to_events`
+    bins : ndarray
+        1-D sequence of lag bin edges
+
+    Returns
+    -------
+    counts : ndarray
+        targets x bins array of spike pair counts
+
+    """
+
+    n_bins = bins.size - 1
+    counts = np.zeros((n_targets * n_bins,), dtype="int64")
+
+    starts = np.searchsorted(merged_times, spikes + interval[0])
+    ends = np.searchsorted(merged_times, spikes + interval[1])
+    lags_per_spike = ends - starts
+
+    bounds = np.searchsorted(
+        np.cumsum(lags_per_spike),
+        np.arange(0, np.sum(lags_per_spike), MAX_LAGS),
+        side="right",
+    )
+
+    for chunk in np.split(np.arange(spikes.size), bounds[1:]):
+        indices = _expand_windows(starts[chunk], lags_per_spike[chunk])
+        lags = merged_times[indices] - np.repeat(
+            spikes[chunk], lags_per_spike[chunk]
+        )
+        units = merged_units[indices]
+
+        bin_indices = _bin_indices(lags, bins)
+        valid = (bin_indices >= 0) & ((units != self_code) | (lags != 0))
+
+        counts += np.bincount(
+            units[valid] * n_bins + bin_indices[valid],
+            minlength=counts.size,
+        )
+
+    return counts.reshape((n_targets, n_bins))
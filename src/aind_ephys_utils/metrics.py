@@ -3,9 +3,11 @@
 
 import numpy as np
 
-from . import align
+from . import align, profiling, rates
+from .spike_trains import get_unit_ids, get_unit_times
 
 
+@profiling.timed("metrics.spike_latency")
 def spike_latency(
     times,
     events,
@@ -23,11 +25,15 @@ def spike_latency(
     If `use_psth` is set to False, the latency will be computed
     as the median time to first spike on individual trials
 
+    To compute the latencies of many units at once, use
+    `psth_latency` or `first_spike_latency`
+
     Parameters
     ----------
-    times : ndarray
-        1-D sequence of times to align (in seconds). Must
-        be sorted in ascending order.
+    times : ndarray or SpikeTrains
+        1-D sequence of times to align (in seconds), or a
+        SpikeTrains object with a single unit. Must be sorted
+        in ascending order.
     events : ndarray
         1-D sequence of reference times (in seconds).
     interval : tuple
@@ -53,32 +59,391 @@ def spike_latency(
     first_spike_latency : float
         First spike latency in s
     individual_latencies : ndarray
-        Latency values for all trials with spikes
+        Latency values for all trials (NaN for trials
+        without spikes)
 
     """
 
     if use_psth:
-        win = np.array([0, 0.25, 0.5, 0.25, 0])  # 5-point Hann window
+        latencies, psth = psth_latency(
+            times,
+            events,
+            interval,
+            std_above_baseline=std_above_baseline,
+            bin_size=bin_size,
+        )
+
+        return latencies[0], psth[0]
+
+    else:
+        latencies, has_spikes = first_spike_latency(times, events, interval[1])
+
+        if not np.any(has_spikes):
+            return np.nan, latencies[:, 0]
+
+        return np.median(latencies[has_spikes]), latencies[:, 0]
+
+
+@profiling.timed("metrics.psth_latency")
+def psth_latency(
+    times,
+    events,
+    interval,
+    std_above_baseline=2,
+    bin_size=0.001,
+    unit_ids=None,
+    spike_times_key="spike_times",
+    n_jobs=None,
+    executor=None,
+):
+    """
+    Computes the PSTH latency of many units at once
+
+    The trial-averaged counts of all units come from one call to
+    `align.trial_average`, which accumulates them without building
+    the bins x events x units count tensor, so the memory used is
+    proportional to units x bins. The smoothing, baseline statistics
+    and threshold crossings are then computed across the unit axis.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple
+        First value = baseline interval
+        Second value = maximum latency
+    std_above_baseline : float, optional
+        Determines threshold for response onset
+        Latency = first value above Mean + Std * T
+    bin_size : float, optional
+        Bin size (in seconds) of the PSTH
+    unit_ids : List[int]
+        Labels for each unit (see `align.to_events`)
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    n_jobs : int, optional
+        Number of parallel jobs (see `align.to_events`)
+    executor : str or Executor, optional
+        "thread", "process" or an existing Executor
+        (see `align.to_events`)
+
+    Returns
+    -------
+    latencies : ndarray
+        Latency (in s) of each unit; 0 if the PSTH never
+        crosses the threshold
+    psth : ndarray
+        units x bins array of smoothed firing rates
+
+    """
+
+    bins, mean_counts, _ = align.trial_average(
+        times,
+        events,
+        interval,
+        bin_size,
+        unit_ids=unit_ids,
+        spike_times_key=spike_times_key,
+        n_jobs=n_jobs,
+        executor=executor,
+    )
+
+    psth = mean_counts.T / bin_size
+
+    return _psth_latency(psth, bins, std_above_baseline, bin_size)
+
+
+@profiling.timed("metrics.bootstrap_latency")
+def bootstrap_latency(
+    times,
+    events,
+    interval,
+    n_resamples=1000,
+    confidence=0.95,
+    std_above_baseline=2,
+    bin_size=0.001,
+    unit_ids=None,
+    spike_times_key="spike_times",
+    random_state=None,
+    chunk_size=100,
+):
+    """
+    Computes bootstrap confidence intervals for the PSTH
+    latency of many units
+
+    The spikes are aligned and binned once, and the integer counts
+    are kept. Each resample draws events with replacement, and its
+    PSTH is the product of the resample's event weights with the
+    trial x bin counts, so all resamples in a chunk are computed
+    with one matrix product per block of units. Only one block of
+    units is converted to floating point at a time.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    interval : tuple
+        First value = baseline interval
+        Second value = maximum latency
+    n_resamples : int, optional (default = 1000)
+        Number of bootstrap resamples
+    confidence : float, optional (default = 0.95)
+        Confidence level of the intervals
+    std_above_baseline : float, optional
+        Determines threshold for response onset
+        Latency = first value above Mean + Std * T
+    bin_size : float, optional
+        Bin size (in seconds) of the PSTH
+    unit_ids : List[int]
+        Labels for each unit (see `align.to_events`)
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+    random_state : int or np.random.Generator, optional
+        Seed or generator for drawing the resamples
+    chunk_size : int, optional (default = 100)
+        Number of resamples computed at once; besides the integer
+        counts, the memory used is proportional to
+        chunk_size x units x bins
+
+    Returns
+    -------
+    latencies : ndarray
+        Latency (in s) of each unit, from all events
+    confidence_intervals : ndarray
+        units x 2 array of lower and upper bounds (in s)
+    resampled_latencies : ndarray
+        resamples x units array of latencies (in s)
+
+    """
+
+    rng = np.random.default_rng(random_state)
+
+    bins, counts = _binned_counts(
+        times,
+        events,
+        interval,
+        bin_size,
+        unit_ids=unit_ids,
+        spike_times_key=spike_times_key,
+    )
+
+    n_bins, n_events, n_units = counts.shape
+
+    latencies, psth = _psth_latency(
+        np.mean(counts, 1).T / bin_size, bins, std_above_baseline, bin_size
+    )
+
+    # each block of units, cast to float, is about as large
+    # as the resampled PSTHs of a chunk
+    units_per_block = max(chunk_size * n_units // max(n_events, 1), 1)
+
+    resampled_latencies = np.zeros((n_resamples, n_units))
+
+    for start in range(0, n_resamples, chunk_size):
+        n = min(chunk_size, n_resamples - start)
 
-        bins, counts, unit_ids = align.to_events(
-            times, events, interval, bin_size=bin_size
+        samples = rng.integers(0, n_events, (n, n_events))
+        weights = np.zeros((n, n_events))
+        np.add.at(weights, (np.arange(n)[:, np.newaxis], samples), 1.0)
+
+        resampled_psth = _resampled_psth(weights, counts, units_per_block)
+        resampled_psth /= n_events * bin_size
+
+        resampled_latencies[slice(start, start + n)] = _psth_latency(
+            resampled_psth, bins, std_above_baseline, bin_size
+        )[0]
+
+    alpha = (1 - confidence) / 2
+    confidence_intervals = np.percentile(
+        resampled_latencies, [100 * alpha, 100 * (1 - alpha)], axis=0
+    ).T
+
+    return latencies, confidence_intervals, resampled_latencies
+
+
+@profiling.timed("metrics.first_spike_latency")
+def first_spike_latency(
+    times,
+    events,
+    max_latency,
+    unit_ids=None,
+    spike_times_key="spike_times",
+):
+    """
+    Computes the time to first spike after each event, for
+    many units at once
+
+    The first spike after each event is found with one
+    `searchsorted` call per unit, without aligning the other spikes.
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        1-D sequence(s) of times to align (in seconds). Must
+        be sorted in ascending order.
+    events : ndarray
+        1-D sequence of reference times (in seconds).
+    max_latency : float
+        Spikes must occur within this time after an event (in seconds)
+    unit_ids : List[int]
+        Labels for each unit (see `align.to_events`)
+    spike_times_key : str, optional (default = 'spike_times')
+        If 'times' argument is a DataFrame, this specifies the name of the
+        column containing the spike times.
+
+    Returns
+    -------
+    latencies : ndarray
+        events x units array of first spike latencies (in s);
+        NaN for trials without spikes
+    has_spikes : ndarray
+        events x units boolean array, True for trials with spikes
+
+    """
+
+    if unit_ids is None:
+        unit_ids = get_unit_ids(times)
+
+    events = np.asarray(events)
+    unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+    latencies = np.full((events.size, len(unit_times)), np.nan)
+    has_spikes = np.zeros(latencies.shape, dtype="bool")
+
+    for j, spikes in enumerate(unit_times):
+        first = np.searchsorted(spikes, events)
+        valid = first < spikes.size
+        first_times = spikes[first[valid]]
+
+        has_spikes[valid, j] = first_times < events[valid] + max_latency
+        latencies[has_spikes[:, j], j] = (
+            first_times[has_spikes[valid, j]] - events[has_spikes[:, j]]
         )
 
-        psth = np.convolve(np.mean(counts, 1) / bin_size, win, mode="same")
+    return latencies, has_spikes
 
-        onset = np.searchsorted(bins, 0)
 
-        baseline_firing_rate = np.mean(psth[:onset])
-        baseline_std = np.std(psth[:onset])
-        threshold = baseline_firing_rate + std_above_baseline * baseline_std
+def _binned_counts(times, events, interval, bin_size, **kwargs):
+    """
+    Aligns and bins spike times, keeping all three dimensions
 
-        first_spike_latency = np.argmax(psth[onset:] > threshold)
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        Sorted spike times for one or more units
+    events : ndarray
+        1-D sequence of reference times
+    interval : tuple
+        Start and end of the window around each event
+    bin_size : float
+        Bin size (in seconds)
+    **kwargs
+        Additional arguments to `align.to_events`
 
-        return first_spike_latency * bin_size, psth
+    Returns
+    -------
+    bins : ndarray
+        1-D sequence of time bin left edges
+    counts : ndarray
+        bins x events x units array of spike counts
 
-    else:
-        df = align.to_events(times, events, (0, interval[1]), return_df=True)
+    """
+
+    bins, counts, unit_ids = align.to_events(
+        times, events, interval, bin_size=bin_size, **kwargs
+    )
+
+    shape = (bins.size, np.size(events), len(unit_ids))
+
+    return bins, np.reshape(counts, shape)
+
+
+def _resampled_psth(weights, counts, units_per_block):
+    """
+    Sums the counts of each resample, one block of units at a time
+
+    Parameters
+    ----------
+    weights : ndarray
+        resamples x events array of the number of times each
+        event is drawn
+    counts : ndarray
+        bins x events x units array of spike counts
+    units_per_block : int
+        Number of units converted to floating point at once
+
+    Returns
+    -------
+    sums : ndarray
+        resamples x units x bins array of summed counts
+
+    """
+
+    n_bins, n_events, n_units = counts.shape
+    sums = np.empty((weights.shape[0], n_units, n_bins))
+
+    for start in range(0, n_units, units_per_block):
+        block = slice(start, start + units_per_block)
+
+        # events x units x bins, so each sum is a matrix product
+        trial_counts = np.transpose(counts[:, :, block], (1, 2, 0)).astype(
+            "float64"
+        )
+
+        sums[:, block, :] = np.reshape(
+            weights @ trial_counts.reshape((n_events, -1)),
+            (weights.shape[0], -1, n_bins),
+        )
+
+    return sums
+
+
+def _psth_latency(psth, bins, std_above_baseline, bin_size):
+    """
+    Smooths firing rates and finds where they first cross
+    a threshold above baseline
+
+    Parameters
+    ----------
+    psth : ndarray
+        ... x bins array of firing rates
+    bins : ndarray
+        1-D sequence of time bin left edges
+    std_above_baseline : float
+        Threshold for response onset, in baseline standard deviations
+    bin_size : float
+        Bin size (in seconds)
+
+    Returns
+    -------
+    latencies : ndarray
+        Latency (in s) for each PSTH; 0 if it never
+        crosses the threshold
+    psth : ndarray
+        Smoothed firing rates
+
+    """
+
+    win = np.array([0, 0.25, 0.5, 0.25, 0])  # 5-point Hann window
+
+    psth = rates.smooth(psth, win, axis=-1)
+
+    onset = np.searchsorted(bins, 0)
+
+    baseline_firing_rate = np.mean(psth[..., :onset], -1)
+    baseline_std = np.std(psth[..., :onset], -1)
+    threshold = baseline_firing_rate + std_above_baseline * baseline_std
 
-        latencies = np.squeeze(df.groupby("event_index").min()["time"].values)
+    first_crossing = np.argmax(
+        psth[..., onset:] > threshold[..., np.newaxis], -1
+    )
 
-        return np.median(latencies), latencies
+    return first_crossing * bin_size, psth
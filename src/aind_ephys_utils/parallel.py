@@ -0,0 +1,570 @@
+""" Module to run per-unit computations on multiple cores
+"""
+
+import os
+import weakref
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArray:
+    """
+    Picklable reference to an ndarray stored in shared memory
+
+    Only the name, shape, data type and (optional) index of the
+    shared block are pickled, so passing a SharedArray to a worker
+    process does not copy the data.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block
+    shape : tuple
+        Shape of the array
+    dtype : np.dtype
+        Data type of the array
+    index : tuple, optional
+        Index applied to the array after attaching to it
+
+    """
+
+    def __init__(self, name, shape, dtype, index=()):
+        """
+        Creates a reference to an existing shared memory block
+        """
+
+        self.name = name
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.index = index
+        self._shm = None
+
+    @classmethod
+    def create(cls, shape, dtype):
+        """
+        Allocates a new shared memory block, which the operating
+        system fills with zeros
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the array
+        dtype : np.dtype
+            Data type of the array
+
+        Returns
+        -------
+        shared : SharedArray
+            Reference that owns the block; call `release` to free it
+
+        """
+
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+        shared = cls(shm.name, tuple(shape), dtype)
+        shared._shm = shm
+
+        return shared
+
+    def __getstate__(self):
+        """
+        Pickles the reference without the shared memory handle
+        """
+
+        return {
+            "name": self.name,
+            "shape": self.shape,
+            "dtype": self.dtype,
+            "index": self.index,
+            "_shm": None,
+        }
+
+    def take(self, axis, indices):
+        """
+        Returns a reference to a slice of the array
+
+        Parameters
+        ----------
+        axis : int
+            Axis along which to slice
+        indices : slice
+            Range of elements to keep along `axis`
+
+        Returns
+        -------
+        shared : SharedArray
+            Reference to the same block, with an index applied
+
+        """
+
+        index = (slice(None),) * (axis % len(self.shape)) + (indices,)
+
+        return SharedArray(self.name, self.shape, self.dtype, index)
+
+    def open(self, handles):
+        """
+        Attaches to the shared memory block
+
+        Parameters
+        ----------
+        handles : list
+            List to which the shared memory handle is appended;
+            the handles must be closed once the array is deleted
+
+        Returns
+        -------
+        array : ndarray
+            View of the shared data
+
+        """
+
+        shm = shared_memory.SharedMemory(name=self.name)
+        handles.append(shm)
+
+        array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+        return array[self.index]
+
+    def write(self, array):
+        """
+        Copies data into the shared memory block
+
+        Parameters
+        ----------
+        array : ndarray
+            Data with the same shape as the block
+
+        """
+
+        shared = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        shared[...] = array
+
+    def copy(self):
+        """
+        Copies the shared data into a regular ndarray
+
+        Returns
+        -------
+        array : ndarray
+
+        """
+
+        shared = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+        return shared.copy()
+
+    def detach(self):
+        """
+        Hands the shared data over to a regular ndarray, without
+        copying it; the block is freed once that array and every
+        view of it are garbage collected
+
+        Returns
+        -------
+        array : ndarray
+
+        """
+
+        shm, self._shm = self._shm, None
+
+        return np.asarray(_SharedBuffer(shm, self.shape, self.dtype))
+
+    def release(self):
+        """
+        Closes and frees the shared memory block, unless it
+        has been detached
+        """
+
+        if self._shm is not None:
+            _free(self._shm)
+
+
+class _SharedBuffer:
+    """
+    Exposes a shared memory block through the array interface, so
+    that arrays built from it (and their views) keep it alive
+    """
+
+    def __init__(self, shm, shape, dtype):
+        """
+        Takes ownership of the block
+        """
+
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        self.__array_interface__ = view.__array_interface__
+        del view
+
+        weakref.finalize(self, _free, shm)
+
+
+def _free(shm):
+    """
+    Closes and unlinks a shared memory block
+
+    Parameters
+    ----------
+    shm : shared_memory.SharedMemory
+        Block to free
+
+    """
+
+    shm.close()
+    shm.unlink()
+
+
+class UnitPool:
+    """
+    Splits a set of units into contiguous blocks and runs
+    tasks on each block, serially or with an executor
+
+    With any executor other than a thread pool, the spike times of
+    all units are copied once into shared memory, and each worker
+    attaches to them instead of receiving a pickled copy. Arrays
+    created with `zeros` are also shared, so workers can write their
+    results in place, even if the executor pickles its arguments.
+
+    Parameters
+    ----------
+    unit_times : List[ndarray]
+        Sorted spike times for each unit
+    n_jobs : int, optional
+        Number of parallel jobs; 1 runs serially, and -1 uses all
+        available cores. None runs serially, or with one block per
+        worker of an existing Executor.
+    executor : str or Executor, optional
+        "thread" (default) or "process" to create a pool with
+        `n_jobs` workers, or an existing Executor to use
+
+    """
+
+    def __init__(self, unit_times, n_jobs=None, executor=None):
+        """
+        Prepares the unit blocks and (if needed) the executor
+        """
+
+        if n_jobs is None:
+            n_jobs = _max_workers(executor)
+        elif n_jobs == 0 or int(n_jobs) != n_jobs:
+            raise ValueError(
+                "n_jobs must be a positive integer, a negative integer "
+                "(counting back from all cores), or None."
+            )
+        elif n_jobs < 0:
+            n_jobs = max(os.cpu_count() + 1 + n_jobs, 1)
+
+        n_blocks = max(min(n_jobs, len(unit_times)), 1)
+        bounds = np.linspace(0, len(unit_times), n_blocks + 1).astype("int")
+        self.blocks = [
+            slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+        self._owns_executor = False
+        self._shared = []
+
+        if isinstance(executor, Executor):
+            self.executor = executor
+        elif n_jobs == 1:
+            self.executor = None
+        elif executor is None or executor == "thread":
+            self.executor = ThreadPoolExecutor(n_jobs)
+            self._owns_executor = True
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(n_jobs)
+            self._owns_executor = True
+        else:
+            raise ValueError(
+                "executor must be 'thread', 'process' or an Executor."
+            )
+
+        # only threads are known to see the same arrays as this process
+        self.shared_memory = self.executor is not None and not isinstance(
+            self.executor, ThreadPoolExecutor
+        )
+
+        if self.shared_memory:
+            self.unit_times = self._share_unit_times(unit_times)
+        else:
+            self.unit_times = [unit_times[block] for block in self.blocks]
+
+    def __enter__(self):
+        """
+        Returns the pool
+        """
+
+        return self
+
+    def __exit__(self, *args):
+        """
+        Frees shared memory and shuts down the executor (if owned)
+        """
+
+        if self._owns_executor:
+            self.executor.shutdown()
+
+        for shared in self._shared:
+            shared.release()
+
+    def _share_unit_times(self, unit_times):
+        """
+        Copies the spike times of all units into shared memory
+
+        Parameters
+        ----------
+        unit_times : List[ndarray]
+            Sorted spike times for each unit
+
+        Returns
+        -------
+        blocks : List[tuple]
+            (SharedArray, offsets) for each block of units
+
+        """
+
+        offsets = np.zeros((len(unit_times) + 1,), dtype="int64")
+        np.cumsum([spikes.size for spikes in unit_times], out=offsets[1:])
+
+        dtype = np.result_type(*unit_times) if unit_times else "float64"
+        buffer = self.zeros((offsets[-1],), dtype)
+        if offsets[-1] > 0:
+            buffer.write(np.concatenate(unit_times))
+
+        return [
+            (buffer, offsets[slice(block.start, block.stop + 1)])
+            for block in self.blocks
+        ]
+
+    def zeros(self, shape, dtype):
+        """
+        Allocates a zero-filled output array that workers
+        can write into
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the array
+        dtype : np.dtype
+            Data type of the array
+
+        Returns
+        -------
+        out : ndarray or SharedArray
+            A SharedArray if the pool uses processes,
+            otherwise a regular ndarray
+
+        """
+
+        if not self.shared_memory:
+            return np.zeros(shape, dtype)
+
+        shared = SharedArray.create(shape, dtype)
+        self._shared.append(shared)
+
+        return shared
+
+    def share(self, array):
+        """
+        Makes a read-only input available to every worker
+        without pickling it for each task
+
+        Parameters
+        ----------
+        array : ndarray
+            Data needed by every block of units
+
+        Returns
+        -------
+        shared : ndarray or SharedArray
+            A SharedArray holding a copy of the data if the pool
+            uses processes, otherwise `array` itself
+
+        """
+
+        if not self.shared_memory:
+            return array
+
+        shared = self.zeros(array.shape, array.dtype)
+        shared.write(array)
+
+        return shared
+
+    def result(self, out):
+        """
+        Converts an array created with `zeros` into an ndarray
+
+        Shared arrays are not copied: the returned ndarray uses
+        the shared block, which is freed along with it.
+
+        Parameters
+        ----------
+        out : ndarray or SharedArray
+            Array returned by `zeros`
+
+        Returns
+        -------
+        array : ndarray
+
+        """
+
+        if isinstance(out, SharedArray):
+            return out.detach()
+
+        return out
+
+    def map(self, func, *args, per_unit=()):
+        """
+        Calls `func(unit_times, *args)` on each block of units
+
+        Parameters
+        ----------
+        func : callable
+            Module-level function taking the spike times of a
+            block of units as its first argument
+        *args
+            Additional arguments passed to every call
+        per_unit : tuple of (int, int)
+            (argument position, axis) pairs; these arguments are
+            sliced along the given axis to match each block
+
+        Returns
+        -------
+        results : list
+            Return value of each call, in block order
+
+        """
+
+        calls = []
+
+        for block, unit_times in zip(self.blocks, self.unit_times):
+            block_args = list(args)
+            for position, axis in per_unit:
+                block_args[position] = _take(block_args[position], axis, block)
+            calls.append((func, unit_times, block_args))
+
+        if self.executor is None:
+            return [_run(*call) for call in calls]
+
+        return list(self.executor.map(_run, *zip(*calls)))
+
+
+def _max_workers(executor):
+    """
+    Returns the number of workers of an existing executor
+
+    Parameters
+    ----------
+    executor : str, Executor or None
+        Executor passed to `UnitPool`
+
+    Returns
+    -------
+    n_jobs : int
+        Worker count of an Executor (all available cores if it
+        does not report one), and 1 otherwise
+
+    """
+
+    if not isinstance(executor, Executor):
+        return 1
+
+    return getattr(executor, "_max_workers", None) or os.cpu_count()
+
+
+def _take(array, axis, block):
+    """
+    Slices an ndarray or SharedArray along one axis
+
+    Parameters
+    ----------
+    array : ndarray or SharedArray
+        Array to slice
+    axis : int
+        Axis along which to slice
+    block : slice
+        Range of elements to keep
+
+    Returns
+    -------
+    sliced : ndarray or SharedArray
+
+    """
+
+    if isinstance(array, SharedArray):
+        return array.take(axis, block)
+
+    index = (slice(None),) * (axis % array.ndim) + (block,)
+
+    return array[index]
+
+
+def _run(func, unit_times, args):
+    """
+    Runs one task, attaching to any shared memory it needs
+
+    Parameters
+    ----------
+    func : callable
+        Function to run
+    unit_times : List[ndarray] or tuple
+        Spike times of a block of units, or (SharedArray, offsets)
+    args : list
+        Additional arguments; SharedArrays are attached to
+
+    Returns
+    -------
+    result
+        Return value of `func`
+
+    """
+
+    handles = []
+    result = _call(func, unit_times, args, handles)
+
+    # the shared views created by `_call` are gone once it returns
+    for shm in handles:
+        shm.close()
+
+    return result
+
+
+def _call(func, unit_times, args, handles):
+    """
+    Attaches to shared arrays and calls `func`
+
+    Parameters
+    ----------
+    func : callable
+        Function to run
+    unit_times : List[ndarray] or tuple
+        Spike times of a block of units, or (SharedArray, offsets)
+    args : list
+        Additional arguments
+    handles : list
+        List to which shared memory handles are appended
+
+    Returns
+    -------
+    result
+        Return value of `func`
+
+    """
+
+    if isinstance(unit_times, tuple):
+        shared, offsets = unit_times
+        buffer = shared.open(handles)
+        unit_times = [
+            buffer[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+    args = [
+        arg.open(handles) if isinstance(arg, SharedArray) else arg
+        for arg in args
+    ]
+
+    return func(unit_times, *args)
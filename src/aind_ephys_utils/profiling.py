@@ -0,0 +1,299 @@
+""" Module to record per-stage timings of the analysis functions
+"""
+
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+_profilers = []  # active Profiler objects (innermost last)
+_callbacks = []  # functions registered with `register`
+
+
+class Profiler:
+    """
+    Collects the timings, call counts, spikes processed and
+    bytes allocated of each instrumented stage
+
+    Stages are named after the function or step they measure, e.g.
+    "align.to_events", "align.search" or "align.format". Times are
+    inclusive, so a stage's time includes the stages nested in it.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called as `callback(name, record)` at the end of every stage,
+        where `record` is a dict with "time", "spikes" and "bytes"
+
+    """
+
+    def __init__(self, callback=None):
+        """
+        Creates a profiler with no records
+        """
+
+        self.callback = callback
+        self.stages = {}
+
+    def record(self, name, record):
+        """
+        Adds the record of one stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        record : dict
+            Time (in seconds), spikes and bytes of the stage
+
+        """
+
+        stats = self.stages.setdefault(
+            name, {"calls": 0, "time": 0.0, "spikes": 0, "bytes": 0}
+        )
+        stats["calls"] += 1
+        for key, value in record.items():
+            stats[key] += value
+
+        if self.callback is not None:
+            self.callback(name, record)
+
+    def to_dict(self):
+        """
+        Returns the statistics of each stage
+
+        Returns
+        -------
+        stages : dict
+            Maps each stage name to a dict with its number of calls,
+            total time (in seconds), spikes processed and bytes
+            allocated
+
+        """
+
+        return {name: dict(stats) for name, stats in self.stages.items()}
+
+    def to_json(self, **kwargs):
+        """
+        Returns the statistics of each stage as a JSON string
+
+        Parameters
+        ----------
+        **kwargs
+            Additional arguments to `json.dumps` (e.g. indent)
+
+        Returns
+        -------
+        record : str
+
+        """
+
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class _Stage:
+    """
+    Context manager that times one stage and sends its record
+    to the active profilers and registered callbacks
+    """
+
+    def __init__(self, name):
+        """
+        Creates a stage with no spikes or bytes
+        """
+
+        self.name = name
+        self.spikes = 0
+        self.nbytes = 0
+
+    def __enter__(self):
+        """
+        Starts the timer
+        """
+
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *args):
+        """
+        Stops the timer and sends the record
+        """
+
+        record = {
+            "time": time.perf_counter() - self.start,
+            "spikes": int(self.spikes),
+            "bytes": int(self.nbytes),
+        }
+
+        for profiler in _profilers:
+            profiler.record(self.name, record)
+
+        for callback in _callbacks:
+            callback(self.name, record)
+
+    def __bool__(self):
+        """
+        Returns True, so callers count spikes and bytes
+        """
+
+        return True
+
+    def add(self, spikes=0, nbytes=0):
+        """
+        Adds spikes processed and bytes allocated to the stage
+
+        Parameters
+        ----------
+        spikes : int, optional
+            Number of spikes processed
+        nbytes : int, optional
+            Number of bytes allocated
+
+        """
+
+        self.spikes += spikes
+        self.nbytes += nbytes
+
+
+class _NullStage:
+    """
+    Context manager that does nothing, used when profiling is off
+    """
+
+    def __enter__(self):
+        """
+        Returns the stage
+        """
+
+        return self
+
+    def __exit__(self, *args):
+        """
+        Does nothing
+        """
+
+    def __bool__(self):
+        """
+        Returns False, so callers can skip counting
+        """
+
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """
+    Returns a context manager that measures one stage
+
+    When no profiler is active and no callback is registered, a
+    shared no-op object is returned, so instrumentation costs one
+    function call. Because that object is falsy, callers can guard
+    any counting work with `if stage:`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+
+    Returns
+    -------
+    stage : context manager
+
+    """
+
+    if not _profilers and not _callbacks:
+        return _NULL_STAGE
+
+    return _Stage(name)
+
+
+def timed(name):
+    """
+    Decorator that measures every call of a function as a stage
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+
+    Returns
+    -------
+    decorator : callable
+
+    """
+
+    def decorator(func):
+        """
+        Wraps `func` in a stage
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            """
+            Calls `func` inside a stage
+            """
+
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profile(callback=None):
+    """
+    Records the stages run inside a `with` block
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called as `callback(name, record)` at the end of every stage
+
+    Yields
+    ------
+    profiler : Profiler
+        Statistics of the stages, e.g. `profiler.to_dict()`
+
+    """
+
+    profiler = Profiler(callback)
+    _profilers.append(profiler)
+
+    try:
+        yield profiler
+    finally:
+        _profilers.remove(profiler)
+
+
+def register(callback):
+    """
+    Calls `callback(name, record)` at the end of every stage,
+    until it is unregistered
+
+    Parameters
+    ----------
+    callback : callable
+        Function to register
+
+    """
+
+    _callbacks.append(callback)
+
+
+def unregister(callback):
+    """
+    Stops calling a registered callback
+
+    Parameters
+    ----------
+    callback : callable
+        Function to unregister
+
+    """
+
+    _callbacks.remove(callback)
@@ -0,0 +1,378 @@
+""" Module to rebin spike counts at several resolutions
+without aligning the spikes again
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+
+from . import align
+from .align import _count_dtype
+
+
+class BinPyramid:
+    """
+    Binned spike counts that can be viewed at any integer
+    multiple of their bin size
+
+    Counts are kept at the finest resolution, or as cumulative sums
+    along the time axis. Coarser levels and counts over arbitrary
+    windows are computed from them in time proportional to the
+    number of bins, and the coarser levels are kept in a
+    least-recently-used cache up to `max_memory` bytes.
+
+    Parameters
+    ----------
+    counts : ndarray or xr.DataArray
+        Binned spike counts, e.g. the bins x events x units
+        array or DataArray returned by `align.to_events`. The time
+        axis is the first axis, or the "time" dimension.
+    bin_size : float
+        Bin size of `counts` (in seconds)
+    bins : ndarray, optional
+        1-D sequence of time bin left edges; taken from the "time"
+        coordinate of a DataArray, and otherwise starts at 0
+    store : str, optional (default = 'counts')
+        'counts' to keep the finest counts, or 'cumsum' to keep only
+        their cumulative sums, which makes every level and window
+        a difference of two rows
+    max_memory : int, optional (default = 2**28)
+        Maximum number of bytes of cached levels
+
+    """
+
+    def __init__(
+        self,
+        counts,
+        bin_size,
+        bins=None,
+        store="counts",
+        max_memory=2**28,
+    ):
+        """
+        Stores the finest counts or their cumulative sums
+        """
+
+        if store not in ("counts", "cumsum"):
+            raise ValueError("store must be 'counts' or 'cumsum'.")
+
+        if isinstance(counts, xr.DataArray):
+            counts = counts.transpose("time", ...)
+            bins = counts.time.values
+            self.dims = counts.dims[1:]
+            self.coords = {dim: counts[dim].values for dim in self.dims}
+            counts = counts.data
+        else:
+            counts = np.asarray(counts)
+            self.dims = tuple(f"dim_{k}" for k in range(1, counts.ndim))
+            self.coords = {}
+
+        if bins is None:
+            bins = np.arange(counts.shape[0]) * bin_size
+
+        self.bin_size = bin_size
+        self.bins = np.asarray(bins)
+        self.store = store
+        self.max_memory = max_memory
+
+        self._max_count = int(np.max(counts, initial=0))
+        self._cache = OrderedDict()
+
+        if store == "cumsum":
+            self.counts = None
+            self._cumulative = _cumulative(counts)
+        else:
+            self.counts = counts
+            self._cumulative = None
+
+    @classmethod
+    def from_events(
+        cls,
+        times,
+        events,
+        interval,
+        bin_size,
+        store="counts",
+        max_memory=2**28,
+        **kwargs,
+    ):
+        """
+        Aligns and bins spike times once, at the finest resolution
+
+        Parameters
+        ----------
+        times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+            1-D sequence(s) of times to align (in seconds). Must
+            be sorted in ascending order.
+        events : ndarray
+            1-D sequence of reference times (in seconds).
+        interval : tuple
+            Start and end of the window around each event (in seconds).
+        bin_size : float
+            Finest bin size (in seconds).
+        store : str, optional (default = 'counts')
+            'counts' or 'cumsum' (see `BinPyramid`)
+        max_memory : int, optional (default = 2**28)
+            Maximum number of bytes of cached levels
+        **kwargs
+            Additional arguments to `align.to_events` (e.g. unit_ids,
+            event_labels, n_jobs)
+
+        Returns
+        -------
+        pyramid : BinPyramid
+
+        """
+
+        counts = align.to_events(
+            times, events, interval, bin_size, return_df=True, **kwargs
+        )
+
+        return cls(counts, bin_size, store=store, max_memory=max_memory)
+
+    @property
+    def n_bins(self):
+        """
+        Number of bins at the finest resolution
+        """
+
+        return self.bins.size
+
+    @property
+    def cumulative(self):
+        """
+        Cumulative counts along the time axis, with a leading row of
+        zeros, so that the counts in bins [i, j) are
+        `cumulative[j] - cumulative[i]`
+        """
+
+        if self._cumulative is not None:
+            return self._cumulative
+
+        return self._cached("cumsum", lambda: _cumulative(self.counts))
+
+    def rebin(self, factor, return_df=False):
+        """
+        Returns the counts in bins `factor` times larger than
+        the finest bins
+
+        Trailing fine bins that do not fill a whole coarse bin
+        are dropped.
+
+        Parameters
+        ----------
+        factor : int
+            Number of fine bins in each coarse bin
+        return_df : bool, optional (default = False)
+            If True, returns an xarray.DataArray
+
+        Returns
+        -------
+        if return_df = False:
+        bins : ndarray
+            1-D sequence of coarse time bin left edges
+        counts : ndarray
+            Coarse counts, with the time axis first
+
+        if return_df = True:
+        da : xr.DataArray with a "time" dimension
+
+        """
+
+        if int(factor) != factor or factor < 1:
+            raise ValueError("factor must be a positive integer.")
+
+        factor = int(factor)
+        n_bins = self.n_bins // factor
+        bins = self.bins[slice(0, n_bins * factor, factor)]
+
+        if factor == 1 and self.counts is not None:
+            counts = self.counts
+        else:
+            counts = self._cached(factor, lambda: self._rebin(factor))
+
+        if not return_df:
+            return bins, counts
+
+        return xr.DataArray(
+            data=counts,
+            coords={"time": bins, **self.coords},
+            dims=("time",) + self.dims,
+        )
+
+    def window_counts(self, start, end, return_df=False):
+        """
+        Returns the counts between two times, for one window
+        or for a sequence of windows
+
+        Times are rounded to the nearest bin edge.
+
+        Parameters
+        ----------
+        start : float or ndarray
+            Start of each window (in seconds, relative to the events)
+        end : float or ndarray
+            End of each window (in seconds); same shape as `start`
+        return_df : bool, optional (default = False)
+            If True, returns an xarray.DataArray
+
+        Returns
+        -------
+        counts : ndarray or xr.DataArray
+            Counts in each window, with the window axis (if `start`
+            is a sequence) in place of the time axis
+
+        """
+
+        first = self._edge_index(start)
+        last = self._edge_index(end)
+
+        if first.shape != last.shape or np.any(last < first):
+            raise ValueError(
+                "start and end must have the same shape, with end >= start."
+            )
+
+        cumulative = self.cumulative
+        counts = cumulative[last] - cumulative[first]
+
+        if not return_df:
+            return counts
+
+        if first.ndim == 0:
+            return xr.DataArray(
+                data=counts, coords=self.coords, dims=self.dims
+            )
+
+        return xr.DataArray(
+            data=counts,
+            coords={
+                "start": ("window", self.bins[0] + first * self.bin_size),
+                "end": ("window", self.bins[0] + last * self.bin_size),
+                **self.coords,
+            },
+            dims=("window",) + self.dims,
+        )
+
+    def clear_cache(self):
+        """
+        Removes all cached levels
+        """
+
+        self._cache.clear()
+
+    def _edge_index(self, t):
+        """
+        Returns the index of the bin edge nearest to each time
+
+        Parameters
+        ----------
+        t : float or ndarray
+            Times (in seconds)
+
+        Returns
+        -------
+        indices : ndarray
+            Bin edge indices, from 0 to `n_bins`
+
+        """
+
+        indices = np.rint((np.asarray(t) - self.bins[0]) / self.bin_size)
+
+        return np.clip(indices, 0, self.n_bins).astype("intp")
+
+    def _rebin(self, factor):
+        """
+        Computes the counts at one coarser level
+
+        Parameters
+        ----------
+        factor : int
+            Number of fine bins in each coarse bin
+
+        Returns
+        -------
+        counts : ndarray
+            Coarse counts, with the time axis first
+
+        """
+
+        n_bins = self.n_bins // factor
+
+        if self.counts is None:
+            edges = self.cumulative[slice(0, n_bins * factor + 1, factor)]
+            return np.diff(edges, axis=0)
+
+        # start from the coarsest cached level that divides this one
+        base = max(
+            (f for f in self._cache if f != "cumsum" and factor % f == 0),
+            default=1,
+        )
+        source = self.counts if base == 1 else self._cache[base]
+        step = factor // base
+
+        return (
+            source[: n_bins * step]
+            .reshape((n_bins, step) + source.shape[1:])
+            .sum(axis=1, dtype=_count_dtype(self._max_count * factor))
+        )
+
+    def _cached(self, key, compute):
+        """
+        Returns a cached level, computing and caching it if needed
+
+        Parameters
+        ----------
+        key : int or str
+            Rebinning factor, or "cumsum"
+        compute : callable
+            Function that computes the level
+
+        Returns
+        -------
+        counts : ndarray
+            Read-only array
+
+        """
+
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        counts = compute()
+        counts.flags.writeable = False
+
+        if counts.nbytes <= self.max_memory:
+            self._cache[key] = counts
+            while (
+                sum(x.nbytes for x in self._cache.values()) > self.max_memory
+            ):
+                self._cache.popitem(last=False)
+
+        return counts
+
+
+def _cumulative(counts):
+    """
+    Computes cumulative counts along the first axis, with a leading
+    row of zeros, in the smallest data type that holds the totals
+
+    Parameters
+    ----------
+    counts : ndarray
+        Binned spike counts, with the time axis first
+
+    Returns
+    -------
+    cumulative : ndarray
+        Array with one more row than `counts`
+
+    """
+
+    totals = np.sum(counts, axis=0, dtype="int64")
+    dtype = _count_dtype(np.max(totals, initial=0))
+
+    cumulative = np.zeros((counts.shape[0] + 1,) + counts.shape[1:], dtype)
+    np.cumsum(counts, axis=0, dtype=dtype, out=cumulative[1:])
+
+    return cumulative
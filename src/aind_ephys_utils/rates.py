@@ -0,0 +1,352 @@
+""" Module to smooth binned spike counts into firing rates
+"""
+
+import numpy as np
+import xarray as xr
+
+KERNELS = ("gaussian", "exponential", "boxcar", "hann")
+
+FFT_THRESHOLD = 64  # kernels with more taps than this use the FFT
+
+BLOCK_BYTES = 2**26  # working memory per block of rows
+
+
+def make_kernel(shape, width, bin_size):
+    """
+    Creates a smoothing kernel, normalized to sum to 1
+
+    Parameters
+    ----------
+    shape : str
+        'gaussian' (standard deviation = width), 'exponential' (causal,
+        time constant = width), 'boxcar' or 'hann' (total duration =
+        width)
+    width : float
+        Width of the kernel (in seconds)
+    bin_size : float
+        Bin size (in seconds)
+
+    Returns
+    -------
+    weights : ndarray
+        1-D sequence of kernel weights
+    origin : int
+        Index of the weight applied to the current bin; weights
+        before it are applied to later bins
+
+    """
+
+    if shape not in KERNELS:
+        raise ValueError(f"kernel must be one of {KERNELS} or an ndarray.")
+
+    if width is None or bin_size is None:
+        raise ValueError(f"A '{shape}' kernel requires a width and bin_size.")
+
+    if width <= 0 or bin_size <= 0:
+        raise ValueError("width and bin_size must be positive.")
+
+    width = width / bin_size  # in bins
+
+    if shape == "gaussian":
+        half_width = max(int(np.ceil(4 * width)), 1)
+        t = np.arange(-half_width, half_width + 1)
+        weights = np.exp(-0.5 * (t / width) ** 2)
+        origin = half_width
+    elif shape == "exponential":
+        t = np.arange(max(int(np.ceil(5 * width)), 1) + 1)
+        weights = np.exp(-t / width)
+        origin = 0
+    elif shape == "boxcar":
+        weights = np.ones((max(int(round(width)), 1),))
+        origin = (weights.size - 1) // 2
+    else:
+        weights = np.hanning(max(int(round(width)), 1) + 2)[1:-1]
+        origin = (weights.size - 1) // 2
+
+    return weights / np.sum(weights), origin
+
+
+def smooth(
+    counts,
+    kernel="gaussian",
+    width=None,
+    bin_size=None,
+    axis=0,
+    method="auto",
+    out=None,
+    dtype=None,
+):
+    """
+    Convolves binned spike counts with a kernel along the time axis
+
+    Works on arrays of any shape, such as the bins x events x units
+    tensors returned by `align.to_events`. Rows are processed in
+    blocks, so the working memory does not grow with the size of
+    the input, and `out` may be the input array itself.
+
+    Parameters
+    ----------
+    counts : ndarray or xr.DataArray
+        Binned spike counts (or rates)
+    kernel : str or ndarray, optional (default = 'gaussian')
+        Name of a kernel (see `make_kernel`), or a 1-D sequence of
+        weights centered on the current bin, as in
+        `np.convolve(x, kernel, mode="same")`
+    width : float, optional
+        Width of a named kernel (in seconds)
+    bin_size : float, optional
+        Bin size (in seconds); required for named kernels
+    axis : int or str, optional (default = 0)
+        Time axis, or name of the time dimension of a DataArray
+    method : str, optional (default = 'auto')
+        'direct', 'fft', or 'auto' to use the FFT for kernels
+        with more than FFT_THRESHOLD weights
+    out : ndarray, optional
+        Floating-point array with the same shape as `counts` to
+        write the results into
+    dtype : str or np.dtype, optional
+        Data type of the results (e.g. 'float32'); defaults to the
+        data type of `out`, or float32 for float32 input and
+        float64 otherwise
+
+    Returns
+    -------
+    smoothed : ndarray or xr.DataArray
+        Smoothed counts, with the same shape as `counts`
+
+    """
+
+    if isinstance(counts, xr.DataArray):
+        if isinstance(axis, str):
+            axis = counts.get_axis_num(axis)
+        data = smooth(
+            counts.data, kernel, width, bin_size, axis, method, out, dtype
+        )
+        return counts.copy(data=data)
+
+    if isinstance(kernel, str):
+        weights, origin = make_kernel(kernel, width, bin_size)
+    else:
+        weights = np.asarray(kernel)
+        origin = (weights.size - 1) // 2
+
+    if method == "auto":
+        method = "fft" if weights.size > FFT_THRESHOLD else "direct"
+
+    if method not in ("direct", "fft"):
+        raise ValueError("method must be 'direct', 'fft' or 'auto'.")
+
+    out = _output(counts, out, dtype)
+    weights = weights.astype(out.dtype)
+    axis = axis % counts.ndim
+
+    for block in _blocks(counts.shape, axis, out.dtype.itemsize):
+        x = np.array(counts[block], dtype=out.dtype)
+
+        if method == "direct":
+            out[block] = _direct(x, weights, origin, axis)
+        else:
+            out[block] = _fft(x, weights, origin, axis)
+
+    return out
+
+
+def firing_rate(counts, bin_size, kernel="gaussian", width=None, **kwargs):
+    """
+    Converts binned spike counts into smoothed firing rates
+
+    Parameters
+    ----------
+    counts : ndarray or xr.DataArray
+        Binned spike counts (e.g. for single trials or averaged
+        over trials)
+    bin_size : float
+        Bin size (in seconds)
+    kernel : str or ndarray, optional (default = 'gaussian')
+        Smoothing kernel (see `smooth`)
+    width : float, optional
+        Width of a named kernel (in seconds)
+    **kwargs
+        Additional arguments to `smooth` (axis, method, out, dtype)
+
+    Returns
+    -------
+    rates : ndarray or xr.DataArray
+        Firing rates (in spikes per second)
+
+    """
+
+    rates = smooth(counts, kernel, width, bin_size, **kwargs)
+    rates /= bin_size
+
+    return rates
+
+
+def _output(counts, out, dtype):
+    """
+    Allocates (or checks) the floating-point array for the results
+
+    Parameters
+    ----------
+    counts : ndarray
+        Binned spike counts
+    out : ndarray or None
+        Array to write the results into
+    dtype : str or np.dtype, optional
+        Data type of the results, if `out` is None
+
+    Returns
+    -------
+    out : ndarray
+
+    """
+
+    if out is None:
+        if dtype is None:
+            dtype = "float32" if counts.dtype == np.float32 else "float64"
+        out = np.empty(counts.shape, dtype=dtype)
+
+    if not np.issubdtype(out.dtype, np.floating):
+        raise ValueError("out and dtype must be floating-point.")
+
+    return out
+
+
+def _blocks(shape, axis, itemsize):
+    """
+    Splits an array into blocks of rows along its largest
+    non-time axis
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array
+    axis : int
+        Time axis
+    itemsize : int
+        Bytes per element of the working arrays
+
+    Returns
+    -------
+    blocks : List[tuple]
+        Index of each block
+
+    """
+
+    other_axes = [k for k in range(len(shape)) if k != axis]
+
+    if not other_axes:
+        return [(slice(None),)]
+
+    split_axis = max(other_axes, key=lambda k: shape[k])
+
+    row_bytes = 4 * itemsize * np.prod(shape) / max(shape[split_axis], 1)
+    step = max(int(BLOCK_BYTES // max(row_bytes, 1)), 1)
+
+    return [
+        (slice(None),) * split_axis + (slice(start, start + step),)
+        for start in range(0, max(shape[split_axis], 1), step)
+    ]
+
+
+def _direct(x, weights, origin, axis):
+    """
+    Convolves an array with a short kernel, one weight at a time
+
+    Parameters
+    ----------
+    x : ndarray
+        Array to smooth
+    weights : ndarray
+        1-D sequence of kernel weights
+    origin : int
+        Index of the weight applied to the current bin
+    axis : int
+        Time axis
+
+    Returns
+    -------
+    smoothed : ndarray
+
+    """
+
+    n = x.shape[axis]
+    smoothed = np.zeros(x.shape, dtype=x.dtype)
+    before = (slice(None),) * axis
+
+    for k, weight in enumerate(weights):
+        shift = k - origin  # output bin t uses input bin t - shift
+        if abs(shift) >= n:
+            continue
+        target = before + (slice(max(shift, 0), n + min(shift, 0)),)
+        source = before + (slice(max(-shift, 0), n - max(shift, 0)),)
+        smoothed[target] += weight * x[source]
+
+    return smoothed
+
+
+def _fft(x, weights, origin, axis):
+    """
+    Convolves an array with a long kernel using the FFT
+
+    Parameters
+    ----------
+    x : ndarray
+        Array to smooth
+    weights : ndarray
+        1-D sequence of kernel weights
+    origin : int
+        Index of the weight applied to the current bin
+    axis : int
+        Time axis
+
+    Returns
+    -------
+    smoothed : ndarray
+
+    """
+
+    n = x.shape[axis]
+    size = _fft_size(n + weights.size - 1)
+
+    kernel_shape = [1] * x.ndim
+    kernel_shape[axis] = -1
+
+    spectrum = np.fft.rfft(x, size, axis=axis)
+    spectrum *= np.reshape(np.fft.rfft(weights, size), kernel_shape)
+
+    full = np.fft.irfft(spectrum, size, axis=axis)
+    index = (slice(None),) * axis + (slice(origin, origin + n),)
+
+    return full[index].astype(x.dtype)
+
+
+def _fft_size(n):
+    """
+    Returns the smallest length >= n whose only prime
+    factors are 2, 3 and 5, for which FFTs are fast
+
+    Parameters
+    ----------
+    n : int
+        Minimum length
+
+    Returns
+    -------
+    size : int
+
+    """
+
+    size = 1 << int(np.ceil(np.log2(n)))
+
+    power_of_5 = 1
+    while power_of_5 < 2 * n:
+        product = power_of_5
+        while product < 2 * n:
+            # smallest power of 2 that brings this product above n
+            candidate = product << max(int(np.ceil(np.log2(n / product))), 0)
+            size = min(size, candidate)
+            product *= 3
+        power_of_5 *= 5
+
+    return size
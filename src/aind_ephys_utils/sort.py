@@ -2,9 +2,19 @@
 """
 
 import numpy as np
+import pandas as pd
 
+from . import profiling
 
-def by_condition(df, condition="event_label", index="event_index"):
+
+@profiling.timed("sort.by_condition")
+def by_condition(
+    df,
+    condition="event_label",
+    index="event_index",
+    inplace=False,
+    return_indices=False,
+):
     """
     Sorts a DataFrame of spike times by a condition column
 
@@ -12,6 +22,9 @@ def by_condition(df, condition="event_label", index="event_index"):
     one sortable column tracking the trial condition, usually
     generated by the `align.to_events` method.
 
+    Rows are sorted by condition and then by trial index in a single
+    stable pass, so spikes within each trial keep their order.
+
     Parameters
     ----------
     df : pd.DataFrame
@@ -21,6 +34,12 @@ def by_condition(df, condition="event_label", index="event_index"):
         Name of the column with the trial condition
     index : str
         Name of the column with the trial index
+    inplace : bool, optional (default = False)
+        If True, reorders the columns of `df` one at a time
+        instead of creating a sorted copy, and returns None
+    return_indices : bool, optional (default = False)
+        If True, leaves `df` unchanged and only returns the sorting
+        permutation and the new trial indices
 
     Returns
     -------
@@ -28,20 +47,44 @@ def by_condition(df, condition="event_label", index="event_index"):
         DataFrame sorted by condition; the `index` column
         will be overwritten with new trial indices.
 
+    if return_indices = True:
+    order : ndarray
+        Row positions that sort `df` (e.g. for `df.take(order)`)
+    new_indices : ndarray
+        New trial index for each row of the sorted DataFrame
+
     """
 
-    sorted_df = df.sort_values(by=[condition, index])
+    codes, categories = pd.factorize(df[condition], sort=True)
+    codes[codes < 0] = len(categories)  # missing conditions sort last
+
+    trials = np.asarray(df[index])
+
+    order = np.lexsort((trials, codes))
+
+    sorted_codes = codes[order]
+    sorted_trials = trials[order]
+
+    new_trial = np.ones((order.size,), dtype="bool")
+    new_trial[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (
+        sorted_trials[1:] != sorted_trials[:-1]
+    )
+
+    new_indices = np.cumsum(new_trial) - 1
+    new_indices = new_indices.astype(trials.dtype, copy=False)
 
-    new_inds = []
-    total_trials = 0
+    if return_indices:
+        return order, new_indices
 
-    for condition in sorted_df.event_label.unique():
-        temp_df = sorted_df[sorted_df.event_label == condition]
-        t, unique_values = np.unique(temp_df.event_index, return_inverse=True)
-        new_inds.append(unique_values + total_trials)
-        total_trials += len(t)
+    if inplace:
+        df.index = df.index.take(order)
+        for column in df.columns:
+            df[column] = df[column].array.take(order)
+        df[index] = new_indices
+        return None
 
-    sorted_df["event_index"] = np.concatenate(new_inds)
+    sorted_df = df.take(order)
+    sorted_df[index] = new_indices
 
     return sorted_df
 
@@ -0,0 +1,295 @@
+""" Module to store the spike times of many units
+in one flat (CSR-style) buffer.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class SpikeTrains:
+    """
+    Spike times for a set of units, stored as one contiguous
+    buffer of times plus an array of offsets into that buffer
+
+    The spike times of the unit at position `k` are
+    `times[offsets[k]:offsets[k + 1]]`, and must be sorted in
+    ascending order. Indexing a SpikeTrains object with a unit ID
+    returns a view into the buffer, so it can be passed anywhere
+    a dict of spike times is accepted.
+
+    Parameters
+    ----------
+    times : ndarray or array-like
+        1-D buffer of spike times (float64 seconds or int64 samples).
+        Array-likes with a `shape` and slicing support (np.memmap,
+        h5py or zarr datasets) are kept as-is and read on demand.
+    offsets : ndarray
+        1-D sequence of len(unit_ids) + 1 indices into `times`
+    unit_ids : ndarray, optional
+        Labels for each unit (defaults to 0, 1, 2, ...)
+
+    """
+
+    def __init__(self, times, offsets, unit_ids=None):
+        """
+        Creates a SpikeTrains object without copying `times`
+        """
+
+        if not hasattr(times, "shape"):
+            times = np.asarray(times)
+
+        self.times = times
+        self.offsets = np.asarray(offsets, dtype="int64")
+
+        if len(self.times.shape) != 1 or self.offsets.ndim != 1:
+            raise ValueError("times and offsets must be 1-dimensional.")
+
+        if (
+            self.offsets.size == 0
+            or self.offsets[0] < 0
+            or self.offsets[-1] > self.times.shape[0]
+            or np.any(np.diff(self.offsets) < 0)
+        ):
+            raise ValueError(
+                "offsets must be non-decreasing indices into times."
+            )
+
+        if unit_ids is None:
+            unit_ids = np.arange(self.offsets.size - 1)
+
+        self.unit_ids = np.asarray(unit_ids)
+
+        if self.unit_ids.size != self.offsets.size - 1:
+            raise ValueError(
+                "offsets must have one more element than unit_ids."
+            )
+
+        self._positions = {
+            unit_id: k for k, unit_id in enumerate(self.unit_ids.tolist())
+        }
+
+    @classmethod
+    def from_nwb(cls, spike_times, spike_times_index, unit_ids=None):
+        """
+        Creates a SpikeTrains object from the ragged spike times
+        columns of an NWB units table, without copying the times
+
+        Parameters
+        ----------
+        spike_times : ndarray
+            Concatenated spike times of all units
+            (`units.spike_times.data`)
+        spike_times_index : ndarray
+            Index of the end of each unit's spike times
+            (`units.spike_times_index.data`)
+        unit_ids : ndarray, optional
+            Labels for each unit (`units.id.data`)
+
+        Returns
+        -------
+        spike_trains : SpikeTrains
+
+        """
+
+        offsets = np.concatenate(([0], np.asarray(spike_times_index)))
+
+        return cls(spike_times, offsets, unit_ids)
+
+    @classmethod
+    def from_times(cls, times, unit_ids=None, spike_times_key="spike_times"):
+        """
+        Copies spike times from any format accepted by
+        `align.to_events` into a SpikeTrains object
+
+        Parameters
+        ----------
+        times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+            Sorted spike times for one or more units
+        unit_ids : List[int], optional
+            Units to include (defaults to all units)
+        spike_times_key : str, optional (default = 'spike_times')
+            If `times` is a DataFrame, the name of the column
+            containing the spike times
+
+        Returns
+        -------
+        spike_trains : SpikeTrains
+
+        """
+
+        if unit_ids is None:
+            unit_ids = get_unit_ids(times)
+
+        unit_times = get_unit_times(times, unit_ids, spike_times_key)
+
+        offsets = np.zeros((len(unit_times) + 1,), dtype="int64")
+        np.cumsum([spikes.size for spikes in unit_times], out=offsets[1:])
+
+        if len(unit_times) > 0:
+            buffer = np.concatenate(unit_times)
+        else:
+            buffer = np.zeros((0,))
+
+        return cls(buffer, offsets, unit_ids)
+
+    def __len__(self):
+        """
+        Returns the number of units
+        """
+
+        return self.unit_ids.size
+
+    def __contains__(self, unit_id):
+        """
+        Returns True if there is a unit with this ID
+        """
+
+        return unit_id in self._positions
+
+    def __getitem__(self, unit_id):
+        """
+        Returns the spike times of one unit (a view into
+        the buffer if it is an ndarray)
+
+        Parameters
+        ----------
+        unit_id : int or str
+            ID of the unit
+
+        Returns
+        -------
+        spike_times : ndarray
+            1-D sequence of spike times
+
+        """
+
+        start, end = self.span(unit_id)
+
+        return self.times[start:end]
+
+    def span(self, unit_id):
+        """
+        Returns the range of the times buffer holding one unit
+
+        Parameters
+        ----------
+        unit_id : int or str
+            ID of the unit
+
+        Returns
+        -------
+        start : int
+            Index of the unit's first spike
+        end : int
+            Index after the unit's last spike
+
+        """
+
+        k = self._positions[unit_id]
+
+        return int(self.offsets[k]), int(self.offsets[k + 1])
+
+    def keys(self):
+        """
+        Returns the unit IDs, for compatibility with dicts
+        """
+
+        return self.unit_ids
+
+    def select(self, unit_ids):
+        """
+        Selects a subset of units
+
+        Parameters
+        ----------
+        unit_ids : List[int]
+            IDs of the units to keep
+
+        Returns
+        -------
+        spike_trains : SpikeTrains
+            New object; the times are only shared (not copied)
+            if the selected units are contiguous and in order
+
+        """
+
+        positions = np.array(
+            [self._positions[unit_id] for unit_id in unit_ids],
+            dtype="int64",
+        )
+
+        if positions.size > 0 and np.all(np.diff(positions) == 1):
+            first, last = positions[0], positions[-1] + 2
+            offsets = self.offsets[first:last]
+            return SpikeTrains(self.times, offsets, unit_ids)
+
+        return SpikeTrains.from_times(self, unit_ids)
+
+    @property
+    def spike_counts(self):
+        """
+        Number of spikes for each unit
+        """
+
+        return np.diff(self.offsets)
+
+
+def get_unit_ids(times):
+    """
+    Returns the default unit IDs for a set of spike times
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        Sorted spike times for one or more units
+
+    Returns
+    -------
+    unit_ids : List[int] or ndarray
+        [0] for an ndarray, list positions for a list,
+        keys for a dict, and the index for a DataFrame
+
+    """
+
+    if isinstance(times, np.ndarray):
+        return [0]
+    elif isinstance(times, list):
+        return np.arange(len(times))
+    elif isinstance(times, dict):
+        return np.array(list(times.keys()))
+    elif isinstance(times, pd.DataFrame):
+        return times.index.values
+    elif isinstance(times, SpikeTrains):
+        return times.unit_ids
+
+    raise TypeError(f"Unsupported spike times container: {type(times)}")
+
+
+def get_unit_times(times, unit_ids, spike_times_key="spike_times"):
+    """
+    Looks up the spike times of each unit once, so that
+    downstream loops do not need to dispatch on the input type
+
+    Parameters
+    ----------
+    times : ndarray, List[ndarrays], dict, DataFrame, or SpikeTrains
+        Sorted spike times for one or more units
+    unit_ids : List[int]
+        IDs of the units to look up
+    spike_times_key : str, optional (default = 'spike_times')
+        Name of the spike times column if `times` is a DataFrame
+
+    Returns
+    -------
+    unit_times : List[ndarray]
+        1-D array of spike times for each unit
+
+    """
+
+    if isinstance(times, np.ndarray):
+        return [times for unit in unit_ids]
+    elif isinstance(times, pd.DataFrame):
+        column = times[spike_times_key]
+        return [np.asarray(column.loc[unit]) for unit in unit_ids]
+    else:
+        return [np.asarray(times[unit]) for unit in unit_ids]
@@ -1,12 +1,32 @@
 """Tests spike alignment methods."""
 
+import os
+import sys
+import tempfile
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
 
+import h5py
 import numpy as np
 import pandas as pd
 from numpy.testing import assert_array_equal
 
-from aind_ephys_utils.align import align_to_events, to_events
+from aind_ephys_utils.align import (
+    Aligner,
+    StreamingAligner,
+    align_to_events,
+    iter_to_events,
+    spike_counts,
+    to_events,
+    to_events_by_condition,
+    to_events_into,
+    to_snippets,
+    to_warped_events,
+    trial_average,
+)
+from aind_ephys_utils.sort import by_condition
+from aind_ephys_utils.spike_trains import SpikeTrains
 
 
 class AlignSpikesTest(unittest.TestCase):
@@ -269,6 +289,1168 @@ class AlignSpikesTest(unittest.TestCase):
             np.sum(da.data), len(self.events) * len(self.unit_ids)
         )
 
+    def test_align_spike_trains(self) -> None:
+        """Test the `align` method with SpikeTrains as input"""
+
+        times_as_list = [self.times for unit in self.unit_ids]
+        trains = SpikeTrains.from_times(times_as_list)
+
+        ts, inds, units = to_events(trains, self.events, (-0.1, 0.1))
+        ref_ts, ref_inds, ref_units = to_events(
+            times_as_list, self.events, (-0.1, 0.1)
+        )
+
+        assert_array_equal(ts, ref_ts)
+        assert_array_equal(inds, ref_inds)
+        assert_array_equal(units, ref_units)
+
+        da = to_events(
+            trains,
+            self.events,
+            (-0.1, 0.1),
+            bin_size=0.01,
+            unit_ids=[2, 3],
+            return_df=True,
+        )
+
+        assert_array_equal(da.unit_id, [2, 3])
+        self.assertEqual(np.sum(da.data), len(self.events) * 2)
+
+    def test_align_matches_reference(self) -> None:
+        """Test the batched alignment against a per-event reference"""
+
+        rng = np.random.default_rng(42)
+        times_as_list = [
+            np.sort(rng.uniform(0, 20, n)) for n in (0, 5, 100, 300)
+        ]
+        events = np.sort(rng.uniform(0, 20, 25))
+        interval = (-0.5, 0.75)
+
+        ts, inds, units = to_events(times_as_list, events, interval)
+        bins, counts, unit_ids = to_events(
+            times_as_list, events, interval, bin_size=0.05
+        )
+
+        ref_ts = []
+        ref_counts = np.zeros(counts.shape)
+        for i, event in enumerate(events):
+            for j, unit_times in enumerate(times_as_list):
+                in_window = unit_times[
+                    (unit_times >= event + interval[0])
+                    & (unit_times < event + interval[1])
+                ]
+                ref_ts.append(in_window - event)
+                ref_counts[:, i, j] = np.histogram(
+                    in_window - event, np.append(bins, bins[-1] + 0.05)
+                )[0]
+
+        assert_array_equal(ts, np.concatenate(ref_ts))
+        assert_array_equal(counts, ref_counts)
+        self.assertTrue(np.all(np.diff(inds) >= 0))
+
+    def test_align_count_dtype(self) -> None:
+        """Test the data type of binned spike counts"""
+
+        bins, counts, unit_ids = to_events(
+            self.times, self.events, (-0.1, 0.1), bin_size=0.01
+        )
+
+        self.assertEqual(counts.dtype, np.uint8)
+
+        many_spikes = np.sort(np.concatenate([self.times] * 300))
+
+        bins, counts, unit_ids = to_events(
+            many_spikes, self.events, (-0.1, 0.1), bin_size=0.01
+        )
+
+        self.assertEqual(counts.dtype, np.uint16)
+        self.assertEqual(np.max(counts), 300)
+
+        da = to_events(
+            many_spikes,
+            self.events,
+            (-0.1, 0.1),
+            bin_size=0.01,
+            return_df=True,
+            count_dtype="int32",
+        )
+
+        self.assertEqual(da.dtype, np.int32)
+        self.assertEqual(np.sum(da.data), 300 * len(self.events))
+
+        with self.assertRaises(ValueError) as context:
+            to_events(
+                many_spikes,
+                self.events,
+                (-0.1, 0.1),
+                bin_size=0.01,
+                count_dtype="uint8",
+            )
+
+        self.assertTrue("cannot hold 300 spikes" in str(context.exception))
+
+    def test_align_sparse(self) -> None:
+        """Test sparse output of binned spike counts"""
+
+        rng = np.random.default_rng(2)
+        times_as_list = [
+            np.sort(rng.uniform(0, 20, n)) for n in (0, 10, 200, 50)
+        ]
+        events = np.sort(rng.uniform(0, 20, 30))
+        labels = rng.integers(0, 3, 30)
+        interval = (-0.5, 0.5)
+
+        bins, counts, unit_ids = to_events(
+            times_as_list, events, interval, bin_size=0.01
+        )
+
+        for n_jobs in (None, 2):
+            sparse_bins, sparse_counts, sparse_unit_ids = to_events(
+                times_as_list,
+                events,
+                interval,
+                bin_size=0.01,
+                output="sparse",
+                n_jobs=n_jobs,
+            )
+
+            assert_array_equal(sparse_counts.todense(), counts)
+            self.assertEqual(sparse_counts.dtype, counts.dtype)
+            self.assertTrue(sparse_counts.nnz < counts.size / 10)
+
+        da = to_events(
+            times_as_list,
+            events,
+            interval,
+            bin_size=0.01,
+            event_labels=labels,
+            return_df=True,
+            output="sparse",
+        )
+
+        assert_array_equal(
+            da.mean("event_label").data.todense(), np.mean(counts, 1)
+        )
+        assert_array_equal(
+            da.groupby("event_label").sum().data.todense(),
+            np.stack([np.sum(counts[:, labels == i], 1) for i in range(3)], 1),
+        )
+
+        bins, counts, unit_ids = to_events(
+            self.times, self.events, (-0.1, 0.1), bin_size=0.01
+        )
+        sparse_bins, sparse_counts, sparse_unit_ids = to_events(
+            self.times,
+            self.events,
+            (-0.1, 0.1),
+            bin_size=0.01,
+            output="sparse",
+        )
+
+        assert_array_equal(sparse_counts.todense(), counts)
+
+        for kwargs, message in (
+            ({"output": "csr", "bin_size": 0.01}, "output must be"),
+            ({"output": "lazy"}, "output='lazy' requires a bin_size."),
+        ):
+            with self.assertRaises(ValueError) as context:
+                to_events(self.times, self.events, (-0.1, 0.1), **kwargs)
+
+            self.assertTrue(message in str(context.exception))
+
+        with mock.patch.dict(sys.modules, {"sparse": None}):
+            with self.assertRaises(ImportError) as context:
+                to_events(
+                    self.times,
+                    self.events,
+                    (-0.1, 0.1),
+                    bin_size=0.01,
+                    output="sparse",
+                )
+
+        self.assertTrue("pip install sparse" in str(context.exception))
+
+    def test_align_lazy(self) -> None:
+        """Test lazy (dask) output of binned spike counts"""
+
+        rng = np.random.default_rng(3)
+        times_as_list = [
+            np.sort(rng.uniform(0, 20, n)) for n in (0, 10, 200, 50, 80)
+        ]
+        events = np.sort(rng.uniform(0, 20, 30))
+        interval = (-0.5, 0.5)
+
+        da = to_events(
+            times_as_list, events, interval, bin_size=0.01, return_df=True
+        )
+        lazy_da = to_events(
+            times_as_list,
+            events,
+            interval,
+            bin_size=0.01,
+            return_df=True,
+            output="lazy",
+            chunks={"event_index": 8, "unit_id": 2},
+        )
+
+        self.assertEqual(lazy_da.data.chunks[1], (8, 8, 8, 6))
+        self.assertEqual(lazy_da.data.chunks[2], (2, 2, 1))
+        assert_array_equal(lazy_da.values, da.values)
+        assert_array_equal(
+            lazy_da.sel(unit_id=3).mean("event_index").values,
+            da.sel(unit_id=3).mean("event_index").values,
+        )
+
+        bins, counts, unit_ids = to_events(
+            self.times, self.events, (-0.1, 0.1), bin_size=0.01, output="lazy"
+        )
+
+        self.assertEqual(counts.shape, (20, 10))
+        self.assertEqual(np.sum(counts.compute()), len(self.events))
+
+        bins, counts, unit_ids = to_events(
+            times_as_list, events[:0], interval, bin_size=0.01, output="lazy"
+        )
+
+        self.assertEqual(counts.shape, (100, 0, 5))
+
+        # the dtype depends on the window counts, not the spike totals
+        many = [np.linspace(0, 7000, 70000)]
+        dense = to_events(many, events, interval, bin_size=0.01)[1]
+        lazy = to_events(many, events, interval, bin_size=0.01, output="lazy")[
+            1
+        ]
+
+        self.assertEqual(lazy.dtype, dense.dtype)
+        self.assertEqual(dense.dtype, np.uint8)
+        assert_array_equal(lazy.compute(), dense)
+
+        lazy = to_events(
+            many,
+            events,
+            interval,
+            bin_size=0.01,
+            count_dtype="uint8",
+            output="lazy",
+        )[1]
+        assert_array_equal(lazy.compute(), dense)
+
+        lazy = to_events(
+            many,
+            events,
+            (-30, 30),
+            bin_size=10,
+            count_dtype="uint8",
+            output="lazy",
+        )[1]
+
+        with self.assertRaises(ValueError):
+            lazy.compute()
+
+        with mock.patch.dict(sys.modules, {"dask": None}):
+            with self.assertRaises(ImportError) as context:
+                to_events(
+                    self.times,
+                    self.events,
+                    (-0.1, 0.1),
+                    bin_size=0.01,
+                    output="lazy",
+                )
+
+        self.assertTrue("pip install 'dask[array]'" in str(context.exception))
+
+    def test_align_parallel(self) -> None:
+        """Test aligning units with thread and process pools"""
+
+        rng = np.random.default_rng(1)
+        times_as_dict = {
+            unit_id: np.sort(rng.uniform(0, 20, n))
+            for unit_id, n in zip("abcde", (0, 10, 200, 50, 400))
+        }
+        events = np.sort(rng.uniform(0, 20, 30))
+        interval = (-0.5, 0.5)
+
+        ts, inds, units = to_events(times_as_dict, events, interval)
+        bins, counts, unit_ids = to_events(
+            times_as_dict, events, interval, bin_size=0.01
+        )
+
+        with ProcessPoolExecutor(2) as executor:
+            for n_jobs, pool in (
+                (2, "thread"),
+                (-1, None),
+                (3, "process"),
+                (2, executor),
+            ):
+                par_ts, par_inds, par_units = to_events(
+                    times_as_dict,
+                    events,
+                    interval,
+                    n_jobs=n_jobs,
+                    executor=pool,
+                )
+
+                assert_array_equal(par_ts, ts)
+                assert_array_equal(par_inds, inds)
+                assert_array_equal(par_units, units)
+
+                da = to_events(
+                    times_as_dict,
+                    events,
+                    interval,
+                    bin_size=0.01,
+                    return_df=True,
+                    n_jobs=n_jobs,
+                    executor=pool,
+                )
+
+                assert_array_equal(da.data, counts)
+                assert_array_equal(da.unit_id, unit_ids)
+
+        with self.assertRaises(ValueError) as context:
+            to_events(
+                self.times, self.events, (-0.1, 0.1), n_jobs=2, executor="gpu"
+            )
+
+        self.assertTrue(
+            "executor must be 'thread', 'process' or an Executor."
+            in str(context.exception)
+        )
+
+    def test_align_out_of_core(self) -> None:
+        """Test chunked alignment of memory-mapped and HDF5 spike times"""
+
+        rng = np.random.default_rng(0)
+        times_as_list = [
+            np.sort(rng.uniform(0, 100, n)) for n in (0, 3, 2000, 500)
+        ]
+        trains = SpikeTrains.from_times(times_as_list)
+        events = np.sort(rng.uniform(0, 100, 50))
+        interval = (-0.5, 1.0)
+
+        bins, counts, unit_ids = to_events(
+            times_as_list, events, interval, bin_size=0.01
+        )
+
+        with tempfile.TemporaryDirectory() as folder:
+            mmap = np.memmap(
+                os.path.join(folder, "spike_times.dat"),
+                dtype=trains.times.dtype,
+                mode="w+",
+                shape=trains.times.shape,
+            )
+            mmap[:] = trains.times
+
+            with h5py.File(os.path.join(folder, "units.h5"), "w") as f:
+                f["spike_times"] = trains.times
+                f["spike_times_index"] = trains.offsets[1:]
+                f["unit_3"] = times_as_list[3]
+
+                for times in (
+                    SpikeTrains(mmap, trains.offsets),
+                    SpikeTrains.from_nwb(
+                        f["spike_times"], f["spike_times_index"]
+                    ),
+                    [list(times_as_list[2]), f["unit_3"]],
+                    pd.DataFrame(data={"spike_times": times_as_list}),
+                ):
+                    chunks = list(
+                        iter_to_events(
+                            times,
+                            events,
+                            interval,
+                            0.01,
+                            max_memory=2**16,
+                            block_size=64,
+                        )
+                    )
+
+                    self.assertTrue(len(chunks) > 1)
+                    assert_array_equal(chunks[0][1], bins)
+
+                    chunk_counts = np.concatenate(
+                        [chunk[2] for chunk in chunks], axis=1
+                    )
+                    n_units = chunk_counts.shape[2]
+                    assert_array_equal(chunk_counts, counts[:, :, -n_units:])
+
+                out = f.create_dataset(
+                    "counts", shape=counts.shape[:2] + (1,), dtype="uint16"
+                )
+                out_bins, out = to_events_into(
+                    out, mmap[3:2003], events, interval, 0.01
+                )
+
+                assert_array_equal(out_bins, bins)
+                assert_array_equal(out[:, :, 0], counts[:, :, 2])
+
+    def test_align_df_dtypes(self) -> None:
+        """Test the column types of raw aligned DataFrames"""
+
+        times_as_dict = {"a": self.times, "b": self.times[::2]}
+
+        df = to_events(
+            times_as_dict,
+            self.events,
+            (-0.1, 0.1),
+            event_labels=["x", "y"] * 5,
+            return_df=True,
+            time_dtype="float32",
+        )
+
+        self.assertEqual(df.time.dtype, np.float32)
+        self.assertEqual(df.event_index.dtype, np.int32)
+        self.assertIsInstance(df.unit_id.dtype, pd.CategoricalDtype)
+        self.assertIsInstance(df.event_label.dtype, pd.CategoricalDtype)
+        assert_array_equal(df.unit_id.cat.categories, ["a", "b"])
+        assert_array_equal(df.event_label.cat.categories, ["x", "y"])
+        assert_array_equal(df.unit_id, ["a", "b", "a"] * 5)
+        assert_array_equal(
+            df.event_label, np.repeat(["x", "y"] * 5, [2, 1] * 5)
+        )
+
+        ts, inds, unit_ids = to_events(times_as_dict, self.events, (-0.1, 0.1))
+
+        assert_array_equal(unit_ids, df.unit_id)
+
+    def test_aligner(self) -> None:
+        """Test repeated queries on an Aligner object"""
+
+        rng = np.random.default_rng(0)
+        times_as_dict = {
+            unit: np.sort(rng.uniform(0, 100, n))
+            for unit, n in zip("abc", (0, 500, 2000))
+        }
+        events = np.sort(rng.uniform(0, 100, 50))
+        subset = np.array([7, 3, 20])
+
+        aligner = Aligner(times_as_dict, events, (-1.0, 2.0), cache_size=2)
+
+        for interval in ((-1.0, 2.0), (-0.5, 0.5), (1.5, 2.0)):
+            for event_indices in (None, subset):
+                if event_indices is None:
+                    query_events = events
+                else:
+                    query_events = events[event_indices]
+
+                expected = to_events(times_as_dict, query_events, interval)
+                result = aligner.to_events(
+                    interval, event_indices=event_indices
+                )
+
+                for x, y in zip(result, expected):
+                    assert_array_equal(x, y)
+
+                for bin_size in (0.01, 0.1):
+                    expected = to_events(
+                        times_as_dict,
+                        query_events,
+                        interval,
+                        bin_size=bin_size,
+                    )
+                    result = aligner.to_events(
+                        interval,
+                        bin_size=bin_size,
+                        event_indices=event_indices,
+                    )
+
+                    assert_array_equal(result[0], expected[0])
+                    assert_array_equal(result[1], expected[1])
+                    self.assertEqual(result[1].dtype, expected[1].dtype)
+
+        self.assertEqual(len(aligner._cache), 2)
+
+        # narrower windows only search inside the cached windows
+        with mock.patch(
+            "aind_ephys_utils.align._window_indices",
+            side_effect=AssertionError("full search"),
+        ):
+            aligner.to_events((-0.2, 0.3), bin_size=0.05)
+            aligner.to_events((-0.2, 0.3), event_indices=subset)
+
+        counts = aligner.to_events(bin_size=0.1)[1]
+        self.assertFalse(counts.flags.writeable)
+        self.assertIs(aligner.to_events(bin_size=0.1)[1], counts)
+
+        df = aligner.to_events(
+            (-0.5, 0.5),
+            event_indices=subset,
+            event_labels=["x", "y", "z"],
+            return_df=True,
+        )
+        assert_array_equal(df.event_label.unique(), ["x", "y", "z"])
+
+        da = aligner.to_events(
+            bin_size=0.1,
+            event_indices=subset,
+            event_labels=["x", "y", "z"],
+            return_df=True,
+            count_dtype="int32",
+        )
+        self.assertEqual(da.dtype, np.int32)
+        assert_array_equal(da.event_label, ["x", "y", "z"])
+
+        aligner.clear_cache()
+        self.assertEqual(len(aligner._cache), 0)
+
+        with self.assertRaises(ValueError):
+            aligner.to_events((-2.0, 0.5))
+
+        with self.assertRaises(ValueError):
+            aligner.to_events(event_indices=subset, event_labels=["x"])
+
+    def test_streaming_aligner(self) -> None:
+        """Test alignment of spikes and events added in chunks"""
+
+        rng = np.random.default_rng(1)
+        times_as_list = [np.sort(rng.uniform(0, 100, n)) for n in (0, 3000)]
+        events = np.sort(rng.uniform(0, 100, 80))
+        interval = (-0.5, 1.0)
+        edges = np.arange(0, 101, 1.0)
+
+        for bin_size in (None, 0.05):
+            aligner = StreamingAligner(
+                interval, [0, 1], bin_size=bin_size, max_lag=1.0
+            )
+            results = []
+
+            for start, end in zip(edges[:-1], edges[1:]):
+                chunk = [
+                    spikes[(spikes >= start) & (spikes < end)]
+                    for spikes in times_as_list
+                ]
+                results.append(aligner.add_spikes(chunk, until=end))
+                results.append(
+                    aligner.add_events(
+                        events[(events >= start) & (events < end)]
+                    )
+                )
+
+                # only the trailing spikes are kept
+                self.assertTrue(aligner._buffers[1].size < 100)
+
+            results.append(aligner.flush())
+
+            event_indices = np.concatenate([r[0] for r in results])
+            assert_array_equal(event_indices, np.arange(80))
+
+            expected = to_events(
+                times_as_list, events, interval, bin_size=bin_size
+            )
+
+            if bin_size is None:
+                for k in range(3):
+                    assert_array_equal(
+                        np.concatenate([r[1][k] for r in results]),
+                        expected[k],
+                    )
+            else:
+                assert_array_equal(results[0][1][0], expected[0])
+                assert_array_equal(
+                    np.concatenate([r[1][1] for r in results], axis=1),
+                    expected[1],
+                )
+
+        aligner = StreamingAligner(interval, [0], max_lag=2.0)
+        aligner.add_spikes(np.array([1.0, 2.0, 3.0]))
+        self.assertEqual(aligner.time, 3.0)
+
+        event_indices, result = aligner.add_events([1.5, 2.5])
+        assert_array_equal(event_indices, [0])
+        assert_array_equal(result[0], [-0.5, 0.5])
+
+        with self.assertRaises(ValueError):
+            aligner.add_events([0.4])
+
+        aligner.add_spikes([np.array([])])
+        self.assertEqual(aligner.time, 3.0)
+
+    def test_align_variable_windows(self) -> None:
+        """Test alignment with a different window for each event"""
+
+        rng = np.random.default_rng(2)
+        times_as_list = [np.sort(rng.uniform(0, 100, n)) for n in (0, 2000)]
+        events = np.sort(rng.uniform(5, 95, 20))
+        interval = np.column_stack(
+            (-rng.uniform(0, 1, 20), rng.uniform(0.5, 3, 20))
+        )
+        bins = np.arange(np.min(interval[:, 0]), np.max(interval) + 0.1, 0.1)
+
+        ts, inds, unit_ids = to_events(times_as_list, events, interval)
+        counts = to_events(times_as_list, events, interval, bin_size=0.1)[1]
+        lazy = to_events(
+            times_as_list,
+            events,
+            interval,
+            bin_size=0.1,
+            output="lazy",
+            chunks={"event_index": 7},
+        )[1]
+        sparse_counts = to_events(
+            times_as_list, events, interval, bin_size=0.1, output="sparse"
+        )[1]
+        chunks = list(
+            iter_to_events(
+                times_as_list, events, interval, 0.1, max_memory=1000
+            )
+        )
+
+        self.assertEqual(counts.shape, (bins.size - 1, 20, 2))
+        self.assertTrue(len(chunks) > 1)
+
+        for k, event in enumerate(events):
+            expected = to_events(times_as_list, [event], interval[k])
+            assert_array_equal(ts[inds == k], expected[0])
+            assert_array_equal(unit_ids[inds == k], expected[2])
+
+            expected = np.histogram(expected[0][expected[2] == 1], bins)[0]
+            assert_array_equal(counts[:, k, 1], expected)
+
+        assert_array_equal(lazy.compute(), counts)
+        assert_array_equal(sparse_counts.todense(), counts)
+        assert_array_equal(
+            np.concatenate([c for _, _, c in chunks], axis=1), counts
+        )
+
+        with self.assertRaises(ValueError):
+            to_events(times_as_list, events, interval[:5])
+
+        empty = to_events(times_as_list, [], np.zeros((0, 2)), bin_size=0.1)
+        self.assertEqual(empty[1].size, 0)
+
+    def test_to_warped_events(self) -> None:
+        """Test alignment of trials warped between landmarks"""
+
+        rng = np.random.default_rng(3)
+        times_as_dict = {
+            unit: np.sort(rng.uniform(0, 100, n))
+            for unit, n in zip("ab", (500, 3000))
+        }
+        cues = np.sort(rng.uniform(5, 90, 15))
+        landmarks = np.column_stack(
+            (
+                cues,
+                cues + rng.uniform(0.5, 1.5, 15),
+                cues + rng.uniform(2.0, 3.0, 15),
+            )
+        )
+        landmarks[0, 1] = landmarks[0, 0]  # empty first segment
+        target = np.array([0.0, 1.0, 2.0])
+        padding = (-0.5, 0.25)
+
+        ts, inds, unit_ids = to_warped_events(
+            times_as_dict, landmarks, target, padding=padding
+        )
+
+        for k in range(15):
+            for unit, spikes in times_as_dict.items():
+                spikes = spikes[
+                    (spikes >= landmarks[k, 0] + padding[0])
+                    & (spikes < landmarks[k, -1] + padding[1])
+                ]
+                expected = np.interp(spikes, landmarks[k], target)
+                before = spikes < landmarks[k, 0]
+                expected[before] = spikes[before] - landmarks[k, 0]
+                after = spikes >= landmarks[k, -1]
+                expected[after] = spikes[after] - landmarks[k, -1] + 2.0
+
+                np.testing.assert_allclose(
+                    ts[(inds == k) & (unit_ids == unit)], expected
+                )
+
+        bins, counts, _ = to_warped_events(
+            times_as_dict, landmarks, target, bin_size=0.25, padding=padding
+        )
+        assert_array_equal(bins, np.arange(-0.5, 2.25, 0.25))
+        self.assertEqual(counts.sum(), ts.size)
+        for k in range(15):
+            assert_array_equal(
+                counts[:, k, 0],
+                np.histogram(
+                    ts[(inds == k) & (unit_ids == "a")],
+                    np.arange(-0.5, 2.5, 0.25),
+                )[0],
+            )
+
+        da = to_warped_events(
+            times_as_dict,
+            landmarks,
+            bin_size=0.1,
+            event_labels=np.arange(15) % 3,
+            return_df=True,
+        )
+        self.assertEqual(da.time[0], 0.0)
+        self.assertAlmostEqual(
+            float(da.time[-1]),
+            np.mean(landmarks[:, -1] - landmarks[:, 0]),
+            delta=0.1,
+        )
+        assert_array_equal(da.event_label, np.arange(15) % 3)
+
+        df = to_warped_events(times_as_dict, landmarks, return_df=True)
+        self.assertTrue(np.all((df.time >= 0) & (df.time < 2.5)))
+
+        with self.assertRaises(ValueError):
+            to_warped_events(times_as_dict, landmarks[:, :1])
+
+        with self.assertRaises(ValueError):
+            to_warped_events(times_as_dict, landmarks[:, ::-1])
+
+        with self.assertRaises(ValueError):
+            to_warped_events(times_as_dict, landmarks, [0.0, 1.0])
+
+        with self.assertRaises(ValueError):
+            to_warped_events(
+                times_as_dict, landmarks, event_labels=np.arange(3)
+            )
+
+    def test_trial_average(self) -> None:
+        """Test trial statistics computed without the count tensor"""
+
+        rng = np.random.default_rng(4)
+        times_as_dict = {
+            unit: np.sort(rng.uniform(0, 100, n))
+            for unit, n in zip("abc", (0, 500, 4000))
+        }
+        events = np.sort(rng.uniform(0, 100, 60))
+        interval = (-0.5, 1.0)
+
+        bins, counts, unit_ids = to_events(
+            times_as_dict, events, interval, bin_size=0.05
+        )
+        counts = counts.astype("float64")
+
+        expected = {
+            "sum": np.sum(counts, 1),
+            "mean": np.mean(counts, 1),
+            "var": np.var(counts, 1, ddof=1),
+            "sem": np.std(counts, 1, ddof=1) / np.sqrt(60),
+        }
+
+        for statistic, values in expected.items():
+            result = trial_average(
+                times_as_dict, events, interval, 0.05, statistic=statistic
+            )
+            assert_array_equal(result[0], bins)
+            np.testing.assert_allclose(result[1], values, atol=1e-12)
+            assert_array_equal(result[2], unit_ids)
+
+        da = trial_average(
+            times_as_dict,
+            events,
+            interval,
+            0.05,
+            statistic=["mean", "sem"],
+            ddof=0,
+            return_df=True,
+            n_jobs=2,
+        )
+        self.assertEqual(da.dims, ("statistic", "time", "unit_id"))
+        np.testing.assert_allclose(
+            da.sel(statistic="sem"),
+            np.std(counts, 1) / np.sqrt(60),
+            atol=1e-12,
+        )
+
+        da = trial_average(
+            times_as_dict, events, interval, 0.05, return_df=True
+        )
+        self.assertEqual(da.dims, ("time", "unit_id"))
+        np.testing.assert_allclose(da, expected["mean"])
+
+        # per-event windows count as zero outside each window
+        windows = np.column_stack((np.full(60, -0.5), rng.uniform(0, 1, 60)))
+        counts = to_events(times_as_dict, events, windows, bin_size=0.05)[1]
+        np.testing.assert_allclose(
+            trial_average(times_as_dict, events, windows, 0.05)[1],
+            np.mean(counts, 1),
+        )
+
+        values = trial_average(
+            times_as_dict, events[:1], interval, 0.05, statistic="var"
+        )[1]
+        self.assertTrue(np.all(np.isnan(values)))
+
+        with self.assertRaises(ValueError):
+            trial_average(
+                times_as_dict, events, interval, 0.05, statistic="median"
+            )
+
+    def test_trial_average_by_condition(self) -> None:
+        """Test trial statistics grouped by condition"""
+
+        rng = np.random.default_rng(5)
+        times_as_list = [np.sort(rng.uniform(0, 100, n)) for n in (200, 3000)]
+        events = np.sort(rng.uniform(0, 100, 40))
+        labels = np.array(["go", "stop", "catch"])[rng.integers(0, 3, 40)]
+        labels[0] = "rare"
+
+        counts = to_events(times_as_list, events, (-0.5, 1.0), bin_size=0.1)[1]
+
+        bins, values, unit_ids, n_events = trial_average(
+            times_as_list,
+            events,
+            (-0.5, 1.0),
+            0.1,
+            statistic=["mean", "var"],
+            event_labels=labels,
+        )
+        self.assertEqual(values.shape, (2, 4, bins.size, 2))
+        assert_array_equal(
+            n_events,
+            [np.sum(labels == x) for x in ["catch", "go", "rare", "stop"]],
+        )
+
+        for k, label in enumerate(["catch", "go", "rare", "stop"]):
+            np.testing.assert_allclose(
+                values[0, k], np.mean(counts[:, labels == label], 1)
+            )
+
+        np.testing.assert_allclose(
+            values[1, 1], np.var(counts[:, labels == "go"], 1, ddof=1)
+        )
+        self.assertTrue(np.all(np.isnan(values[1, 2])))
+
+        da = trial_average(
+            times_as_list,
+            events,
+            (-0.5, 1.0),
+            0.1,
+            statistic="sum",
+            event_labels=labels,
+            return_df=True,
+        )
+        self.assertEqual(da.dims, ("event_label", "time", "unit_id"))
+        assert_array_equal(da.event_label, ["catch", "go", "rare", "stop"])
+        assert_array_equal(
+            da.n_events, [np.sum(labels == x) for x in da.event_label.values]
+        )
+        assert_array_equal(da.sel(event_label="rare"), counts[:, 0])
+
+        with self.assertRaises(ValueError):
+            trial_average(
+                times_as_list,
+                events,
+                (-0.5, 1.0),
+                0.1,
+                event_labels=labels[:3],
+            )
+
+    def test_to_events_by_condition(self) -> None:
+        """Test raw alignment grouped by condition"""
+
+        rng = np.random.default_rng(6)
+        times_as_dict = {
+            unit: np.sort(rng.uniform(0, 100, n))
+            for unit, n in zip("ab", (500, 1000))
+        }
+        events = np.sort(rng.uniform(0, 100, 30))
+        labels = rng.integers(0, 4, 30).astype("float")
+        labels[3] = np.nan
+
+        df = to_events_by_condition(
+            times_as_dict, events, (-0.2, 0.3), labels, return_df=True
+        )
+        expected = by_condition(
+            to_events(
+                times_as_dict,
+                events,
+                (-0.2, 0.3),
+                event_labels=labels,
+                return_df=True,
+            )
+        )
+
+        assert_array_equal(df.time, expected.time)
+        assert_array_equal(df.unit_id, expected.unit_id)
+        assert_array_equal(df.event_label, expected.event_label)
+        self.assertTrue(np.all(np.diff(df.event_index) >= 0))
+
+        ts, inds, unit_ids, order = to_events_by_condition(
+            times_as_dict, events, (-0.2, 0.3), labels
+        )
+        assert_array_equal(order[-1], 3)
+
+        for k, index in enumerate(order):
+            expected = to_events(times_as_dict, [events[index]], (-0.2, 0.3))
+            assert_array_equal(ts[inds == k], expected[0])
+            assert_array_equal(unit_ids[inds == k], expected[2])
+
+        with self.assertRaises(ValueError):
+            to_events_by_condition(
+                times_as_dict, events, (-0.2, 0.3), labels[:3]
+            )
+
+    def test_spike_counts(self) -> None:
+        """Test spike counts in response windows"""
+
+        rng = np.random.default_rng(7)
+        times_as_dict = {
+            unit: np.sort(rng.uniform(0, 100, n))
+            for unit, n in zip("abc", (0, 300, 3000))
+        }
+        events = np.sort(rng.uniform(0, 100, 50))
+        windows = np.array([[-0.5, 0.0], [0.0, 0.25], [0.05, 0.5]])
+
+        ts, inds, unit_ids = to_events(times_as_dict, events, (-0.5, 0.5))
+
+        def expected(start, end):
+            """Counts raw aligned spikes in [start, end)"""
+
+            in_window = (ts >= start) & (ts < end)
+            return np.stack(
+                [
+                    np.bincount(
+                        inds[in_window & (unit_ids == unit)], minlength=50
+                    )
+                    for unit in "abc"
+                ],
+                axis=1,
+            )
+
+        counts, ids = spike_counts(times_as_dict, events, (0.0, 0.25))
+        assert_array_equal(counts, expected(0.0, 0.25))
+        assert_array_equal(ids, ["a", "b", "c"])
+        self.assertEqual(counts.dtype, np.uint8)
+
+        # the dtype depends on the window counts, not the spike totals
+        many = [np.linspace(0, 100, 70000)]
+        counts = spike_counts(many, events, (0.0, 0.01))[0]
+        self.assertEqual(counts.dtype, np.uint8)
+        assert_array_equal(
+            spike_counts(many, events, (0.0, 0.01), count_dtype="uint16")[0],
+            counts,
+        )
+
+        with self.assertRaises(ValueError):
+            spike_counts(many, events, (0.0, 1.0), count_dtype="uint8")
+
+        counts = spike_counts(times_as_dict, events, windows, n_jobs=2)[0]
+        self.assertEqual(counts.shape, (50, 3, 3))
+        for k, (start, end) in enumerate(windows):
+            assert_array_equal(counts[:, :, k], expected(start, end))
+
+        per_event = np.repeat(windows[np.newaxis], 50, axis=0)
+        per_event[:, 1] += np.arange(50)[:, np.newaxis] * 0.001
+        rates = spike_counts(times_as_dict, events, per_event, rate=True)[0]
+        np.testing.assert_allclose(rates[:, :, 0], counts[:, :, 0] / 0.5)
+        np.testing.assert_allclose(
+            rates[10, :, 1], expected(0.01, 0.26)[10] / 0.25
+        )
+
+        da = spike_counts(
+            times_as_dict,
+            events,
+            windows,
+            event_labels=np.arange(50) % 5,
+            return_df=True,
+        )
+        self.assertEqual(da.dims, ("event_label", "unit_id", "window"))
+        assert_array_equal(da.window_start, windows[:, 0])
+        assert_array_equal(da, counts)
+
+        da = spike_counts(times_as_dict, events, (0.0, 0.25), return_df=True)
+        self.assertEqual(da.dims, ("event_index", "unit_id"))
+
+        da = spike_counts(times_as_dict, events, per_event, return_df=True)
+        self.assertNotIn("window_start", da.coords)
+
+        for bad in (np.zeros((3, 3)), per_event[:10]):
+            with self.assertRaises(ValueError):
+                spike_counts(times_as_dict, events, bad)
+
+        with self.assertRaises(ValueError):
+            spike_counts(
+                times_as_dict, events, windows, event_labels=np.arange(3)
+            )
+
+    def test_align_sample_indices(self) -> None:
+        """Test integer alignment of sample indices"""
+
+        rng = np.random.default_rng(8)
+        sampling_rate = 30000
+        samples = {
+            unit: np.sort(rng.integers(0, 100 * sampling_rate, n))
+            for unit, n in zip("ab", (2000, 5000))
+        }
+        events = np.sort(rng.integers(sampling_rate, 99 * sampling_rate, 40))
+
+        ts, inds, unit_ids = to_events(
+            samples,
+            events,
+            (-0.1, 0.2),
+            sampling_rate=sampling_rate,
+            event_timebase="samples",
+        )
+        self.assertEqual(ts.dtype, np.int32)
+
+        bins, counts, _ = to_events(
+            samples,
+            events / sampling_rate,
+            (-0.1, 0.2),
+            bin_size=0.001,
+            sampling_rate=sampling_rate,
+        )
+        self.assertEqual(bins.size, 300)
+        np.testing.assert_allclose(bins, np.arange(-3000, 6000, 30) / 30000)
+
+        for j, unit in enumerate("ab"):
+            for k, event in enumerate(events):
+                spikes = samples[unit]
+                offsets = spikes[
+                    (spikes >= event - 3000) & (spikes < event + 6000)
+                ]
+                offsets = offsets - event
+                assert_array_equal(
+                    ts[(inds == k) & (unit_ids == unit)], offsets
+                )
+                assert_array_equal(
+                    counts[:, k, j],
+                    np.bincount((offsets + 3000) // 30, minlength=300),
+                )
+
+        df = to_events(
+            samples,
+            events,
+            (-0.1, 0.2),
+            return_df=True,
+            sampling_rate=sampling_rate,
+            event_timebase="samples",
+            time_dtype="int64",
+        )
+        self.assertEqual(df.time.dtype, np.int64)
+
+        # integer events are still in seconds unless stated otherwise
+        whole_seconds = np.arange(10, 90, 10)
+        for event_times in (whole_seconds, whole_seconds.astype("float")):
+            result = to_events(
+                samples,
+                event_times,
+                (-0.1, 0.2),
+                bin_size=0.001,
+                sampling_rate=sampling_rate,
+            )[1]
+            assert_array_equal(
+                result,
+                to_events(
+                    samples,
+                    whole_seconds * sampling_rate,
+                    (-0.1, 0.2),
+                    bin_size=0.001,
+                    sampling_rate=sampling_rate,
+                    event_timebase="samples",
+                )[1],
+            )
+        self.assertGreater(np.sum(result), 0)
+
+        for event_times, event_timebase in (
+            (events, "ticks"),
+            (events / sampling_rate, "samples"),
+        ):
+            with self.assertRaises(ValueError):
+                to_events(
+                    samples,
+                    event_times,
+                    (-0.1, 0.2),
+                    sampling_rate=sampling_rate,
+                    event_timebase=event_timebase,
+                )
+
+        with self.assertRaises(ValueError):
+            to_events(
+                samples, events, (-0.1, 0.2), 0.00005, sampling_rate=30000
+            )
+
+        with self.assertRaises(ValueError):
+            to_events(
+                {"a": samples["a"] / 30000.0},
+                events,
+                (-0.1, 0.2),
+                sampling_rate=30000,
+            )
+
+    def test_to_snippets(self) -> None:
+        """Test peri-event snippets of continuous signals"""
+
+        rng = np.random.default_rng(9)
+        data = rng.normal(size=(5000, 4))
+        events = np.array([1.0, 2.5, 4.99, 0.05, 3.0])
+
+        times, snippets, channel_ids = to_snippets(
+            data, events, (-0.1, 0.2), sampling_rate=1000
+        )
+        np.testing.assert_allclose(times, np.arange(-100, 200) / 1000)
+        assert_array_equal(channel_ids, np.arange(4))
+        self.assertEqual(snippets.shape, (5, 300, 4))
+
+        for k in (0, 1, 4):
+            start = int(events[k] * 1000) - 100
+            assert_array_equal(snippets[k], data[slice(start, start + 300)])
+
+        assert_array_equal(snippets[2, :110], data[4890:])
+        self.assertTrue(np.all(np.isnan(snippets[2, 110:])))
+        self.assertTrue(np.all(np.isnan(snippets[3, :50])))
+        assert_array_equal(snippets[3, 50:], data[:250])
+
+        # evenly spaced windows inside the data are views
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "lfp.dat")
+            mmap = np.memmap(path, "int16", "w+", shape=(5000, 2))
+            mmap[:] = np.arange(10000).reshape((5000, 2)) % 1000
+
+            _, snippets, _ = to_snippets(
+                mmap, [1.0, 2.0, 3.0], (-0.01, 0.01), sampling_rate=1000
+            )
+            self.assertFalse(snippets.flags.owndata)
+            self.assertFalse(snippets.flags.writeable)
+            assert_array_equal(snippets[2], mmap[2990:3010])
+
+            _, snippets, _ = to_snippets(
+                mmap[:, 0], [0.0, 3.0], (-0.01, 0.01), sampling_rate=1000
+            )
+            self.assertEqual(snippets.dtype, np.int16)
+            assert_array_equal(snippets[0, :10], 0)
+            del mmap, snippets
+
+        timestamps = 100 + np.arange(5000) / 1000
+        da = to_snippets(
+            data,
+            events + 100.0004,
+            (-0.1, 0.2),
+            timestamps=timestamps,
+            event_labels=list("abcde"),
+            channel_ids=list("wxyz"),
+            return_df=True,
+        )
+        self.assertEqual(da.dims, ("event_label", "time", "channel"))
+        assert_array_equal(
+            da.sel(event_label="a", channel="x"), data[900:1200, 1]
+        )
+
+        # events outside the timestamps are padded, not clipped
+        _, snippets, _ = to_snippets(
+            np.arange(100.0),
+            [0.0, 5.5, 20.0, 15.0],
+            (-0.2, 0.2),
+            timestamps=5 + np.arange(100) / 10,
+        )
+        self.assertTrue(np.all(np.isnan(snippets[[0, 2]])))
+        assert_array_equal(snippets[1], [3, 4, 5, 6])
+        assert_array_equal(snippets[3], [98, 99, np.nan, np.nan])
+
+        da = to_snippets(data[:, 0], [1.0], (0, 0.01), 1000, return_df=True)
+        self.assertEqual(da.dims, ("event_index", "time"))
+
+        with self.assertRaises(ValueError):
+            to_snippets(data, events, (-0.1, 0.2))
+
+        with self.assertRaises(ValueError):
+            to_snippets(data, events, (-0.1, 0.2), 1000, event_labels=[1])
+
+        for interval in ((0.1, 0.1), (0.2, -0.1), (0.0, 0.0004)):
+            with self.assertRaises(ValueError):
+                to_snippets(data, events, interval, 1000)
+
     def test_align_to_events(self) -> None:
         """Test the `align_to_events` alias"""
 
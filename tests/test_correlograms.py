@@ -0,0 +1,159 @@
+"""Tests correlogram methods."""
+
+import unittest
+from concurrent.futures import Executor, Future
+from unittest import mock
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from aind_ephys_utils import correlograms as correlograms_module
+from aind_ephys_utils.correlograms import autocorrelograms, correlograms
+
+
+def brute_force(reference, target, same_unit, window, bin_size):
+    """Histograms the lags between all pairs of spikes"""
+
+    lags = (target[np.newaxis, :] - reference[:, np.newaxis]).ravel()
+    if same_unit:
+        lags = lags[lags != 0]
+    lags = lags[(lags >= -window) & (lags < window)]
+
+    return np.histogram(lags, np.arange(-window, window + bin_size, bin_size))[
+        0
+    ]
+
+
+class _RecordingExecutor(Executor):
+    """Runs tasks in this process and records their arguments"""
+
+    def __init__(self):
+        """Starts with no recorded calls"""
+
+        self.calls = []
+
+    def submit(self, fn, *args, **kwargs):
+        """Records and runs one task"""
+
+        self.calls.append(args)
+
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+
+        return future
+
+
+class CorrelogramsTest(unittest.TestCase):
+    """Tests correlogram methods."""
+
+    rng = np.random.default_rng(0)
+    c = np.sort(rng.uniform(0, 20, 300))
+    times_as_dict = {
+        "a": np.array([]),
+        "b": np.sort(np.concatenate((c[::2] + 0.003, [5.0, 5.0]))),
+        "c": c,
+        "d": np.sort(rng.uniform(0, 20, 400)),
+    }
+
+    def test_correlograms(self) -> None:
+        """Test all-pairs correlograms against a brute-force count"""
+
+        bins, counts, unit_ids = correlograms(self.times_as_dict, 0.001, 0.02)
+
+        self.assertEqual(counts.shape, (4, 4, 40))
+        self.assertEqual(counts.dtype, np.uint32)
+        assert_array_equal(unit_ids, list("abcd"))
+
+        for i, reference in enumerate(self.times_as_dict.values()):
+            for j, target in enumerate(self.times_as_dict.values()):
+                assert_array_equal(
+                    counts[i, j],
+                    brute_force(reference, target, i == j, 0.02, 0.001),
+                )
+
+        # unit c is followed by unit b after 3 ms
+        self.assertEqual(bins[np.argmax(counts[2, 1])].round(3), 0.003)
+
+    def test_pairs(self) -> None:
+        """Test a subset of pairs, computed in chunks"""
+
+        bins, counts, unit_ids = correlograms(self.times_as_dict, 0.001, 0.02)
+
+        with mock.patch.object(correlograms_module, "MAX_LAGS", 64):
+            pair_bins, pair_counts, pairs = correlograms(
+                self.times_as_dict,
+                0.001,
+                0.02,
+                pairs=[("c", "b"), ("d", "d"), ("c", "a")],
+                n_jobs=2,
+            )
+
+        assert_array_equal(pair_bins, bins)
+        assert_array_equal(pair_counts, counts[[2, 3, 2], [1, 3, 0]])
+        assert_array_equal(pairs, [["c", "b"], ["d", "d"], ["c", "a"]])
+
+        pair_bins, pair_counts, pairs = correlograms(
+            self.times_as_dict, 0.001, 0.02, pairs=[]
+        )
+
+        self.assertEqual(pair_counts.shape, (0, 40))
+        self.assertEqual(correlograms({}, 0.001, 0.02)[1].shape, (0, 0, 40))
+
+        # only the requested pairs are aligned
+        with mock.patch.object(
+            correlograms_module,
+            "_lag_counts",
+            wraps=correlograms_module._lag_counts,
+        ) as lag_counts:
+            correlograms(
+                self.times_as_dict, 0.001, 0.02, pairs=[("c", "b"), ("d", "d")]
+            )
+
+        self.assertEqual(lag_counts.call_count, 2)
+        self.assertEqual(
+            sorted(call.args[1].size for call in lag_counts.call_args_list),
+            [152, 400],
+        )
+
+    def test_shared_inputs(self) -> None:
+        """Test that spike times reach workers through shared memory"""
+
+        bins, counts, unit_ids = correlograms(self.times_as_dict, 0.001, 0.02)
+
+        for pairs in (None, [("c", "b"), ("d", "d"), ("c", "a")]):
+            executor = _RecordingExecutor()
+            result = correlograms(
+                self.times_as_dict,
+                0.001,
+                0.02,
+                pairs=pairs,
+                executor=executor,
+            )
+
+            if pairs is None:
+                assert_array_equal(result[1], counts)
+            else:
+                assert_array_equal(result[1], counts[[2, 3, 2], [1, 3, 0]])
+
+            for func, unit_times, args in executor.calls:
+                self.assertTrue(isinstance(unit_times, tuple))
+                for arg in args:
+                    self.assertLess(np.size(arg), 100)
+
+    def test_autocorrelograms(self) -> None:
+        """Test autocorrelograms against all-pairs correlograms"""
+
+        bins, counts, unit_ids = correlograms(self.times_as_dict, 0.001, 0.02)
+
+        acg_bins, acgs, acg_ids = autocorrelograms(
+            self.times_as_dict, 0.001, 0.02, count_dtype="int64"
+        )
+
+        assert_array_equal(acgs, counts[np.arange(4), np.arange(4)])
+        assert_array_equal(acg_ids, unit_ids)
+        self.assertEqual(acgs.dtype, np.int64)
+
+
+if __name__ == "__main__":
+    """Run the tests"""
+    unittest.main()
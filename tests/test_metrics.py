@@ -5,7 +5,12 @@ import unittest
 import numpy as np
 from numpy.testing import assert_allclose, assert_array_equal
 
-from aind_ephys_utils.metrics import spike_latency
+from aind_ephys_utils.metrics import (
+    bootstrap_latency,
+    first_spike_latency,
+    psth_latency,
+    spike_latency,
+)
 
 
 class SpikeLatencyTest(unittest.TestCase):
@@ -29,6 +34,123 @@ class SpikeLatencyTest(unittest.TestCase):
         assert_allclose(first_spike, self.offset)
         assert_array_equal(latencies, self.times - self.events)
 
+    def test_psth_latency(self) -> None:
+        """Test the `psth_latency` method for many units"""
+
+        rng = np.random.default_rng(0)
+        events = np.sort(rng.uniform(0, 100, 50))
+        times_as_dict = {
+            unit: np.sort(
+                np.concatenate(
+                    (rng.uniform(0, 100, 500), events + 0.01 * (unit + 1))
+                )
+            )
+            for unit in range(3)
+        }
+
+        latencies, psth = psth_latency(
+            times_as_dict, events, (-0.1, 0.1), std_above_baseline=10
+        )
+
+        self.assertEqual(psth.shape, (3, 200))
+
+        for unit, times in times_as_dict.items():
+            latency, unit_psth = spike_latency(
+                times, events, (-0.1, 0.1), std_above_baseline=10
+            )
+
+            assert_allclose(psth[unit], unit_psth)
+            self.assertEqual(latencies[unit], latency)
+
+        # smoothing spreads each response into the preceding bin
+        assert_allclose(latencies, [0.009, 0.019, 0.029], atol=0.0015)
+
+    def test_first_spike_latency(self) -> None:
+        """Test first spike latencies with trials without spikes"""
+
+        times_as_list = [
+            np.array([0.5, 1.02, 1.03, 3.01, 9.2]),
+            np.array([]),
+        ]
+
+        latencies, has_spikes = first_spike_latency(
+            times_as_list, self.events, 0.1
+        )
+
+        expected = np.full((10, 2), np.nan)
+        expected[[1, 3], 0] = [0.02, 0.01]
+
+        assert_allclose(latencies, expected)
+        assert_array_equal(has_spikes, ~np.isnan(expected))
+
+        first_spike, latencies = spike_latency(
+            times_as_list[0], self.events, (-0.1, 0.1), use_psth=False
+        )
+
+        assert_allclose(first_spike, 0.015)
+        assert_allclose(latencies, expected[:, 0])
+
+        first_spike, latencies = spike_latency(
+            times_as_list[1], self.events, (-0.1, 0.1), use_psth=False
+        )
+
+        self.assertTrue(np.isnan(first_spike))
+        self.assertTrue(np.all(np.isnan(latencies)))
+
+    def test_bootstrap_latency(self) -> None:
+        """Test bootstrap confidence intervals of PSTH latencies"""
+
+        rng = np.random.default_rng(0)
+        events = np.sort(rng.uniform(0, 100, 40))
+        times_as_list = [
+            np.sort(
+                np.concatenate(
+                    (
+                        rng.uniform(0, 100, 500),
+                        events + latency + rng.normal(0, 0.003, 40),
+                    )
+                )
+            )
+            for latency in (0.01, 0.03)
+        ]
+
+        latencies, intervals, resampled = bootstrap_latency(
+            times_as_list,
+            events,
+            (-0.1, 0.1),
+            n_resamples=50,
+            std_above_baseline=5,
+            random_state=1,
+            chunk_size=16,
+        )
+
+        self.assertEqual(intervals.shape, (2, 2))
+        self.assertEqual(resampled.shape, (50, 2))
+        assert_array_equal(
+            latencies,
+            psth_latency(times_as_list, events, (-0.1, 0.1), 5)[0],
+        )
+        self.assertTrue(np.all(intervals[:, 0] <= intervals[:, 1]))
+
+        # chunking does not change the resamples
+        assert_array_equal(
+            resampled,
+            bootstrap_latency(
+                times_as_list,
+                events,
+                (-0.1, 0.1),
+                n_resamples=50,
+                std_above_baseline=5,
+                random_state=1,
+            )[2],
+        )
+
+        samples = np.random.default_rng(1).integers(0, 40, (16, 40))
+        assert_allclose(
+            resampled[3],
+            psth_latency(times_as_list, events[samples[3]], (-0.1, 0.1), 5)[0],
+        )
+
 
 if __name__ == "__main__":
     """Run the tests"""
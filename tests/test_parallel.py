@@ -0,0 +1,116 @@
+"""Tests parallel execution helpers."""
+
+import gc
+import pickle
+import unittest
+from concurrent.futures import Executor, Future
+from multiprocessing import shared_memory
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from aind_ephys_utils.parallel import SharedArray, UnitPool
+
+
+def _write_sums(unit_times, out):
+    """Writes the sum of each unit's spike times"""
+
+    out[:] = [np.sum(spikes) for spikes in unit_times]
+
+
+class _PicklingExecutor(Executor):
+    """Runs tasks in this process on pickled copies of their arguments"""
+
+    _max_workers = 3
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs one task like a process pool would"""
+
+        fn, args, kwargs = pickle.loads(pickle.dumps((fn, args, kwargs)))
+
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+
+        return future
+
+
+class ParallelTest(unittest.TestCase):
+    """Tests the UnitPool and SharedArray classes."""
+
+    unit_times = [np.arange(n, dtype="float") for n in (0, 1, 5, 10)]
+
+    def test_shared_array(self) -> None:
+        """Test reading and writing shared arrays"""
+
+        shared = SharedArray.create((2, 3), "int32")
+
+        try:
+            assert_array_equal(shared.copy(), np.zeros((2, 3)))
+
+            shared.write(np.arange(6).reshape((2, 3)))
+
+            handles = []
+            view = shared.take(1, slice(1, 3)).open(handles)
+            assert_array_equal(view, [[1, 2], [4, 5]])
+
+            del view
+            for shm in handles:
+                shm.close()
+
+            state = shared.__getstate__()
+            self.assertEqual(state["name"], shared.name)
+            self.assertTrue(state["_shm"] is None)
+        finally:
+            shared.release()
+
+    def test_unit_pool(self) -> None:
+        """Test running tasks on blocks of units"""
+
+        expected = [np.sum(spikes) for spikes in self.unit_times]
+
+        for n_jobs, executor in ((None, None), (2, "thread")):
+            with UnitPool(self.unit_times, n_jobs, executor) as pool:
+                out = pool.zeros((len(self.unit_times),), "float")
+                pool.map(_write_sums, out, per_unit=((0, 0),))
+                assert_array_equal(pool.result(out), expected)
+
+        # writes from workers that receive pickled arguments
+        with UnitPool(self.unit_times, executor=_PicklingExecutor()) as pool:
+            self.assertTrue(pool.shared_memory)
+            self.assertEqual(len(pool.blocks), 3)
+
+            out = pool.zeros((len(self.unit_times),), "float")
+            pool.map(_write_sums, out, per_unit=((0, 0),))
+
+            self.assertTrue(isinstance(out, SharedArray))
+            result = pool.result(out)
+
+        # the result uses the shared block, which outlives the pool
+        # until the result and its views are gone
+        self.assertFalse(result.flags.owndata)
+        view = result[1:]
+        del result
+        assert_array_equal(view, expected[1:])
+
+        del view
+        gc.collect()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=out.name)
+
+    def test_invalid(self) -> None:
+        """Test errors for invalid job counts and executors"""
+
+        for n_jobs in (0, 1.5):
+            with self.assertRaises(ValueError):
+                UnitPool(self.unit_times, n_jobs)
+
+        with self.assertRaises(ValueError):
+            UnitPool(self.unit_times, 2, "cluster")
+
+        with UnitPool(self.unit_times, -1000) as pool:
+            self.assertEqual(len(pool.blocks), 1)
+
+
+if __name__ == "__main__":
+    """Run the tests"""
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests profiling methods."""
+
+import json
+import unittest
+
+import numpy as np
+
+from aind_ephys_utils import profiling
+from aind_ephys_utils.align import (
+    spike_counts,
+    to_events,
+    to_snippets,
+    to_warped_events,
+)
+from aind_ephys_utils.metrics import spike_latency
+from aind_ephys_utils.sort import by_condition
+
+
+class ProfilingTest(unittest.TestCase):
+    """Tests profiling methods."""
+
+    events = np.arange(10)  # 10 events
+    times = events + 0.002
+
+    def test_profile(self) -> None:
+        """Test the stages recorded by a profiler"""
+
+        records = []
+
+        with profiling.profile(lambda *args: records.append(args)) as p:
+            df = to_events(
+                [self.times, self.times[:5]],
+                self.events,
+                (-0.1, 0.1),
+                event_labels=self.events % 2,
+                return_df=True,
+            )
+            by_condition(df)
+            to_events(self.times, self.events, (-0.1, 0.1), bin_size=0.01)
+            spike_latency(self.times, self.events, (-0.1, 0.1))
+
+        stages = p.to_dict()
+
+        self.assertEqual(
+            set(stages),
+            {
+                "align.to_events",
+                "align.trial_average",
+                "align.lookup",
+                "align.search",
+                "align.gather",
+                "align.bin",
+                "align.format",
+                "sort.by_condition",
+                "metrics.spike_latency",
+                "metrics.psth_latency",
+            },
+        )
+        self.assertEqual(stages["align.to_events"]["calls"], 2)
+        self.assertEqual(stages["align.trial_average"]["calls"], 1)
+        self.assertEqual(stages["align.gather"]["spikes"], 15)
+        self.assertEqual(stages["align.bin"]["spikes"], 20)
+        self.assertEqual(stages["align.search"]["bytes"], 2 * 8 * 30)
+        self.assertEqual(len(records), 16)
+        self.assertEqual(json.loads(p.to_json()), stages)
+
+        with profiling.profile() as p:
+            pass
+
+        self.assertEqual(p.to_dict(), {})
+
+    def test_profile_warped(self) -> None:
+        """Test the stages recorded for time-warped alignment"""
+
+        landmarks = np.column_stack((self.events, self.events + 0.5))
+
+        with profiling.profile() as p:
+            to_warped_events(self.times, landmarks, bin_size=0.1)
+
+        stages = p.to_dict()
+
+        self.assertEqual(stages["align.warp"]["spikes"], 10)
+        self.assertEqual(stages["align.warp"]["bytes"], 8 * 10)
+        self.assertEqual(stages["align.to_warped_events"]["calls"], 1)
+
+    def test_profile_spike_counts(self) -> None:
+        """Test the stages recorded for response window counts"""
+
+        with profiling.profile() as p:
+            spike_counts([self.times, self.times], self.events, (0.0, 0.1))
+
+        self.assertEqual(p.to_dict()["align.search"]["bytes"], 10 * 2)
+
+    def test_profile_snippets(self) -> None:
+        """Test the bytes recorded for copied and viewed snippets"""
+
+        data = np.zeros((1000,))
+
+        with profiling.profile() as p:
+            to_snippets(data, [0.5, 0.6], (0.0, 0.01), sampling_rate=1000)
+            to_snippets(data, [0.5, 0.7, 0.6], (0.0, 0.01), 1000)
+
+        self.assertEqual(p.to_dict()["align.gather"]["bytes"], 3 * 10 * 8)
+
+    def test_register(self) -> None:
+        """Test registered callbacks and the disabled state"""
+
+        self.assertFalse(profiling.stage("align.to_events"))
+
+        names = []
+
+        def callback(name, record):
+            """Stores the stage name"""
+            names.append(name)
+
+        profiling.register(callback)
+        to_events(self.times, self.events, (-0.1, 0.1))
+        profiling.unregister(callback)
+        to_events(self.times, self.events, (-0.1, 0.1))
+
+        self.assertEqual(names[-1], "align.to_events")
+        self.assertEqual(len(names), 5)
+
+
+if __name__ == "__main__":
+    """Run the tests"""
+    unittest.main()
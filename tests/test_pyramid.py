@@ -0,0 +1,121 @@
+"""Tests bin pyramid methods."""
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from aind_ephys_utils.pyramid import BinPyramid
+
+
+class PyramidTest(unittest.TestCase):
+    """Tests rebinning and window counts."""
+
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 200, (103, 20, 3)).astype("uint8")
+
+    def test_rebin(self) -> None:
+        """Test integer-multiple rebinning against direct sums"""
+
+        for store in ("counts", "cumsum"):
+            pyramid = BinPyramid(self.counts, 0.001, store=store)
+
+            for factor in (1, 2, 5, 10, 50, 200):
+                bins, counts = pyramid.rebin(factor)
+                n_bins = 103 // factor
+
+                expected = (
+                    self.counts[: n_bins * factor]
+                    .reshape((n_bins, factor, 20, 3))
+                    .sum(axis=1)
+                )
+
+                assert_array_equal(counts, expected)
+                assert_array_equal(bins, np.arange(n_bins) * factor * 0.001)
+                self.assertLessEqual(
+                    expected.max(initial=0), np.iinfo(counts.dtype).max
+                )
+
+        with self.assertRaises(ValueError):
+            pyramid.rebin(2.5)
+
+        with self.assertRaises(ValueError):
+            BinPyramid(self.counts, 0.001, store="sums")
+
+    def test_rebin_cache(self) -> None:
+        """Test that coarse levels are cached up to the memory limit"""
+
+        pyramid = BinPyramid(self.counts, 0.001, max_memory=3000)
+
+        self.assertIs(pyramid.rebin(1)[1], self.counts)
+
+        counts = pyramid.rebin(5)[1]
+        self.assertFalse(counts.flags.writeable)
+        self.assertIs(pyramid.rebin(5)[1], counts)
+
+        # built from the cached 5x level
+        assert_array_equal(
+            pyramid.rebin(10)[1], counts.reshape((10, 2, 20, 3)).sum(1)
+        )
+        self.assertEqual(list(pyramid._cache), [10])
+
+        pyramid.rebin(1000)
+        pyramid.cumulative
+        self.assertEqual(list(pyramid._cache), [10, 1000])
+
+        pyramid.clear_cache()
+        self.assertEqual(len(pyramid._cache), 0)
+
+    def test_window_counts(self) -> None:
+        """Test counts over arbitrary windows"""
+
+        for store in ("counts", "cumsum"):
+            pyramid = BinPyramid(
+                self.counts, 1.0, bins=np.arange(103) - 50.0, store=store
+            )
+
+            assert_array_equal(
+                pyramid.window_counts(-10.2, 5.1),
+                self.counts[40:55].sum(axis=0),
+            )
+
+            counts = pyramid.window_counts([-60, 0], [0, 100])
+            assert_array_equal(counts[0], self.counts[:50].sum(axis=0))
+            assert_array_equal(counts[1], self.counts[50:].sum(axis=0))
+
+        with self.assertRaises(ValueError):
+            pyramid.window_counts(1.0, 0.0)
+
+        with self.assertRaises(ValueError):
+            pyramid.window_counts([0.0, 1.0], [2.0])
+
+    def test_from_events(self) -> None:
+        """Test a pyramid built from aligned spike times"""
+
+        times = {
+            "a": np.arange(0.005, 10, 0.01),
+            "b": np.arange(0.05, 10, 0.1),
+        }
+        events = np.array([2.0, 4.0, 6.0])
+
+        pyramid = BinPyramid.from_events(
+            times, events, (-0.5, 0.5), 0.01, event_labels=["x", "y", "x"]
+        )
+
+        da = pyramid.rebin(10, return_df=True)
+        self.assertEqual(da.dims, ("time", "event_label", "unit_id"))
+        assert_allclose(da.time, np.arange(-0.5, 0.5, 0.1), atol=1e-12)
+        assert_array_equal(da.sel(unit_id="b"), 1)
+
+        da = pyramid.window_counts(0.0, 0.2, return_df=True)
+        self.assertEqual(da.dims, ("event_label", "unit_id"))
+        assert_array_equal(da.sel(unit_id="a"), 20)
+
+        da = pyramid.window_counts([-0.5, 0.0], [0.0, 0.5], return_df=True)
+        self.assertEqual(da.dims, ("window", "event_label", "unit_id"))
+        assert_array_equal(da.start, [-0.5, 0.0])
+        assert_array_equal(da.sel(unit_id="b"), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
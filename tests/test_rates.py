@@ -0,0 +1,126 @@
+"""Tests firing rate methods."""
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from aind_ephys_utils.align import to_events
+from aind_ephys_utils.rates import firing_rate, make_kernel, smooth
+
+
+class RatesTest(unittest.TestCase):
+    """Tests smoothing and firing rate methods."""
+
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 5, (300, 20, 3)).astype("uint8")
+
+    def test_kernels(self) -> None:
+        """Test named kernels against np.convolve"""
+
+        for shape in ("gaussian", "exponential", "boxcar", "hann"):
+            weights, origin = make_kernel(shape, 0.01, 0.001)
+
+            assert_allclose(np.sum(weights), 1.0)
+
+            expected = np.apply_along_axis(
+                lambda x: np.convolve(x, weights)[slice(origin, origin + 300)],
+                0,
+                self.counts.astype("float64"),
+            )
+
+            for method in ("direct", "fft"):
+                smoothed = smooth(
+                    self.counts, shape, 0.01, 0.001, method=method
+                )
+
+                self.assertEqual(smoothed.dtype, np.float64)
+                assert_allclose(smoothed, expected, atol=1e-12)
+
+        with self.assertRaises(ValueError):
+            make_kernel("triangle", 0.01, 0.001)
+
+        with self.assertRaises(ValueError):
+            smooth(self.counts, "gaussian", 0.01, 0.001, method="wavelet")
+
+        with self.assertRaises(ValueError) as context:
+            smooth(self.counts, bin_size=0.001)
+
+        self.assertTrue("requires a width" in str(context.exception))
+
+        for width in (0, -0.01):
+            with self.assertRaises(ValueError):
+                smooth(self.counts, "boxcar", width, 0.001)
+
+        with self.assertRaises(ValueError):
+            smooth(self.counts, "gaussian", 0.01, 0.001, out=self.counts)
+
+        with self.assertRaises(ValueError):
+            smooth(self.counts, "gaussian", 0.01, 0.001, dtype="int32")
+
+    def test_causal_kernel(self) -> None:
+        """Test that the exponential kernel only uses past bins"""
+
+        impulse = np.zeros((50,))
+        impulse[20] = 1
+
+        smoothed = smooth(impulse, "exponential", 0.005, 0.001)
+
+        assert_array_equal(smoothed[:20], 0)
+        self.assertEqual(np.argmax(smoothed), 20)
+
+    def test_custom_kernel(self) -> None:
+        """Test custom kernels, including kernels longer than the input"""
+
+        win = np.array([0, 0.25, 0.5, 0.25, 0])
+
+        for x in (self.rng.random((40,)), self.rng.random((2,))):
+            assert_allclose(
+                smooth(x, win, axis=-1),
+                np.convolve(x, win)[slice(2, 2 + x.size)],
+            )
+
+    def test_output_buffers(self) -> None:
+        """Test float32 results and in-place smoothing"""
+
+        counts = self.counts.astype("float32")
+        expected = smooth(counts, "gaussian", 0.005, 0.001)
+
+        self.assertEqual(expected.dtype, np.float32)
+
+        out = smooth(counts, "gaussian", 0.005, 0.001, out=counts)
+
+        self.assertIs(out, counts)
+        assert_allclose(counts, expected, rtol=1e-6)
+
+        smoothed = smooth(self.counts, "boxcar", 0.005, 0.001, dtype="float32")
+        self.assertEqual(smoothed.dtype, np.float32)
+
+    def test_firing_rate(self) -> None:
+        """Test firing rates of binned xarray output"""
+
+        events = np.arange(10)
+        times_as_list = [events + 0.0105, events + 0.0205]
+
+        da = to_events(
+            times_as_list, events, (-0.05, 0.05), 0.001, return_df=True
+        )
+
+        rates = firing_rate(da, 0.001, "boxcar", 0.003, axis="time")
+
+        self.assertEqual(rates.dims, da.dims)
+        assert_allclose(
+            rates.sel(time=slice(0.0085, 0.0115), unit_id=0), 1000 / 3
+        )
+        assert_allclose(rates.sum("time"), 1000)
+
+        single_trial = firing_rate(
+            np.asarray(da[:, 0, 0]), 0.001, "boxcar", 0.003
+        )
+
+        assert_allclose(single_trial, rates.isel(event_index=0, unit_id=0))
+
+
+if __name__ == "__main__":
+    """Run the tests"""
+    unittest.main()
@@ -3,6 +3,8 @@
 import unittest
 
 import numpy as np
+import pandas as pd
+from numpy.testing import assert_array_equal
 
 from aind_ephys_utils.align import to_events
 from aind_ephys_utils.sort import by_condition, sort_by_condition
@@ -32,6 +34,36 @@ class SortingTest(unittest.TestCase):
         self.assertTrue(np.all(np.diff(sorted_df["event_label"].values) >= 0))
         self.assertTrue(np.all(np.diff(sorted_df["event_index"].values) >= 0))
 
+    def test_by_condition_options(self) -> None:
+        """Test column names, in-place sorting and permutations"""
+
+        df = pd.DataFrame(
+            data={
+                "time": [0.3, 0.1, 0.2, 0.4, 0.5],
+                "trial": [7, 3, 3, 9, 7],
+                "cond": ["b", "a", "a", None, "b"],
+            }
+        )
+
+        sorted_df = by_condition(df, condition="cond", index="trial")
+
+        assert_array_equal(sorted_df.time, [0.1, 0.2, 0.3, 0.5, 0.4])
+        assert_array_equal(sorted_df.trial, [0, 0, 1, 1, 2])
+        assert_array_equal(sorted_df.index, [1, 2, 0, 4, 3])
+        assert_array_equal(df.trial, [7, 3, 3, 9, 7])
+
+        order, new_indices = by_condition(
+            df, condition="cond", index="trial", return_indices=True
+        )
+
+        assert_array_equal(order, [1, 2, 0, 4, 3])
+        assert_array_equal(new_indices, sorted_df.trial)
+
+        self.assertIsNone(
+            by_condition(df, condition="cond", index="trial", inplace=True)
+        )
+        self.assertTrue(df.equals(sorted_df))
+
     def test_sort_by_condition(self) -> None:
         """Test the `sort_by_condition` alias."""
 
@@ -0,0 +1,118 @@
+"""Tests the flat spike train container."""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_array_equal
+
+from aind_ephys_utils.spike_trains import SpikeTrains, get_unit_ids
+
+
+class SpikeTrainsTest(unittest.TestCase):
+    """Tests the SpikeTrains class."""
+
+    spike_times = np.array([0.1, 0.5, 0.2, 0.3, 0.4, 0.9])
+    spike_times_index = np.array([2, 2, 6])
+    unit_ids = np.array([10, 11, 12])
+
+    def test_from_nwb(self) -> None:
+        """Test creating SpikeTrains from NWB-style arrays"""
+
+        trains = SpikeTrains.from_nwb(
+            self.spike_times, self.spike_times_index, self.unit_ids
+        )
+
+        self.assertEqual(len(trains), 3)
+        self.assertTrue(11 in trains)
+        self.assertFalse(13 in trains)
+        assert_array_equal(trains.keys(), self.unit_ids)
+        assert_array_equal(trains.spike_counts, [2, 0, 4])
+        assert_array_equal(trains[10], [0.1, 0.5])
+        assert_array_equal(trains[11], [])
+        assert_array_equal(trains[12], [0.2, 0.3, 0.4, 0.9])
+
+        # unit times are views into the original buffer
+        self.assertTrue(np.shares_memory(trains[12], self.spike_times))
+
+        trains = SpikeTrains.from_nwb(self.spike_times, self.spike_times_index)
+
+        assert_array_equal(trains.unit_ids, [0, 1, 2])
+
+        trains = SpikeTrains([0.1, 0.2], [0, 2])
+
+        assert_array_equal(trains[0], [0.1, 0.2])
+
+    def test_from_times(self) -> None:
+        """Test creating SpikeTrains from other spike time formats"""
+
+        times_as_list = [np.array([0.1, 0.5]), np.array([0.2, 0.3])]
+        times_as_df = pd.DataFrame(
+            index=[5, 6], data={"spike_times": times_as_list}
+        )
+
+        for times in (
+            times_as_list,
+            {5: times_as_list[0], 6: times_as_list[1]},
+            times_as_df,
+        ):
+            trains = SpikeTrains.from_times(times)
+
+            self.assertEqual(len(trains), 2)
+            assert_array_equal(trains.times, [0.1, 0.5, 0.2, 0.3])
+            assert_array_equal(trains.offsets, [0, 2, 4])
+
+        trains = SpikeTrains.from_times(times_as_list[0])
+
+        assert_array_equal(trains.unit_ids, [0])
+        assert_array_equal(trains[0], times_as_list[0])
+
+        trains = SpikeTrains.from_times(times_as_list, unit_ids=[])
+
+        self.assertEqual(len(trains), 0)
+
+    def test_select(self) -> None:
+        """Test selecting a subset of units"""
+
+        trains = SpikeTrains.from_nwb(
+            self.spike_times, self.spike_times_index, self.unit_ids
+        )
+
+        subset = trains.select([11, 12])
+
+        self.assertTrue(subset.times is trains.times)
+        assert_array_equal(subset[12], trains[12])
+
+        subset = trains.select([12, 10])
+
+        assert_array_equal(subset.unit_ids, [12, 10])
+        assert_array_equal(subset[10], trains[10])
+        assert_array_equal(subset[12], trains[12])
+
+    def test_invalid(self) -> None:
+        """Test errors for inconsistent inputs"""
+
+        with self.assertRaises(ValueError):
+            SpikeTrains(self.spike_times.reshape((2, 3)), [0, 3])
+
+        with self.assertRaises(ValueError):
+            SpikeTrains(self.spike_times, [0, 7])
+
+        with self.assertRaises(ValueError):
+            SpikeTrains(self.spike_times, [0, 4, 2])
+
+        with self.assertRaises(ValueError) as context:
+            SpikeTrains(self.spike_times, [0, 2, 6], unit_ids=[1, 2, 3])
+
+        self.assertTrue(
+            "offsets must have one more element than unit_ids."
+            in str(context.exception)
+        )
+
+        with self.assertRaises(TypeError):
+            get_unit_ids((self.spike_times,))
+
+
+if __name__ == "__main__":
+    """Run the tests"""
+    unittest.main()